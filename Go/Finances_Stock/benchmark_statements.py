@@ -0,0 +1,74 @@
+# Compares StockInfo write throughput for literal (f-string) statements against the bound-parameter
+# statements used by getprices.py, using a local SQLite database so it runs offline.
+#   python benchmark_statements.py --rows 5000
+
+from getprices import StockInfo, get_sqlite_db_engine, sql_table_stockinfo, write_stock_info
+
+import argparse
+import os
+import random
+import sqlalchemy
+import tempfile
+import time
+
+
+def get_benchmark_stock_infos(row_count):
+    random_generator = random.Random(42)
+    stock_infos = []
+    for row_index in range(row_count):
+        opening_price = round(random_generator.uniform(5, 500), 4)
+        stock_infos.append(StockInfo(f"T{row_index % 500:04d}",
+                                     f"2023-{1 + (row_index // 500) % 12:02d}-{1 + (row_index // 6000) % 28:02d}",
+                                     opening_price,
+                                     round(opening_price * random_generator.uniform(0.95, 1.05), 4),
+                                     round(opening_price * 0.94, 4),
+                                     round(opening_price * 1.06, 4),
+                                     random_generator.randint(1000, 10000000)))
+    return stock_infos
+
+
+def write_stock_info_with_literals(db_connection, stock_info):
+    # The statement shape upsert_stock_info() used before bound parameters: a new statement text per row
+    select_statement = sqlalchemy.text(f"SELECT Id FROM {sql_table_stockinfo} WHERE Ticker='{stock_info.ticker}' AND AsOfDate='{stock_info.as_of_date}'")
+    if len(db_connection.execute(select_statement).fetchall()) == 0:
+        db_connection.execute(sqlalchemy.text(f"INSERT INTO {sql_table_stockinfo} (Ticker,AsOfDate,OpeningPrice,ClosingPrice,LowPrice,HighPrice,Volume) VALUES ('{stock_info.ticker}','{stock_info.as_of_date}',{stock_info.opening_price},{stock_info.closing_price},{stock_info.low_price},{stock_info.high_price},{stock_info.volume})"))
+        return 'INSERT'
+    db_connection.execute(sqlalchemy.text(f"UPDATE {sql_table_stockinfo} SET OpeningPrice = {stock_info.opening_price}, ClosingPrice = {stock_info.closing_price}, LowPrice = {stock_info.low_price}, HighPrice = {stock_info.high_price}, Volume = {stock_info.volume}, LastUpdated = CURRENT_TIMESTAMP WHERE Ticker='{stock_info.ticker}' AND AsOfDate='{stock_info.as_of_date}'"))
+    return 'UPDATE'
+
+
+def run_benchmark(benchmark_name, write_function, stock_infos):
+    # The second pass changes every volume, since write_stock_info() skips bars identical to the stored row
+    updated_stock_infos = [StockInfo(stock_info.ticker, stock_info.as_of_date, stock_info.opening_price, stock_info.closing_price,
+                                     stock_info.low_price, stock_info.high_price, stock_info.volume + 1) for stock_info in stock_infos]
+    with tempfile.TemporaryDirectory() as benchmark_folder:
+        db_engine = get_sqlite_db_engine(os.path.join(benchmark_folder, "benchmark.db"))
+        statement_count = 0
+        start_time = time.perf_counter()
+        with db_engine.begin() as db_connection:
+            # First pass inserts every row, second pass updates every row
+            for stock_info in stock_infos + updated_stock_infos:
+                write_function(db_connection, stock_info)
+                statement_count += 2
+        elapsed_seconds = time.perf_counter() - start_time
+        db_engine.dispose()
+
+    statements_per_second = statement_count / elapsed_seconds
+    print(f"  {benchmark_name:<8} {statement_count:>8} statements in {elapsed_seconds:8.3f}s = {statements_per_second:>10.0f} statements/second")
+    return statements_per_second
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StockInfo statement benchmark")
+    parser.add_argument("--rows", type=int, default=5000, help="Distinct StockInfo rows to insert and then update")
+    arguments = parser.parse_args()
+
+    print(f"Benchmarking {arguments.rows} StockInfo rows against SQLite")
+    stock_infos = get_benchmark_stock_infos(arguments.rows)
+    literal_statements_per_second = run_benchmark("literal", write_stock_info_with_literals, stock_infos)
+    bound_statements_per_second = run_benchmark("bound", write_stock_info, stock_infos)
+    print(f"  Speedup: {bound_statements_per_second / literal_statements_per_second:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
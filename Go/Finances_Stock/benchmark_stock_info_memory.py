@@ -0,0 +1,74 @@
+# Compares the memory needed to hold a universe's worth of bars as __dict__ based records, slotted
+# StockInfo records and a StockInfoBatch.
+#   python benchmark_stock_info_memory.py --rows 200000
+
+from stock_info import StockInfo, StockInfoBatch, epoch_date
+
+import argparse
+import numpy as np
+import tracemalloc
+
+
+class DictStockInfo:
+    # The StockInfo layout before __slots__, kept here only for comparison
+    def __init__(self, ticker, as_of_date, opening_price, closing_price, low_price, high_price, volume):
+        self.ticker = ticker
+        self.as_of_date = as_of_date
+        self.opening_price = opening_price
+        self.closing_price = closing_price
+        self.low_price = low_price
+        self.high_price = high_price
+        self.volume = volume
+
+
+def get_benchmark_columns(row_count):
+    random_generator = np.random.default_rng(42)
+    tickers = [f"T{ticker_index:04d}" for ticker_index in range(5000)]
+    opening_prices = random_generator.uniform(5, 500, row_count)
+    return (tickers,
+            (np.arange(row_count) % len(tickers)).astype('int32'),
+            (np.datetime64('2023-06-30', 'D') - epoch_date + np.arange(row_count) // len(tickers)).astype('int32'),
+            opening_prices,
+            opening_prices * random_generator.uniform(0.95, 1.05, row_count),
+            opening_prices * 0.94,
+            opening_prices * 1.06,
+            random_generator.integers(1000, 10000000, row_count).astype('int64'))
+
+
+def measure_allocated_bytes(build_function):
+    tracemalloc.start()
+    built_object = build_function()
+    allocated_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del built_object
+    return allocated_bytes
+
+
+def build_records(record_class, columns):
+    tickers, ticker_ids, as_of_dates, opening_prices, closing_prices, low_prices, high_prices, volumes = columns
+    as_of_date_strings = np.datetime_as_string(epoch_date + as_of_dates, unit='D').tolist()
+    return [record_class(tickers[ticker_id], as_of_date, opening_price, closing_price, low_price, high_price, volume)
+            for ticker_id, as_of_date, opening_price, closing_price, low_price, high_price, volume
+            in zip(ticker_ids.tolist(), as_of_date_strings, opening_prices.tolist(), closing_prices.tolist(), low_prices.tolist(), high_prices.tolist(), volumes.tolist())]
+
+
+def build_batch(columns):
+    return StockInfoBatch(*[column.copy() for column in columns])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StockInfo memory benchmark")
+    parser.add_argument("--rows", type=int, default=200000, help="Bars to hold in memory")
+    arguments = parser.parse_args()
+
+    print(f"Benchmarking memory for {arguments.rows} bars")
+    columns = get_benchmark_columns(arguments.rows)
+    for benchmark_name, build_function in [("dict", lambda: build_records(DictStockInfo, columns)),
+                                           ("slots", lambda: build_records(StockInfo, columns)),
+                                           ("batch", lambda: build_batch(columns))]:
+        allocated_bytes = measure_allocated_bytes(build_function)
+        print(f"  {benchmark_name:<6} {allocated_bytes / 1024 / 1024:10.1f} MiB = {allocated_bytes / arguments.rows:8.1f} bytes/bar")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,37 +6,57 @@
 # Calculate VWAP:    https://www.yahoo.com/now/volume-weighted-average-price-vwap-204423899.html
 
 from azure.appconfiguration import AzureAppConfigurationClient, ConfigurationSetting
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date
-
+from functools import partial
+from stock_change_detector import StockInfoChangeDetector
+from stock_fetch_scheduler import StockFetchScheduler, iterate_scheduled_fetches
+from stock_group_fetcher import StockGroupFetcher, YahooGroupPriceDownloader
+from stock_info import StockInfo, StockInfoBatch
+from stock_info_schema import create_sqlite_stock_info_table, sql_table_stockinfo
+from stock_pipeline_metrics import add_rows, add_tickers, pipeline_metrics, profile_run, stage_span, timed_stage
+from stock_price_cache import FakeStockPriceFetcher, StockPriceCache, get_period_date_range
+from stock_shard_runner import ShardRunSummary, parse_shard, select_shard_tickers
+
+import argparse
 import json
+import os
 import sqlalchemy
+import tempfile
+import threading
+import time
 import yfinance as yf
 
 az_config_connection = "Endpoint=https://"
-az_config_client = AzureAppConfigurationClient.from_connection_string(az_config_connection)
+az_config_client = None
+az_config_cache = {}
+az_config_cache_ttl_seconds = 900
+az_config_lock = threading.Lock()
+db_engine_cache = {}
+db_engine_lock = threading.Lock()
+stock_price_cache = None
 sql_database = 'ShowcaseData'
 sql_driver = "ODBC+DRIVER+17+for+SQL+Server"
 sql_passwd = ''
 sql_server = ''
 sql_username = ''
+sql_pool_size = 4
+sql_pool_max_overflow = 4
+sql_pool_recycle_seconds = 1800
+sql_pool_timeout_seconds = 30
+sqlite_busy_timeout_ms = 30000
 date_range = "1d"
+date_interval = "1d"
+intraday_intervals = ("1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h")
+stock_history_columns = ['Open', 'Close', 'Low', 'High', 'Volume']
+batch_max_workers = 8
+bulk_upsert_chunk_size = 1000
 
-class StockInfo:
-    def __init__(self, ticker, as_of_date, opening_price, closing_price, low_price, high_price, volume):
-        self.ticker = ticker
-        self.as_of_date = as_of_date
-        self.opening_price = opening_price
-        self.closing_price = closing_price
-        self.low_price = low_price
-        self.high_price = high_price
-        self.volume = volume
-
-    def __str__(self):
-        return f"  Ticker: {self.ticker}, AsOfDate: {self.as_of_date}, OpeningPrice: {self.opening_price}, ClosingPrice: {self.closing_price}, LowPrice: {self.low_price}, HighPrice: {self.high_price}, Volume: {self.volume}"
-        #return self.__dict__
-
-    def __repr__(self):
-        return self.__str__()
+select_stock_info_id_statement = sqlalchemy.text(f"SELECT Id FROM {sql_table_stockinfo} WHERE Ticker = :ticker AND AsOfDate = :as_of_date")
+select_stock_info_content_statement = sqlalchemy.text(f"SELECT OpeningPrice, ClosingPrice, LowPrice, HighPrice, Volume FROM {sql_table_stockinfo} WHERE Ticker = :ticker AND AsOfDate = :as_of_date")
+insert_stock_info_statement = sqlalchemy.text(f"INSERT INTO {sql_table_stockinfo} (Ticker,AsOfDate,OpeningPrice,ClosingPrice,LowPrice,HighPrice,Volume) VALUES (:ticker,:as_of_date,:opening_price,:closing_price,:low_price,:high_price,:volume)")
+update_stock_info_statement = sqlalchemy.text(f"UPDATE {sql_table_stockinfo} SET OpeningPrice = :opening_price, ClosingPrice = :closing_price, LowPrice = :low_price, HighPrice = :high_price, Volume = :volume, LastUpdated = CURRENT_TIMESTAMP WHERE Ticker = :ticker AND AsOfDate = :as_of_date")
+bulk_upsert_statements = {}
 
 
 def prompt_for_stock_ticker():
@@ -48,11 +68,58 @@ def get_formatted_as_of_date(as_of_date):
     return as_of_date.strftime("%Y-%m-%d")
 
 
-def get_db_engine_with_alchemy():
-    print(f"  START - {get_db_engine_with_alchemy.__name__}")
-    sql_server = az_config_client.get_configuration_setting(key="dev-sql-server", label="dev-sql-server").value
-    sql_username = az_config_client.get_configuration_setting(key="dev-sql-username", label="dev-sql-username").value
-    sql_passwd = az_config_client.get_configuration_setting(key="dev-sql-passwd", label="dev-sql-passwd").value
+def get_formatted_as_of_dates(as_of_dates, interval=date_interval):
+    # Vectorized over the whole DatetimeIndex; intraday bars keep their time so each bar stays a distinct row
+    if interval in intraday_intervals:
+        return as_of_dates.strftime("%Y-%m-%d %H:%M:%S")
+    return as_of_dates.strftime("%Y-%m-%d")
+
+
+def get_az_config_client():
+    # The client is created on first use so importing this module (or running against SQLite) needs no Azure access
+    global az_config_client
+    with az_config_lock:
+        if az_config_client is None:
+            az_config_client = AzureAppConfigurationClient.from_connection_string(az_config_connection)
+        return az_config_client
+
+
+def get_configuration_value(configuration_key, ttl_seconds=az_config_cache_ttl_seconds):
+    # Configuration settings are fetched once and served from memory until their TTL expires
+    with az_config_lock:
+        cached_setting = az_config_cache.get(configuration_key)
+        if cached_setting is not None and cached_setting[1] > time.monotonic():
+            return cached_setting[0]
+
+    with stage_span('get_configuration_setting'):
+        configuration_value = get_az_config_client().get_configuration_setting(key=configuration_key, label=configuration_key).value
+    with az_config_lock:
+        az_config_cache[configuration_key] = (configuration_value, time.monotonic() + ttl_seconds)
+    return configuration_value
+
+
+def get_sqlite_db_engine(sqlite_database):
+    # Local stand-in for SQL Server so the whole pipeline can run and be benchmarked offline
+    db_engine = sqlalchemy.create_engine(f"sqlite:///{sqlite_database}",
+                                         connect_args={'check_same_thread': False, 'timeout': sqlite_busy_timeout_ms / 1000},
+                                         pool_pre_ping=True)
+
+    @sqlalchemy.event.listens_for(db_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={sqlite_busy_timeout_ms}")
+        cursor.close()
+
+    create_sqlite_stock_info_table(db_engine)
+    return db_engine
+
+
+def get_mssql_db_engine():
+    sql_server = get_configuration_value("dev-sql-server")
+    sql_username = get_configuration_value("dev-sql-username")
+    sql_passwd = get_configuration_value("dev-sql-passwd")
     if sql_server == '' or sql_username == '' or sql_passwd == '':
         print("    ERROR: Unable to get SQL Server settings from Azure Configuration")
         exit(1)
@@ -63,104 +130,535 @@ def get_db_engine_with_alchemy():
                                                             sql_server,
                                                             sql_database,
                                                             sql_driver)
-    db_engine = sqlalchemy.create_engine(db_engine_statement)
+    return sqlalchemy.create_engine(db_engine_statement,
+                                    fast_executemany=True,
+                                    pool_size=sql_pool_size,
+                                    max_overflow=sql_pool_max_overflow,
+                                    pool_recycle=sql_pool_recycle_seconds,
+                                    pool_timeout=sql_pool_timeout_seconds,
+                                    pool_pre_ping=True)
+
+
+@timed_stage
+def get_db_engine_with_alchemy(sqlite_database=None):
+    # Engines are long lived: one per target database for the whole process, sharing its connection pool
+    print(f"  START - {get_db_engine_with_alchemy.__name__}")
+    db_engine_key = f"sqlite:{sqlite_database}" if sqlite_database else "mssql"
+    with db_engine_lock:
+        db_engine = db_engine_cache.get(db_engine_key)
+        if db_engine is None:
+            if sqlite_database:
+                print(f"    SQLite database: {sqlite_database}")
+                db_engine = get_sqlite_db_engine(sqlite_database)
+            else:
+                db_engine = get_mssql_db_engine()
+            db_engine_cache[db_engine_key] = db_engine
 
     print(f"    END - {get_db_engine_with_alchemy.__name__}")
     return db_engine
 
 
+def dispose_db_engines():
+    with db_engine_lock:
+        for db_engine in db_engine_cache.values():
+            db_engine.dispose()
+        db_engine_cache.clear()
+
+
+def write_stock_info(db_connection, stock_info):
+    # Bound parameters keep one statement text per operation, so the server reuses a single cached plan
+    stock_info_parameters = get_stock_info_parameter(stock_info)
+    select_result = db_connection.execute(select_stock_info_content_statement, stock_info_parameters).fetchall()
+    if len(select_result) == 0:
+        db_connection.execute(insert_stock_info_statement, stock_info_parameters)
+        return 'INSERT'
+    # An unchanged bar is left alone so LastUpdated and the indexes are not touched
+    stored_content = tuple(select_result[0])
+    if stored_content == (stock_info_parameters['opening_price'], stock_info_parameters['closing_price'], stock_info_parameters['low_price'],
+                          stock_info_parameters['high_price'], stock_info_parameters['volume']):
+        return 'SKIP'
+    db_connection.execute(update_stock_info_statement, stock_info_parameters)
+    return 'UPDATE'
+
+
+@timed_stage
 def upsert_stock_info(db_engine, stock_info):
     print(f"  START - {upsert_stock_info.__name__}")
-    sql_table_stockinfo = 'StockInfo'
-
-    db_connection = db_engine.connect()
-
-    # Check if StockInfo row exists for Ticker and AsOfDate
-    select_statement = sqlalchemy.text(f"SELECT Id FROM {sql_table_stockinfo} WHERE Ticker='{stock_info.ticker}' AND AsOfDate='{stock_info.as_of_date}'")
-    with db_connection.connect() as current_db_connection:
-        select_result = current_db_connection.execute(select_statement).fetchall()
-        #print(select_result)
-        selected_row_count = len(select_result)
-        print(f"    Found {selected_row_count} rows from {sql_table_stockinfo}")
-
-    if selected_row_count == 0:
-        # Insert new row into StockInfo
-        insert_statement = f"INSERT INTO {sql_table_stockinfo} (Ticker,AsOfDate,OpeningPrice,ClosingPrice,LowPrice,HighPrice,Volume) VALUES ('{stock_info.ticker}','{stock_info.as_of_date}',{stock_info.opening_price},{stock_info.closing_price},{stock_info.low_price},{stock_info.high_price},{stock_info.volume})"
-        with db_connection.connect() as current_db_connection:
-            insert_result = current_db_connection.execute(insert_statement)
-            inserted_row_count = insert_result.rowcount
-            print(f"    Inserted {inserted_row_count} rows into {sql_table_stockinfo}")
-            current_db_connection.close()
-    else:
-        # Update the existing StockInfo row
-        update_statement = sqlalchemy.text(f"UPDATE {sql_table_stockinfo} SET OpeningPrice = {stock_info.opening_price}, ClosingPrice = {stock_info.closing_price}, LowPrice = {stock_info.low_price}, HighPrice = {stock_info.high_price}, Volume = {stock_info.volume}, LastUpdated = GETDATE() WHERE Ticker='{stock_info.ticker}' AND AsOfDate='{stock_info.as_of_date}'")
-        with db_connection.connect() as current_db_connection:
-            update_result = current_db_connection.execute(update_statement)
-            updated_row_count = update_result.rowcount
-            print(f"    Updated {updated_row_count} rows in {sql_table_stockinfo}")
-
-    # Working select statement - to get row data
-    with db_connection.connect() as current_db_connection:
-        for row in current_db_connection.execute(select_statement):
+
+    # One pooled connection and transaction covers the existence check, the write and the read back
+    with db_engine.begin() as db_connection:
+        upsert_action = write_stock_info(db_connection, stock_info)
+        if upsert_action == 'INSERT':
+            print(f"    Inserted 1 rows into {sql_table_stockinfo}")
+        elif upsert_action == 'SKIP':
+            print(f"    Skipped 1 unchanged rows in {sql_table_stockinfo}")
+        else:
+            print(f"    Updated 1 rows in {sql_table_stockinfo}")
+
+        # Working select statement - to get row data
+        for row in db_connection.execute(select_stock_info_id_statement, {'ticker': stock_info.ticker, 'as_of_date': stock_info.as_of_date}):
             print(f"      {sql_table_stockinfo}.Id: {row.Id}")
 
     print(f"    END - {upsert_stock_info.__name__}")
+    return upsert_action
+
+
+class StockInfoUpsertResult:
+    def __init__(self):
+        self.chunk_count = 0
+        self.inserted_row_count = 0
+        self.updated_row_count = 0
+        self.skipped_row_count = 0
+        self.failed_tickers = {}
+
+    def __str__(self):
+        return f"  Chunks: {self.chunk_count}, Inserted: {self.inserted_row_count}, Updated: {self.updated_row_count}, Skipped: {self.skipped_row_count}, Failed: {len(self.failed_tickers)}"
+
+    def __repr__(self):
+        return self.__str__()
 
 
-def get_stock_price(stock_ticker):
-    # Get the stock data from Yahoo Finance API
-    lookup_stock = yf.Ticker(stock_ticker)
-    #print(lookup_stock.info)
-    #print(lookup_stock.get_recommendations())
+def get_stock_info_chunks(stock_infos, chunk_size):
+    # Accepts a StockInfoBatch or an iterable of StockInfoBatch and/or StockInfo items. Batches are
+    # regrouped into StockInfoBatch chunks by slicing and concatenating arrays; loose StockInfo records
+    # (intraday bars, which StockInfoBatch does not hold) are grouped into plain lists.
+    if isinstance(stock_infos, StockInfoBatch):
+        stock_infos = [stock_infos]
+
+    pending_batches = []
+    pending_batch_row_count = 0
+    pending_stock_infos = []
+    for stock_info_item in stock_infos:
+        if isinstance(stock_info_item, StockInfoBatch):
+            pending_batches.append(stock_info_item)
+            pending_batch_row_count += len(stock_info_item)
+            while pending_batch_row_count >= chunk_size:
+                pending_batch = StockInfoBatch.concatenate(pending_batches)
+                yield pending_batch[:chunk_size]
+                pending_batches = [pending_batch[chunk_size:]]
+                pending_batch_row_count -= chunk_size
+        else:
+            pending_stock_infos.append(stock_info_item)
+            if len(pending_stock_infos) >= chunk_size:
+                yield pending_stock_infos
+                pending_stock_infos = []
+
+    if pending_batch_row_count > 0:
+        yield StockInfoBatch.concatenate(pending_batches)
+    if pending_stock_infos:
+        yield pending_stock_infos
+
+
+def get_stock_info_parameter(stock_info):
+    return {
+        'ticker': stock_info.ticker,
+        'as_of_date': stock_info.as_of_date,
+        'opening_price': float(stock_info.opening_price),
+        'closing_price': float(stock_info.closing_price),
+        'low_price': float(stock_info.low_price),
+        'high_price': float(stock_info.high_price),
+        'volume': int(stock_info.volume)
+    }
+
+
+def get_stock_info_chunk_parameters(stock_info_chunk):
+    if isinstance(stock_info_chunk, StockInfoBatch):
+        return stock_info_chunk.to_parameters()
+
+    # MERGE rejects a source with duplicate keys, so the last StockInfo for a (Ticker, AsOfDate) wins
+    stock_info_parameters = {}
+    for stock_info in stock_info_chunk:
+        stock_info_parameters[(stock_info.ticker, stock_info.as_of_date)] = get_stock_info_parameter(stock_info)
+    return list(stock_info_parameters.values())
+
+
+def get_bulk_upsert_statements(dialect_name):
+    # Built once per dialect and reused for every chunk of every batch
+    if dialect_name in bulk_upsert_statements:
+        return bulk_upsert_statements[dialect_name]
+
+    stage_columns = "Ticker,AsOfDate,OpeningPrice,ClosingPrice,LowPrice,HighPrice,Volume"
+    stage_values = ":ticker,:as_of_date,:opening_price,:closing_price,:low_price,:high_price,:volume"
+
+    if dialect_name == 'sqlite':
+        # SQLite has no MERGE; the staged rows are applied with INSERT ... ON CONFLICT against UNIQUE (Ticker, AsOfDate)
+        sql_table_stage = 'temp.StockInfoStage'
+        create_stage_statement = sqlalchemy.text(f"CREATE TEMP TABLE IF NOT EXISTS StockInfoStage (Ticker TEXT NOT NULL, AsOfDate TEXT NOT NULL, OpeningPrice REAL, ClosingPrice REAL, LowPrice REAL, HighPrice REAL, Volume INTEGER)")
+        clear_stage_statement = sqlalchemy.text(f"DELETE FROM {sql_table_stage}")
+        merge_statement = sqlalchemy.text(f"""INSERT INTO {sql_table_stockinfo} ({stage_columns})
+            SELECT {stage_columns} FROM {sql_table_stage} WHERE true
+            ON CONFLICT (Ticker, AsOfDate) DO UPDATE SET OpeningPrice = excluded.OpeningPrice, ClosingPrice = excluded.ClosingPrice, LowPrice = excluded.LowPrice, HighPrice = excluded.HighPrice, Volume = excluded.Volume, LastUpdated = CURRENT_TIMESTAMP""")
+    else:
+        sql_table_stage = '#StockInfoStage'
+        # The stage copies the target's column types, so intraday AsOfDate values are not truncated to a date.
+        # Pooled connections outlive a call, and the temp table with them, so it is only created once per connection.
+        create_stage_statement = sqlalchemy.text(f"""IF OBJECT_ID('tempdb..{sql_table_stage}') IS NULL
+            SELECT TOP 0 {stage_columns} INTO {sql_table_stage} FROM {sql_table_stockinfo}""")
+        clear_stage_statement = sqlalchemy.text(f"TRUNCATE TABLE {sql_table_stage}")
+        merge_statement = sqlalchemy.text(f"""MERGE {sql_table_stockinfo} WITH (HOLDLOCK) AS target
+            USING {sql_table_stage} AS source
+            ON target.Ticker = source.Ticker AND target.AsOfDate = source.AsOfDate
+            WHEN MATCHED THEN
+                UPDATE SET OpeningPrice = source.OpeningPrice, ClosingPrice = source.ClosingPrice, LowPrice = source.LowPrice, HighPrice = source.HighPrice, Volume = source.Volume, LastUpdated = CURRENT_TIMESTAMP
+            WHEN NOT MATCHED BY TARGET THEN
+                INSERT ({stage_columns})
+                VALUES (source.Ticker,source.AsOfDate,source.OpeningPrice,source.ClosingPrice,source.LowPrice,source.HighPrice,source.Volume)
+            OUTPUT $action;""")
+
+    insert_stage_statement = sqlalchemy.text(f"INSERT INTO {sql_table_stage} ({stage_columns}) VALUES ({stage_values})")
+    count_matched_statement = sqlalchemy.text(f"SELECT COUNT(*) FROM {sql_table_stage} AS source JOIN {sql_table_stockinfo} AS target ON target.Ticker = source.Ticker AND target.AsOfDate = source.AsOfDate")
+    bulk_upsert_statements[dialect_name] = (create_stage_statement, clear_stage_statement, insert_stage_statement, count_matched_statement, merge_statement)
+    return bulk_upsert_statements[dialect_name]
+
+
+def upsert_stock_info_bulk(db_engine, stock_infos, chunk_size=bulk_upsert_chunk_size, change_detector=None):
+    # Set-based replacement for calling upsert_stock_info once per row: each chunk is staged into a
+    # temp table with one executemany (fast_executemany on pyodbc) and applied with a single MERGE.
+    # A chunk that fails is retried row by row so one bad StockInfo does not lose the whole chunk.
+    # With a change detector only new or changed bars are staged; the rest are counted as skipped.
+    print(f"  START - {upsert_stock_info_bulk.__name__}")
+    dialect_name = db_engine.dialect.name
+    create_stage_statement, clear_stage_statement, insert_stage_statement, count_matched_statement, merge_statement = get_bulk_upsert_statements(dialect_name)
+
+    upsert_result = StockInfoUpsertResult()
+    with db_engine.connect() as db_connection:
+        with db_connection.begin():
+            db_connection.execute(create_stage_statement)
+
+        for stock_info_chunk in get_stock_info_chunks(stock_infos, chunk_size):
+            upsert_result.chunk_count += 1
+            skipped_row_count = 0
+            try:
+                stock_info_parameters = get_stock_info_chunk_parameters(stock_info_chunk)
+                changed_hashes = []
+                if change_detector is not None:
+                    chunk_row_count = len(stock_info_parameters)
+                    stock_info_parameters, changed_hashes = change_detector.get_changed_parameters(stock_info_parameters)
+                    skipped_row_count = chunk_row_count - len(stock_info_parameters)
+                    upsert_result.skipped_row_count += skipped_row_count
+                    if len(stock_info_parameters) == 0:
+                        print(f"    Chunk {upsert_result.chunk_count}: Skipped {skipped_row_count} unchanged rows in {sql_table_stockinfo}")
+                        continue
+                with stage_span('write_stock_info_chunk'), db_connection.begin():
+                    db_connection.execute(clear_stage_statement)
+                    db_connection.execute(insert_stage_statement, stock_info_parameters)
+                    if dialect_name == 'sqlite':
+                        matched_row_count = db_connection.execute(count_matched_statement).scalar()
+                        db_connection.execute(merge_statement)
+                        merge_actions = ['UPDATE'] * matched_row_count + ['INSERT'] * (len(stock_info_parameters) - matched_row_count)
+                    else:
+                        merge_actions = [row[0] for row in db_connection.execute(merge_statement)]
+                if change_detector is not None:
+                    change_detector.mark_written(changed_hashes)
+            except Exception as chunk_error:
+                # The row by row path compares each bar with the stored row itself, so the whole chunk is retried
+                print(f"    ERROR: Chunk {upsert_result.chunk_count} failed, retrying {len(stock_info_chunk)} rows individually: {chunk_error}")
+                upsert_result.skipped_row_count -= skipped_row_count
+                merge_actions = []
+                written_parameters = []
+                for stock_info in stock_info_chunk:
+                    try:
+                        merge_actions.append(upsert_stock_info(db_engine, stock_info))
+                        written_parameters.append(get_stock_info_parameter(stock_info))
+                    except Exception as row_error:
+                        upsert_result.failed_tickers[stock_info.ticker] = str(row_error)
+                if change_detector is not None:
+                    change_detector.mark_parameters_written(written_parameters)
+                skipped_row_count = merge_actions.count('SKIP')
+                upsert_result.skipped_row_count += skipped_row_count
+
+            inserted_row_count = merge_actions.count('INSERT')
+            updated_row_count = merge_actions.count('UPDATE')
+            upsert_result.inserted_row_count += inserted_row_count
+            upsert_result.updated_row_count += updated_row_count
+            print(f"    Chunk {upsert_result.chunk_count}: Inserted {inserted_row_count} rows, Updated {updated_row_count} rows, Skipped {skipped_row_count} unchanged rows in {sql_table_stockinfo}")
+
+    add_rows('inserted', upsert_result.inserted_row_count)
+    add_rows('updated', upsert_result.updated_row_count)
+    add_rows('skipped', upsert_result.skipped_row_count)
+    print(f"    {upsert_result}")
+    print(f"    END - {upsert_stock_info_bulk.__name__}")
+    return upsert_result
+
+
+@timed_stage
+def get_stock_price(stock_ticker, period=date_range, interval=date_interval):
+    # Get the stock data from Yahoo Finance API, kept as the columnar DataFrame yfinance returns.
+    # With a price cache configured, only the bars the cache does not already hold go upstream.
+    if stock_price_cache is not None and interval not in intraday_intervals:
+        stock_history = stock_price_cache.get_stock_history_for_period(stock_ticker, period, interval)
+    else:
+        lookup_stock = yf.Ticker(stock_ticker)
+        #print(lookup_stock.info)
+        #print(lookup_stock.get_recommendations())
 
-    stock_history = lookup_stock.history(period=date_range)
+        stock_history = lookup_stock.history(period=period, interval=interval)
     #print(stock_history)
     if (len(stock_history) == 0):
         print("  No stock_history data found for stock_ticker: " + stock_ticker)
         return None
     else :
-        print("  Found stock_history data for stock_ticker: " + stock_ticker)
-        #stock_history_as_json = stock_history.to_json()
-        #print(stock_history_as_json)
-        stock_history_as_dict = stock_history.to_dict()
-        #print(stock_history_as_dict)
-
-        return stock_history_as_dict
-
-
-def main():
+        print(f"  Found {len(stock_history)} stock_history bars for stock_ticker: {stock_ticker}")
+        add_rows('fetched', len(stock_history))
+        return stock_history[stock_history_columns]
+
+
+def get_stock_infos_from_history(stock_ticker, stock_history, interval=date_interval):
+    # One StockInfo per bar, built from whole columns at once rather than walking a nested dict per cell
+    stock_history = stock_history.dropna(subset=stock_history_columns[:-1])
+    as_of_dates = get_formatted_as_of_dates(stock_history.index, interval)
+    opening_prices = stock_history['Open'].to_numpy(dtype='float64')
+    closing_prices = stock_history['Close'].to_numpy(dtype='float64')
+    low_prices = stock_history['Low'].to_numpy(dtype='float64')
+    high_prices = stock_history['High'].to_numpy(dtype='float64')
+    volumes = stock_history['Volume'].fillna(0).to_numpy(dtype='int64')
+
+    return [StockInfo(stock_ticker, as_of_date, opening_price, closing_price, low_price, high_price, volume)
+            for as_of_date, opening_price, closing_price, low_price, high_price, volume
+            in zip(as_of_dates, opening_prices.tolist(), closing_prices.tolist(), low_prices.tolist(), high_prices.tolist(), volumes.tolist())]
+
+
+def read_stock_tickers(stock_tickers, stock_ticker_file=None):
+    # Tickers come from the optional file (one per line, # for comments) followed by argv
+    all_stock_tickers = []
+    if stock_ticker_file:
+        with open(stock_ticker_file) as ticker_file:
+            for line in ticker_file:
+                stock_ticker = line.split('#', 1)[0].strip()
+                if stock_ticker:
+                    all_stock_tickers.append(stock_ticker)
+    all_stock_tickers.extend(stock_tickers)
+
+    # Keep the first occurrence of each ticker so the batch does not fetch a symbol twice
+    unique_stock_tickers = []
+    seen_stock_tickers = set()
+    for stock_ticker in all_stock_tickers:
+        stock_ticker = stock_ticker.strip().upper()
+        if stock_ticker and stock_ticker not in seen_stock_tickers:
+            seen_stock_tickers.add(stock_ticker)
+            unique_stock_tickers.append(stock_ticker)
+    return unique_stock_tickers
+
+
+def fetch_stock_infos(stock_ticker, period=date_range, interval=date_interval):
+    stock_history = get_stock_price(stock_ticker, period, interval)
+    if stock_history is None:
+        return None
+    return get_stock_infos_for_history(stock_ticker, stock_history, interval)
+
+
+def get_stock_infos_for_history(stock_ticker, stock_history, interval=date_interval):
+    # Daily and coarser bars stay in typed arrays all the way to the bulk writer
+    if interval in intraday_intervals:
+        return get_stock_infos_from_history(stock_ticker, stock_history, interval)
+    return StockInfoBatch.from_stock_history(stock_ticker, stock_history)
+
+
+def fetch_stock_info_batch(stock_tickers, max_workers=batch_max_workers, period=date_range, interval=date_interval):
+    # Yields (stock_ticker, stock_infos, error) in completion order so results can be written while
+    # the remaining fetches are still in flight. A failing ticker only produces an error tuple.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_ticker = {executor.submit(fetch_stock_infos, stock_ticker, period, interval): stock_ticker for stock_ticker in stock_tickers}
+        for future in as_completed(future_to_ticker):
+            stock_ticker = future_to_ticker[future]
+            try:
+                yield stock_ticker, future.result(), None
+            except Exception as fetch_error:
+                yield stock_ticker, None, fetch_error
+
+
+def fetch_stock_info_groups(stock_group_fetcher, stock_tickers, period=date_range, interval=date_interval):
+    # Same (stock_ticker, stock_infos, error) shape as fetch_stock_info_batch(), with the symbols
+    # requested a group at a time and split back into per-ticker series. Fetched rows are counted where
+    # they are fetched: by the group fetcher for group downloads, by get_stock_price() for fallbacks.
+    for stock_ticker, stock_history, fetch_error in stock_group_fetcher.fetch(stock_tickers, period, interval):
+        if fetch_error is not None or stock_history is None:
+            yield stock_ticker, None, fetch_error
+        else:
+            yield stock_ticker, get_stock_infos_for_history(stock_ticker, stock_history, interval), None
+
+
+@timed_stage
+def main_batch(stock_tickers, max_workers=batch_max_workers, sqlite_database=None, period=date_range, interval=date_interval, requests_per_second=None, group_size=None, change_detection=True, run_summary=None, retry_empty_results=False):
+    print(f"  START - {main_batch.__name__}")
+    print(f"    Collecting {len(stock_tickers)} tickers with {max_workers} workers, period {period}, interval {interval}")
+
+    batch_start_time = time.perf_counter()
+    no_data_tickers = []
+    failed_tickers = {}
+
+    # With a rate limit the async scheduler paces requests and retries transient failures with backoff
+    stock_fetch_scheduler = None
+    stock_group_fetcher = None
+    if group_size and stock_price_cache is not None and interval not in intraday_intervals:
+        # The price cache fills its gaps one symbol at a time, so it takes precedence over grouping
+        print(f"    Price cache in use, fetching tickers individually instead of in groups")
+        group_size = None
+    if requests_per_second:
+        stock_fetch_scheduler = StockFetchScheduler(partial(fetch_stock_infos, period=period, interval=interval),
+                                                    requests_per_second=requests_per_second,
+                                                    max_concurrency=max_workers,
+                                                    retry_empty_results=retry_empty_results)
+        fetch_results = iterate_scheduled_fetches(stock_fetch_scheduler, stock_tickers)
+    elif group_size:
+        # Only the symbols a group download did not return are fetched again through get_stock_price().
+        # Groups run one after another; max_workers threads carry each group's per-symbol requests.
+        stock_group_fetcher = StockGroupFetcher(get_stock_price, downloader=YahooGroupPriceDownloader(max_workers=max_workers), initial_group_size=group_size)
+        fetch_results = fetch_stock_info_groups(stock_group_fetcher, stock_tickers, period, interval)
+    else:
+        fetch_results = fetch_stock_info_batch(stock_tickers, max_workers, period, interval)
+
+    # Fetched StockInfo records stream straight into the bulk writer, which flushes a chunk at a time
+    def get_fetched_stock_infos():
+        for stock_ticker, stock_infos, fetch_error in fetch_results:
+            if fetch_error is not None:
+                print(f"    ERROR: Unable to fetch {stock_ticker}: {fetch_error}")
+                failed_tickers[stock_ticker] = f"fetch: {fetch_error}"
+            elif not stock_infos:
+                no_data_tickers.append(stock_ticker)
+            elif isinstance(stock_infos, StockInfoBatch):
+                yield stock_infos
+            else:
+                yield from stock_infos
+
+    db_engine = get_db_engine_with_alchemy(sqlite_database)
+    change_detector = None
+    if change_detection:
+        # Hashes of the stored bars in the requested period are read once, before any fetch result is written
+        try:
+            load_from_date = get_period_date_range(period)[0]
+        except ValueError:
+            load_from_date = None
+        change_detector = StockInfoChangeDetector(sql_table_stockinfo)
+        change_detector.load(db_engine, stock_tickers, load_from_date)
+    upsert_result = upsert_stock_info_bulk(db_engine, get_fetched_stock_infos(), change_detector=change_detector)
+    for stock_ticker, upsert_error in upsert_result.failed_tickers.items():
+        failed_tickers[stock_ticker] = f"upsert: {upsert_error}"
+
+    batch_elapsed_seconds = time.perf_counter() - batch_start_time
+    written_count = upsert_result.inserted_row_count + upsert_result.updated_row_count
+    tickers_per_second = len(stock_tickers) / batch_elapsed_seconds if batch_elapsed_seconds > 0 else 0.0
+
+    print(f"    Batch summary:")
+    print(f"      Tickers requested: {len(stock_tickers)}")
+    print(f"      Rows written: {written_count} (inserted {upsert_result.inserted_row_count}, updated {upsert_result.updated_row_count})")
+    print(f"      Rows skipped unchanged: {upsert_result.skipped_row_count}")
+    print(f"      Tickers without data: {len(no_data_tickers)}")
+    print(f"      Tickers failed: {len(failed_tickers)}")
+    for stock_ticker, reason in sorted(failed_tickers.items()):
+        print(f"        {stock_ticker}: {reason}")
+    print(f"      Elapsed seconds: {batch_elapsed_seconds:.2f}")
+    print(f"      Throughput: {tickers_per_second:.2f} tickers/second")
+    if stock_price_cache is not None:
+        print(f"      Price cache: {stock_price_cache.stats}")
+    if stock_fetch_scheduler is not None:
+        print(f"      Fetch scheduler: {stock_fetch_scheduler.stats}")
+    if stock_group_fetcher is not None:
+        print(f"      Group fetcher: {stock_group_fetcher.stats}")
+    if change_detector is not None:
+        print(f"      Change detector: {change_detector.stats}")
+    add_tickers('requested', len(stock_tickers))
+    add_tickers('without_data', len(no_data_tickers))
+    add_tickers('failed', len(failed_tickers))
+    print(f"      Stages:")
+    pipeline_metrics.print_summary()
+
+    if run_summary is not None:
+        run_summary.finished_at = time.time()
+        run_summary.elapsed_seconds = batch_elapsed_seconds
+        run_summary.tickers_requested = len(stock_tickers)
+        run_summary.inserted_row_count = upsert_result.inserted_row_count
+        run_summary.updated_row_count = upsert_result.updated_row_count
+        run_summary.skipped_row_count = upsert_result.skipped_row_count
+        run_summary.no_data_tickers = sorted(no_data_tickers)
+        run_summary.failed_tickers = dict(failed_tickers)
+
+    print(f"    END - {main_batch.__name__}")
+    return len(failed_tickers) == 0
+
+
+def main(sqlite_database=None):
     print(f"  START - {main.__name__}")
 
     stock_ticker = prompt_for_stock_ticker()
     stock_history = get_stock_price(stock_ticker)
-    if (stock_history is not None):
-        #print(stock_history)
-        as_of_date_formatted = ""
-        for item in stock_history['Open']:
-            as_of_date = item
-            as_of_date_formatted = get_formatted_as_of_date(as_of_date)
-
-        stock_info = StockInfo(stock_ticker, as_of_date_formatted,
-            next(iter(stock_history['Open'].values())),
-            next(iter(stock_history['Close'].values())),
-            next(iter(stock_history['Low'].values())),
-            next(iter(stock_history['High'].values())),
-            next(iter(stock_history['Volume'].values())))
-        print(f"    stock_info.ticker: {stock_info.ticker}")
-        print(f"    stock_info.as_of_date: {stock_info.as_of_date}")
-        print(f"    stock_info.opening_price: {stock_info.opening_price}")
-        print(f"    stock_info.volume: {stock_info.volume}")
-        #print(stock_info.__str__)
-
-    db_engine = get_db_engine_with_alchemy()
-    upsert_stock_info(db_engine, stock_info)
+    if (stock_history is None):
+        print(f"    END - {main.__name__}")
+        return
+
+    #print(stock_history)
+    stock_infos = get_stock_infos_from_history(stock_ticker, stock_history)
+    if not stock_infos:
+        print(f"    END - {main.__name__}")
+        return
+
+    stock_info = stock_infos[-1]
+    print(f"    stock_info.ticker: {stock_info.ticker}")
+    print(f"    stock_info.as_of_date: {stock_info.as_of_date}")
+    print(f"    stock_info.opening_price: {stock_info.opening_price}")
+    print(f"    stock_info.volume: {stock_info.volume}")
+    #print(stock_info.__str__)
+
+    db_engine = get_db_engine_with_alchemy(sqlite_database)
+    for stock_info in stock_infos:
+        upsert_action = upsert_stock_info(db_engine, stock_info)
+        add_rows({'INSERT': 'inserted', 'UPDATE': 'updated', 'SKIP': 'skipped'}[upsert_action], 1)
 
     print(f"    END - {main.__name__}")
 
 
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Stock data collection program")
+    parser.add_argument("tickers", nargs="*", help="Stock tickers to collect, omit to be prompted for one")
+    parser.add_argument("--file", dest="ticker_file", help="File with one stock ticker per line")
+    parser.add_argument("--workers", type=int, default=batch_max_workers, help="Maximum concurrent price fetches")
+    parser.add_argument("--period", default=date_range, help="yfinance history period, for example 1d, 1mo or 5y")
+    parser.add_argument("--interval", default=date_interval, help="yfinance bar interval, for example 1d or 1wk")
+    parser.add_argument("--rate-limit", dest="requests_per_second", type=float, help="Use the async fetch scheduler limited to this many requests per second")
+    parser.add_argument("--retry-empty", dest="retry_empty_results", action="store_true", help="With --rate-limit, also retry tickers that return no data, not only failed requests")
+    parser.add_argument("--group-size", dest="group_size", type=int, help="Download tickers with yf.download() in groups starting at this size, adapted to upstream latency and errors. Saves the per-symbol Ticker setup and shares one session and crumb per group; Yahoo still gets one request per symbol, spread over --workers threads")
+    parser.add_argument("--cache", dest="price_cache_database", help="Local SQLite price cache file, only missing bars are fetched from Yahoo")
+    parser.add_argument("--write-all", dest="change_detection", action="store_false", help="Write every fetched bar, including bars identical to the stored row")
+    parser.add_argument("--sqlite", dest="sqlite_database", help="Write to a local SQLite database file instead of SQL Server")
+    parser.add_argument("--shard", type=parse_shard, help="Only collect the tickers in shard i of N (zero based, e.g. 3/8), chosen by a stable hash of each ticker")
+    parser.add_argument("--summary-file", dest="summary_file", help="Write a JSON run summary that stock_shard_runner.py --merge can combine across shards")
+    parser.add_argument("--fake-prices", dest="fake_prices", action="store_true", help="Serve deterministic offline prices through the price cache instead of calling Yahoo, for local testing")
+    parser.add_argument("--metrics-file", dest="metrics_file", help="Write stage timings and row counts to this file, Prometheus text for .prom, otherwise appended JSON lines")
+    parser.add_argument("--metrics-format", dest="metrics_format", choices=["prometheus", "json"], help="Override the format chosen from the --metrics-file extension")
+    parser.add_argument("--profile", dest="profile_file", help="Run under cProfile and save the stats to this file")
+    parser.add_argument("--trace-memory", dest="trace_memory", action="store_true", help="Trace allocations with tracemalloc and report the peak and top allocating lines")
+    return parser.parse_args()
+
+
 # Call main function
 if __name__ == "__main__":
     print("Stock data collection program - version 0.1")
-    main()
+    arguments = parse_arguments()
+    if arguments.fake_prices:
+        # A private cache file per process, so concurrent shards never share one
+        stock_price_cache = StockPriceCache(arguments.price_cache_database or os.path.join(tempfile.mkdtemp(), "fake_prices.db"), fetcher=FakeStockPriceFetcher())
+    elif arguments.price_cache_database:
+        stock_price_cache = StockPriceCache(arguments.price_cache_database)
+    batch_succeeded = True
+    with profile_run(arguments.profile_file, arguments.trace_memory):
+        if arguments.tickers or arguments.ticker_file:
+            stock_tickers = read_stock_tickers(arguments.tickers, arguments.ticker_file)
+            run_summary = ShardRunSummary(*(arguments.shard or (0, 1)))
+            if arguments.shard:
+                shard_index, shard_count = arguments.shard
+                all_ticker_count = len(stock_tickers)
+                stock_tickers = select_shard_tickers(stock_tickers, shard_index, shard_count)
+                print(f"  Shard {shard_index}/{shard_count}: {len(stock_tickers)} of {all_ticker_count} tickers")
+            batch_succeeded = main_batch(stock_tickers, max(1, arguments.workers), arguments.sqlite_database, arguments.period, arguments.interval, arguments.requests_per_second, arguments.group_size, arguments.change_detection, run_summary,
+                                         retry_empty_results=arguments.retry_empty_results)
+            if arguments.summary_file:
+                run_summary.write(arguments.summary_file)
+                print(f"  Run summary written to {arguments.summary_file}")
+        else:
+            main(arguments.sqlite_database)
+    dispose_db_engines()
+    if arguments.metrics_file:
+        pipeline_metrics.write(arguments.metrics_file, arguments.metrics_format)
+    exit(0 if batch_succeeded else 1)
 
 # End of program
@@ -0,0 +1,119 @@
+# pip install numpy pandas
+# Vectorized VWAP and rolling indicators over StockInfo history for many tickers at once.
+# Calculate VWAP:    https://www.yahoo.com/now/volume-weighted-average-price-vwap-204423899.html
+#
+# Input frames use the StockInfo column names (Ticker, AsOfDate, OpeningPrice, ClosingPrice, LowPrice,
+# HighPrice, Volume), either read back from the database or built from get_stock_price() output.
+
+from stock_info_reader import iterate_stock_info_range, read_stock_info_range, reader_chunk_rows
+
+import numpy as np
+import pandas as pd
+
+indicator_window = 20
+periods_per_year = 252
+stock_info_columns = ['Ticker', 'AsOfDate', 'OpeningPrice', 'ClosingPrice', 'LowPrice', 'HighPrice', 'Volume']
+yfinance_column_names = {'Open': 'OpeningPrice', 'Close': 'ClosingPrice', 'Low': 'LowPrice', 'High': 'HighPrice', 'Volume': 'Volume'}
+
+
+class StockIndicatorState:
+    # Everything needed to extend the indicators with newly appended bars without re-reading full history:
+    # running price*volume and volume totals per ticker for VWAP, and the last `window` bars for the rolling stats.
+    def __init__(self, window=indicator_window):
+        self.window = window
+        self.cumulative_totals = pd.DataFrame(columns=['PriceVolume', 'Volume'], dtype='float64')
+        self.tail_history = pd.DataFrame(columns=stock_info_columns)
+
+    def __str__(self):
+        return f"  Window: {self.window}, Tickers: {len(self.cumulative_totals)}, TailBars: {len(self.tail_history)}"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def get_stock_history_frame(stock_ticker, stock_history):
+    # Converts a get_stock_price() frame (DatetimeIndex, yfinance column names) to the StockInfo layout
+    stock_history_frame = stock_history[list(yfinance_column_names)].rename(columns=yfinance_column_names)
+    stock_history_frame.insert(0, 'AsOfDate', stock_history.index.tz_localize(None) if stock_history.index.tz is not None else stock_history.index)
+    stock_history_frame.insert(0, 'Ticker', stock_ticker)
+    return stock_history_frame.reset_index(drop=True)
+
+
+def read_stock_info_history(db_engine, stock_tickers, start_date, end_date):
+    # Streamed into typed arrays chunk by chunk, then converted to a frame once
+    return read_stock_info_range(db_engine, stock_tickers, start_date, end_date).to_frame()
+
+
+def get_grouped_rolling(grouped_column, window, operation):
+    # groupby().rolling() prefixes the group key to the index; drop it so results align with the frame
+    rolling_column = grouped_column.rolling(window, min_periods=1)
+    return getattr(rolling_column, operation)().reset_index(level=0, drop=True)
+
+
+def compute_stock_indicators(stock_history, window=indicator_window, state=None):
+    # Returns (indicators, state). Pass the returned state back in with the bars since the last run;
+    # leaving state as None computes over the full history given. Bars at or before a ticker's last bar in
+    # the state are already counted, so a re-run over an overlapping range only adds the bars after it.
+    if state is None:
+        state = StockIndicatorState(window)
+    window = state.window
+
+    new_history = stock_history[stock_info_columns].sort_values(['Ticker', 'AsOfDate'])
+    new_history = new_history.drop_duplicates(['Ticker', 'AsOfDate'], keep='last')
+    if len(state.tail_history) > 0:
+        last_as_of_dates = new_history['Ticker'].map(state.tail_history.groupby('Ticker')['AsOfDate'].max())
+        new_history = new_history[last_as_of_dates.isna() | (new_history['AsOfDate'] > last_as_of_dates)]
+    carried_history = state.tail_history[state.tail_history['Ticker'].isin(new_history['Ticker'].unique())]
+    history = new_history.assign(IsCarried=False)
+    if len(carried_history) > 0:
+        history = pd.concat([carried_history.assign(IsCarried=True), history], ignore_index=True)
+    history = history.sort_values(['Ticker', 'AsOfDate'], kind='stable').reset_index(drop=True)
+
+    closing_prices = history['ClosingPrice'].astype('float64')
+    volumes = history['Volume'].astype('float64')
+    typical_prices = (history['HighPrice'].astype('float64') + history['LowPrice'].astype('float64') + closing_prices) / 3.0
+    price_volumes = typical_prices * volumes
+
+    ticker_groups = history['Ticker']
+    log_returns = np.log(closing_prices).groupby(ticker_groups, sort=False).diff()
+    rolling_price_volumes = get_grouped_rolling(price_volumes.groupby(ticker_groups, sort=False), window, 'sum')
+    rolling_volumes = get_grouped_rolling(volumes.groupby(ticker_groups, sort=False), window, 'sum')
+    rolling_means = get_grouped_rolling(closing_prices.groupby(ticker_groups, sort=False), window, 'mean')
+    rolling_volatility = get_grouped_rolling(log_returns.groupby(ticker_groups, sort=False), window, 'std') * np.sqrt(periods_per_year)
+
+    # Cumulative VWAP only accumulates the new bars; carried bars are already part of the stored totals
+    is_new = ~history['IsCarried'].astype(bool)
+    new_price_volumes = price_volumes.where(is_new, 0.0)
+    new_volumes = volumes.where(is_new, 0.0)
+    cumulative_price_volumes = new_price_volumes.groupby(ticker_groups, sort=False).cumsum() + ticker_groups.map(state.cumulative_totals['PriceVolume']).fillna(0.0)
+    cumulative_volumes = new_volumes.groupby(ticker_groups, sort=False).cumsum() + ticker_groups.map(state.cumulative_totals['Volume']).fillna(0.0)
+
+    indicators = pd.DataFrame({
+        'Ticker': history['Ticker'],
+        'AsOfDate': history['AsOfDate'],
+        'TypicalPrice': typical_prices,
+        'Vwap': cumulative_price_volumes / cumulative_volumes.replace(0.0, np.nan),
+        'RollingVwap': rolling_price_volumes / rolling_volumes.replace(0.0, np.nan),
+        'RollingMean': rolling_means,
+        'RollingVolatility': rolling_volatility
+    })[is_new].reset_index(drop=True)
+
+    # Roll the state forward: add this run's totals and keep the last `window` bars per ticker
+    new_totals = pd.DataFrame({'PriceVolume': new_price_volumes, 'Volume': new_volumes}).groupby(ticker_groups, sort=False).sum()
+    next_state = StockIndicatorState(window)
+    next_state.cumulative_totals = new_totals.add(state.cumulative_totals, fill_value=0.0)
+    untouched_tail_history = state.tail_history[~state.tail_history['Ticker'].isin(new_totals.index)]
+    next_state.tail_history = history.groupby('Ticker', sort=False).tail(window)[stock_info_columns].reset_index(drop=True)
+    if len(untouched_tail_history) > 0:
+        next_state.tail_history = pd.concat([untouched_tail_history, next_state.tail_history], ignore_index=True)
+    return indicators, next_state
+
+
+def iterate_stock_indicators(db_engine, stock_tickers, start_date, end_date, window=indicator_window, chunk_rows=reader_chunk_rows, state=None):
+    # Computes the indicators over a history too large to hold at once. Chunks arrive ordered by Ticker and
+    # AsOfDate, so the state carried between chunks joins up a ticker that is split across two of them.
+    # Yields (indicators, state) per chunk; keep the last state to continue from it in a later run.
+    state = state or StockIndicatorState(window)
+    for stock_info_batch in iterate_stock_info_range(db_engine, stock_tickers, start_date, end_date, chunk_rows):
+        indicators, state = compute_stock_indicators(stock_info_batch.to_frame(), state=state)
+        yield indicators, state
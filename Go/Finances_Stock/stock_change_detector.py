@@ -0,0 +1,108 @@
+# pip install pandas sqlalchemy
+# Change detection for StockInfo writes.
+#
+# Keeps one 64-bit content hash of the OHLCV values per (Ticker, AsOfDate). The hashes for a batch's
+# tickers are loaded from the StockInfo table in bulk once, each chunk is filtered down to the bars that
+# are new or whose values changed, and the hashes are updated as chunks are written. Re-running a batch
+# over the same range then sends nothing to the database for bars that did not move, so LastUpdated,
+# the transaction log and the indexes are left alone.
+
+import pandas as pd
+import sqlalchemy
+
+change_detector_load_chunk_size = 500
+content_columns = ['OpeningPrice', 'ClosingPrice', 'LowPrice', 'HighPrice', 'Volume']
+parameter_content_columns = ['opening_price', 'closing_price', 'low_price', 'high_price', 'volume']
+
+
+def get_content_hashes(content_frame):
+    # content_frame holds the OHLCV columns in content_columns order, whatever they are named. Prices are
+    # hashed as float64 and volume as int64 on both sides, so a database read and a fetched bar agree.
+    normalized_frame = pd.DataFrame({
+        'OpeningPrice': content_frame.iloc[:, 0].astype('float64').to_numpy(),
+        'ClosingPrice': content_frame.iloc[:, 1].astype('float64').to_numpy(),
+        'LowPrice': content_frame.iloc[:, 2].astype('float64').to_numpy(),
+        'HighPrice': content_frame.iloc[:, 3].astype('float64').to_numpy(),
+        'Volume': content_frame.iloc[:, 4].fillna(0).astype('int64').to_numpy()
+    })
+    return pd.util.hash_pandas_object(normalized_frame, index=False).to_numpy().tolist()
+
+
+def get_as_of_date_keys(as_of_dates):
+    # SQLite returns AsOfDate as text and SQL Server as a date, both reduce to the same string
+    return pd.Series(as_of_dates).astype(str).str[:19].tolist()
+
+
+class StockInfoChangeDetectorStats:
+    def __init__(self):
+        self.loaded_hashes = 0
+        self.checked_rows = 0
+        self.changed_rows = 0
+        self.skipped_rows = 0
+
+    def __str__(self):
+        return f"  LoadedHashes: {self.loaded_hashes}, CheckedRows: {self.checked_rows}, ChangedRows: {self.changed_rows}, SkippedRows: {self.skipped_rows}"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class StockInfoChangeDetector:
+    def __init__(self, sql_table='StockInfo', load_chunk_size=change_detector_load_chunk_size):
+        self.sql_table = sql_table
+        self.load_chunk_size = load_chunk_size
+        self.content_hashes = {}
+        self.stats = StockInfoChangeDetectorStats()
+        select_content_sql = f"SELECT Ticker, AsOfDate, {','.join(content_columns)} FROM {sql_table} WHERE Ticker IN :tickers"
+        self.select_content_statement = sqlalchemy.text(select_content_sql).bindparams(sqlalchemy.bindparam('tickers', expanding=True))
+        self.select_content_from_statement = sqlalchemy.text(
+            f"{select_content_sql} AND AsOfDate >= :from_date"
+        ).bindparams(sqlalchemy.bindparam('tickers', expanding=True))
+
+    def load(self, db_engine, stock_tickers, from_date=None):
+        # One range read per chunk of tickers; the chunking keeps SQL Server under its parameter limit. Without a
+        # from_date there is no AsOfDate predicate at all, since no sentinel date converts to every column type.
+        stock_tickers = list(stock_tickers)
+        select_content_statement = self.select_content_statement if from_date is None else self.select_content_from_statement
+        with db_engine.connect() as db_connection:
+            for chunk_start in range(0, len(stock_tickers), self.load_chunk_size):
+                parameters = {'tickers': stock_tickers[chunk_start:chunk_start + self.load_chunk_size]}
+                if from_date is not None:
+                    parameters['from_date'] = str(from_date)
+                stock_info_frame = pd.read_sql(select_content_statement, db_connection, params=parameters)
+                if len(stock_info_frame) == 0:
+                    continue
+                content_keys = zip(stock_info_frame['Ticker'].tolist(), get_as_of_date_keys(stock_info_frame['AsOfDate']))
+                self.content_hashes.update(zip(content_keys, get_content_hashes(stock_info_frame[content_columns])))
+                self.stats.loaded_hashes += len(stock_info_frame)
+
+    def get_changed_parameters(self, stock_info_parameters):
+        # Filters bulk writer bind parameters down to the bars that are new or differ from the stored values.
+        # Returns the changed parameters and their hashes, to be handed to mark_written() once committed.
+        self.stats.checked_rows += len(stock_info_parameters)
+        if len(stock_info_parameters) == 0:
+            return [], []
+        content_keys, content_hashes = self.get_parameter_hashes(stock_info_parameters)
+
+        changed_parameters = []
+        changed_hashes = []
+        for stock_info_parameter, content_key, content_hash in zip(stock_info_parameters, content_keys, content_hashes):
+            if self.content_hashes.get(content_key) != content_hash:
+                changed_parameters.append(stock_info_parameter)
+                changed_hashes.append((content_key, content_hash))
+        self.stats.changed_rows += len(changed_parameters)
+        self.stats.skipped_rows += len(stock_info_parameters) - len(changed_parameters)
+        return changed_parameters, changed_hashes
+
+    def get_parameter_hashes(self, stock_info_parameters):
+        parameter_frame = pd.DataFrame(stock_info_parameters)
+        content_keys = list(zip(parameter_frame['ticker'].tolist(), get_as_of_date_keys(parameter_frame['as_of_date'])))
+        return content_keys, get_content_hashes(parameter_frame[parameter_content_columns])
+
+    def mark_written(self, changed_hashes):
+        self.content_hashes.update(changed_hashes)
+
+    def mark_parameters_written(self, stock_info_parameters):
+        # For rows written outside get_changed_parameters(), e.g. by the bulk writer's row by row retry
+        if len(stock_info_parameters) > 0:
+            self.content_hashes.update(zip(*self.get_parameter_hashes(stock_info_parameters)))
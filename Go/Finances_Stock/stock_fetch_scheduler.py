@@ -0,0 +1,223 @@
+# asyncio fetch scheduler for market data requests.
+#
+# Wraps a price source (any callable taking a ticker, sync or async) with:
+#   - a token-bucket rate limiter shared by every request
+#   - bounded concurrency
+#   - retries with jittered exponential backoff
+#   - coalescing, so concurrent requests for the same ticker share one upstream call
+#   - a per-ticker deadline covering every attempt
+# FlakyStockFetcher is an in-process stub with latency and failures for exercising it offline.
+
+import asyncio
+import inspect
+import queue
+import random
+import threading
+import time
+
+scheduler_requests_per_second = 5.0
+scheduler_burst = 10
+scheduler_max_concurrency = 8
+scheduler_max_attempts = 4
+scheduler_base_backoff_seconds = 0.5
+scheduler_max_backoff_seconds = 30.0
+scheduler_ticker_deadline_seconds = 120.0
+
+
+class TokenBucket:
+    def __init__(self, requests_per_second, burst):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.bucket_lock = asyncio.Lock()
+        self.waited_seconds = 0.0
+
+    async def acquire(self):
+        # Callers queue on the lock, so tokens are handed out in arrival order
+        async with self.bucket_lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.requests_per_second)
+                self.last_refill = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait_seconds = (1.0 - self.tokens) / self.requests_per_second
+                self.waited_seconds += wait_seconds
+                await asyncio.sleep(wait_seconds)
+
+
+class StockFetchResult:
+    def __init__(self, ticker, result=None, error=None, attempts=0, elapsed_seconds=0.0):
+        self.ticker = ticker
+        self.result = result
+        self.error = error
+        self.attempts = attempts
+        self.elapsed_seconds = elapsed_seconds
+
+    def __str__(self):
+        return f"  Ticker: {self.ticker}, Attempts: {self.attempts}, ElapsedSeconds: {self.elapsed_seconds:.2f}, Error: {self.error}"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class StockFetchSchedulerStats:
+    def __init__(self):
+        self.requests = 0
+        self.upstream_calls = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.deadline_exceeded = 0
+        self.failures = 0
+
+    def __str__(self):
+        return f"  Requests: {self.requests}, UpstreamCalls: {self.upstream_calls}, Retries: {self.retries}, Coalesced: {self.coalesced}, DeadlineExceeded: {self.deadline_exceeded}, Failures: {self.failures}"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class StockFetchScheduler:
+    def __init__(self, fetch_function,
+                 requests_per_second=scheduler_requests_per_second,
+                 burst=scheduler_burst,
+                 max_concurrency=scheduler_max_concurrency,
+                 max_attempts=scheduler_max_attempts,
+                 base_backoff_seconds=scheduler_base_backoff_seconds,
+                 max_backoff_seconds=scheduler_max_backoff_seconds,
+                 ticker_deadline_seconds=scheduler_ticker_deadline_seconds,
+                 retry_empty_results=False):
+        self.fetch_function = fetch_function
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.ticker_deadline_seconds = ticker_deadline_seconds
+        # yfinance also reports some transient upstream errors as an empty history; retrying None is opt in,
+        # since delisted or unknown tickers are empty on every attempt
+        self.retry_empty_results = retry_empty_results
+        self.stats = StockFetchSchedulerStats()
+        self.in_flight = {}
+        self.token_bucket = None
+        self.concurrency_semaphore = None
+
+    def bind_to_running_loop(self):
+        # asyncio primitives belong to the loop they are first used on, so they are created lazily
+        if self.token_bucket is None:
+            self.token_bucket = TokenBucket(self.requests_per_second, self.burst)
+            self.concurrency_semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def get_backoff_seconds(self, attempt):
+        # Full jitter keeps retrying tickers from hitting the upstream in lockstep
+        return random.uniform(0, min(self.max_backoff_seconds, self.base_backoff_seconds * (2 ** attempt)))
+
+    async def call_fetch_function(self, ticker):
+        if inspect.iscoroutinefunction(self.fetch_function):
+            return await self.fetch_function(ticker)
+        return await asyncio.to_thread(self.fetch_function, ticker)
+
+    async def fetch_with_retry(self, ticker, fetch_result):
+        for attempt in range(self.max_attempts):
+            fetch_result.attempts = attempt + 1
+            async with self.concurrency_semaphore:
+                await self.token_bucket.acquire()
+                self.stats.upstream_calls += 1
+                try:
+                    result = await self.call_fetch_function(ticker)
+                    fetch_result.error = None
+                except Exception as fetch_error:
+                    result = None
+                    fetch_result.error = fetch_error
+
+            if fetch_result.error is None and (result is not None or not self.retry_empty_results):
+                return result
+            if attempt + 1 < self.max_attempts:
+                self.stats.retries += 1
+                await asyncio.sleep(self.get_backoff_seconds(attempt))
+        return None
+
+    async def fetch_ticker(self, ticker):
+        fetch_result = StockFetchResult(ticker)
+        start_time = time.perf_counter()
+        try:
+            fetch_result.result = await asyncio.wait_for(self.fetch_with_retry(ticker, fetch_result), self.ticker_deadline_seconds)
+        except asyncio.TimeoutError:
+            self.stats.deadline_exceeded += 1
+            fetch_result.error = TimeoutError(f"Deadline of {self.ticker_deadline_seconds}s exceeded after {fetch_result.attempts} attempts")
+        if fetch_result.error is not None:
+            self.stats.failures += 1
+        fetch_result.elapsed_seconds = time.perf_counter() - start_time
+        return fetch_result
+
+    async def fetch(self, ticker):
+        self.bind_to_running_loop()
+        self.stats.requests += 1
+        fetch_task = self.in_flight.get(ticker)
+        if fetch_task is not None:
+            self.stats.coalesced += 1
+        else:
+            fetch_task = asyncio.ensure_future(self.fetch_ticker(ticker))
+            self.in_flight[ticker] = fetch_task
+            fetch_task.add_done_callback(lambda completed_task: self.in_flight.pop(ticker, None))
+        # shield so one waiter being cancelled does not cancel the shared upstream call
+        return await asyncio.shield(fetch_task)
+
+    async def fetch_many(self, tickers):
+        fetch_results = await asyncio.gather(*[self.fetch(ticker) for ticker in tickers])
+        return {fetch_result.ticker: fetch_result for fetch_result in fetch_results}
+
+    async def fetch_as_completed(self, tickers):
+        for fetch_future in asyncio.as_completed([self.fetch(ticker) for ticker in tickers]):
+            yield await fetch_future
+
+
+def iterate_scheduled_fetches(scheduler, tickers):
+    # Runs the scheduler on its own event loop thread and yields (ticker, result, error) as fetches
+    # complete, the same shape getprices.fetch_stock_info_batch() yields.
+    completed_results = queue.Queue()
+    finished = object()
+
+    async def run_fetches():
+        async for fetch_result in scheduler.fetch_as_completed(tickers):
+            completed_results.put(fetch_result)
+
+    def run_event_loop():
+        try:
+            asyncio.run(run_fetches())
+        finally:
+            completed_results.put(finished)
+
+    scheduler_thread = threading.Thread(target=run_event_loop, name="stock-fetch-scheduler", daemon=True)
+    scheduler_thread.start()
+    while True:
+        fetch_result = completed_results.get()
+        if fetch_result is finished:
+            break
+        yield fetch_result.ticker, fetch_result.result, fetch_result.error
+    scheduler_thread.join()
+
+
+class FlakyStockFetcher:
+    # In-process stand-in for the upstream: fixed latency, a share of failing calls and an optional
+    # number of failures per ticker before it succeeds. Thread safe, so it also works through to_thread.
+    def __init__(self, latency_seconds=0.01, failure_rate=0.0, failures_before_success=0, seed=42):
+        self.latency_seconds = latency_seconds
+        self.failure_rate = failure_rate
+        self.failures_before_success = failures_before_success
+        self.random_generator = random.Random(seed)
+        self.call_counts = {}
+        self.fetch_lock = threading.Lock()
+
+    def __call__(self, ticker):
+        with self.fetch_lock:
+            self.call_counts[ticker] = self.call_counts.get(ticker, 0) + 1
+            call_count = self.call_counts[ticker]
+            should_fail = call_count <= self.failures_before_success or self.random_generator.random() < self.failure_rate
+        time.sleep(self.latency_seconds)
+        if should_fail:
+            raise ConnectionError(f"Simulated upstream failure for {ticker} on call {call_count}")
+        return ticker
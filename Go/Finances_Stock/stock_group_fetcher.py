@@ -0,0 +1,214 @@
+# pip install pandas yfinance
+# Grouped multi-symbol price downloads.
+#
+# Instead of one yf.Ticker(...).history() call per symbol, symbols are requested a group at a time with
+# yf.download() and the wide (ticker, field) frame it returns is split back into one history per symbol.
+# yf.download() does not cut the number of upstream requests: Yahoo's chart endpoint takes one symbol, so
+# yfinance (1.7) still sends one chart request per symbol, spread over its own download threads. What a
+# group buys is those threads sharing one session, cookie and crumb, and one call to size and time.
+# Stats therefore count symbol requests (group symbols plus fallbacks), not group calls, as upstream load.
+# The group size adapts to the upstream: a group that comes back quickly grows the next one, a slow or
+# failing group shrinks it. Only the symbols missing from a group's frame are fetched again one by one
+# through the fallback function. FakeGroupPriceDownloader is an in-process stub for exercising it offline.
+
+from stock_pipeline_metrics import add_rows, stage_span
+
+import pandas as pd
+import threading
+import time
+import yfinance as yf
+
+group_initial_size = 20
+group_min_size = 1
+group_max_size = 100
+group_growth_factor = 1.5
+group_target_seconds = 5.0
+group_download_timeout_seconds = 30
+price_columns = ['Open', 'Close', 'Low', 'High', 'Volume']
+
+
+class YahooGroupPriceDownloader:
+    # Downloaders return a wide frame with (ticker, field) columns for every symbol Yahoo answered. Any
+    # object with this download() method can be plugged into StockGroupFetcher.
+    def __init__(self, timeout_seconds=group_download_timeout_seconds, max_workers=None):
+        self.timeout_seconds = timeout_seconds
+        # Threads yf.download() spreads a group's per-symbol chart requests over, True lets yfinance choose
+        self.max_workers = max_workers
+
+    def download(self, stock_tickers, period, interval):
+        # auto_adjust matches the yf.Ticker.history() default used by the single symbol path
+        return yf.download(stock_tickers, period=period, interval=interval, group_by='ticker', auto_adjust=True, actions=False,
+                           progress=False, timeout=self.timeout_seconds, multi_level_index=True, threads=self.max_workers or True)
+
+
+class FakeGroupPriceDownloader:
+    # Deterministic offline upstream: latency grows with the group, groups above max_accepted_size are
+    # rejected outright, and the symbols in missing_tickers never appear in a group's frame. Like
+    # yf.download(), every symbol in a group counts as one upstream request.
+    def __init__(self, base_latency_seconds=0.05, per_ticker_latency_seconds=0.002, max_accepted_size=60, missing_tickers=()):
+        self.base_latency_seconds = base_latency_seconds
+        self.per_ticker_latency_seconds = per_ticker_latency_seconds
+        self.max_accepted_size = max_accepted_size
+        self.missing_tickers = set(missing_tickers)
+        self.group_call_count = 0
+        self.symbol_request_count = 0
+        self.download_lock = threading.Lock()
+
+    def download(self, stock_tickers, period, interval):
+        with self.download_lock:
+            self.group_call_count += 1
+            self.symbol_request_count += len(stock_tickers)
+        time.sleep(self.base_latency_seconds + self.per_ticker_latency_seconds * len(stock_tickers))
+        if len(stock_tickers) > self.max_accepted_size:
+            raise ConnectionError(f"Simulated upstream rejection of a {len(stock_tickers)} symbol request")
+        as_of_dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=5)
+        stock_histories = {}
+        for stock_ticker in stock_tickers:
+            if stock_ticker in self.missing_tickers:
+                continue
+            base_price = sum(ord(character) for character in stock_ticker) % 400 + 10
+            stock_histories[stock_ticker] = pd.DataFrame({'Open': base_price, 'Close': base_price + 0.5, 'Low': base_price - 1.0,
+                                                          'High': base_price + 1.0, 'Volume': base_price * 1000}, index=as_of_dates)
+        if not stock_histories:
+            return pd.DataFrame()
+        return pd.concat(stock_histories, axis=1)
+
+
+class StockGroupFetcherStats:
+    def __init__(self):
+        self.tickers = 0
+        self.group_downloads = 0
+        self.group_failures = 0
+        self.grouped_tickers = 0
+        self.fallback_fetches = 0
+        # Per-symbol requests sent upstream: every symbol of every group call, failed ones included, plus fallbacks
+        self.symbol_requests = 0
+        self.group_size = 0
+
+    def __str__(self):
+        return (f"  Tickers: {self.tickers}, GroupDownloads: {self.group_downloads}, GroupFailures: {self.group_failures}, "
+                f"GroupedTickers: {self.grouped_tickers}, FallbackFetches: {self.fallback_fetches}, SymbolRequests: {self.symbol_requests}, "
+                f"GroupSize: {self.group_size}")
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def split_group_history(group_history, stock_tickers):
+    # One yfinance-shaped history per symbol present in the wide frame. The frame's index is the union of
+    # every symbol's bars, so rows where this symbol has no prices are dropped again.
+    stock_histories = {}
+    if group_history is None or len(group_history) == 0 or not isinstance(group_history.columns, pd.MultiIndex):
+        return stock_histories
+    available_tickers = set(group_history.columns.get_level_values(0))
+    for stock_ticker in stock_tickers:
+        if stock_ticker not in available_tickers:
+            continue
+        stock_history = group_history[stock_ticker].reindex(columns=price_columns)
+        stock_history = stock_history.dropna(subset=price_columns[:-1], how='all')
+        if len(stock_history) > 0:
+            stock_histories[stock_ticker] = stock_history
+    return stock_histories
+
+
+class StockGroupFetcher:
+    def __init__(self, fallback_fetch_function, downloader=None,
+                 initial_group_size=group_initial_size,
+                 min_group_size=group_min_size,
+                 max_group_size=group_max_size,
+                 growth_factor=group_growth_factor,
+                 target_seconds=group_target_seconds):
+        # fallback_fetch_function(stock_ticker, period, interval) returns one symbol's history or None
+        self.fallback_fetch_function = fallback_fetch_function
+        self.downloader = downloader or YahooGroupPriceDownloader()
+        self.min_group_size = min_group_size
+        self.max_group_size = max_group_size
+        self.growth_factor = growth_factor
+        self.target_seconds = target_seconds
+        self.group_size = max(min_group_size, min(max_group_size, initial_group_size))
+        self.growth_threshold = max_group_size
+        self.stats = StockGroupFetcherStats()
+
+    def adapt_group_size(self, group_failed, elapsed_seconds):
+        # Halving on a slow or failed group gives a struggling upstream relief within a couple of groups.
+        # Growth is multiplicative up to the size that last failed and one symbol per group beyond it,
+        # so the size settles just under the upstream's limit instead of repeatedly overshooting it.
+        if group_failed or elapsed_seconds > self.target_seconds:
+            self.growth_threshold = max(self.min_group_size, self.group_size // 2)
+            self.group_size = self.growth_threshold
+        elif self.group_size < self.growth_threshold:
+            self.group_size = min(self.growth_threshold, max(self.group_size + 1, int(self.group_size * self.growth_factor)))
+        else:
+            self.group_size = min(self.max_group_size, self.group_size + 1)
+        self.stats.group_size = self.group_size
+
+    def fetch_fallback(self, stock_ticker, period, interval):
+        self.stats.fallback_fetches += 1
+        self.stats.symbol_requests += 1
+        try:
+            return stock_ticker, self.fallback_fetch_function(stock_ticker, period, interval), None
+        except Exception as fetch_error:
+            return stock_ticker, None, fetch_error
+
+    def fetch(self, stock_tickers, period, interval):
+        # Yields (stock_ticker, stock_history, error) for every symbol, the shape the batch writer consumes
+        pending_tickers = list(stock_tickers)
+        self.stats.tickers += len(pending_tickers)
+        self.stats.group_size = self.group_size
+        while pending_tickers:
+            group_tickers = pending_tickers[:self.group_size]
+            pending_tickers = pending_tickers[self.group_size:]
+
+            start_time = time.perf_counter()
+            try:
+                with stage_span('download_stock_price_group'):
+                    group_history = self.downloader.download(group_tickers, period, interval)
+                group_error = None
+            except Exception as download_error:
+                group_history = None
+                group_error = download_error
+            elapsed_seconds = time.perf_counter() - start_time
+            self.stats.group_downloads += 1
+            self.stats.symbol_requests += len(group_tickers)
+
+            if group_error is not None:
+                print(f"    Group of {len(group_tickers)} tickers failed after {elapsed_seconds:.2f}s: {group_error}")
+                self.stats.group_failures += 1
+                self.adapt_group_size(True, elapsed_seconds)
+                if len(group_tickers) > self.min_group_size:
+                    # Retried in the smaller groups now in effect rather than one symbol at a time
+                    pending_tickers = group_tickers + pending_tickers
+                    continue
+                for stock_ticker in group_tickers:
+                    yield self.fetch_fallback(stock_ticker, period, interval)
+                continue
+
+            stock_histories = split_group_history(group_history, group_tickers)
+            self.stats.grouped_tickers += len(stock_histories)
+            # A group that lost more than half its symbols is treated as a failure for sizing purposes
+            self.adapt_group_size(len(stock_histories) * 2 < len(group_tickers), elapsed_seconds)
+            for stock_ticker in group_tickers:
+                if stock_ticker in stock_histories:
+                    add_rows('fetched', len(stock_histories[stock_ticker]))
+                    yield stock_ticker, stock_histories[stock_ticker], None
+                else:
+                    yield self.fetch_fallback(stock_ticker, period, interval)
+
+
+if __name__ == '__main__':
+
+    # Offline demonstration: 500 symbols against an upstream that rejects groups above 60 symbols
+    stock_tickers = [f"T{ticker_index:03d}" for ticker_index in range(500)]
+    fake_downloader = FakeGroupPriceDownloader(missing_tickers={'T007', 'T123'})
+    fallback_tickers = []
+
+    def fetch_single_stock_history(stock_ticker, period, interval):
+        fallback_tickers.append(stock_ticker)
+        return None
+
+    stock_group_fetcher = StockGroupFetcher(fetch_single_stock_history, downloader=fake_downloader)
+    start_time = time.perf_counter()
+    fetched_count = sum(1 for stock_ticker, stock_history, fetch_error in stock_group_fetcher.fetch(stock_tickers, '5d', '1d') if stock_history is not None)
+    print(stock_group_fetcher.stats)
+    print(f"  Fetched {fetched_count} of {len(stock_tickers)} tickers in {fake_downloader.group_call_count} group calls, "
+          f"{stock_group_fetcher.stats.symbol_requests} per-symbol upstream requests, in {time.perf_counter() - start_time:.2f}s, fallback: {fallback_tickers}")
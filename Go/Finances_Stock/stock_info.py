@@ -0,0 +1,199 @@
+# pip install numpy pandas
+# StockInfo records and the array-backed StockInfoBatch used to hold many bars in memory at once.
+
+import numpy as np
+import pandas as pd
+
+epoch_date = np.datetime64('1970-01-01', 'D')
+
+
+class StockInfo:
+    # Slotted so a StockInfo carries no per-instance __dict__
+    __slots__ = ('ticker', 'as_of_date', 'opening_price', 'closing_price', 'low_price', 'high_price', 'volume')
+
+    def __init__(self, ticker, as_of_date, opening_price, closing_price, low_price, high_price, volume):
+        self.ticker = ticker
+        self.as_of_date = as_of_date
+        self.opening_price = opening_price
+        self.closing_price = closing_price
+        self.low_price = low_price
+        self.high_price = high_price
+        self.volume = volume
+
+    def __str__(self):
+        return f"  Ticker: {self.ticker}, AsOfDate: {self.as_of_date}, OpeningPrice: {self.opening_price}, ClosingPrice: {self.closing_price}, LowPrice: {self.low_price}, HighPrice: {self.high_price}, Volume: {self.volume}"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class StockInfoBatch:
+    # Bars stored column-wise in typed arrays:
+    #   ticker_ids   int32   index into the shared tickers list
+    #   as_of_dates  int32   days since 1970-01-01
+    #   as_of_seconds int32  seconds into the day for intraday bars, None for daily (or coarser) batches
+    #   prices       float64 opening, closing, low and high
+    #   volumes      int64
+    # Slicing returns a batch of NumPy views over the same arrays, so chunking a batch copies nothing.
+    def __init__(self, tickers, ticker_ids, as_of_dates, opening_prices, closing_prices, low_prices, high_prices, volumes, as_of_seconds=None):
+        self.tickers = tickers
+        self.ticker_ids = ticker_ids
+        self.as_of_dates = as_of_dates
+        self.opening_prices = opening_prices
+        self.closing_prices = closing_prices
+        self.low_prices = low_prices
+        self.high_prices = high_prices
+        self.volumes = volumes
+        self.as_of_seconds = as_of_seconds
+
+    @classmethod
+    def create_empty(cls):
+        return cls([], np.empty(0, dtype='int32'), np.empty(0, dtype='int32'),
+                   np.empty(0, dtype='float64'), np.empty(0, dtype='float64'), np.empty(0, dtype='float64'), np.empty(0, dtype='float64'),
+                   np.empty(0, dtype='int64'))
+
+    @classmethod
+    def from_stock_history(cls, stock_ticker, stock_history):
+        # Built straight from a get_stock_price() frame without creating a StockInfo per bar
+        stock_history = stock_history.dropna(subset=['Open', 'Close', 'Low', 'High'])
+        as_of_dates = stock_history.index.tz_localize(None) if stock_history.index.tz is not None else stock_history.index
+        return cls([stock_ticker],
+                   np.zeros(len(stock_history), dtype='int32'),
+                   (as_of_dates.to_numpy().astype('datetime64[D]') - epoch_date).astype('int32'),
+                   stock_history['Open'].to_numpy(dtype='float64'),
+                   stock_history['Close'].to_numpy(dtype='float64'),
+                   stock_history['Low'].to_numpy(dtype='float64'),
+                   stock_history['High'].to_numpy(dtype='float64'),
+                   stock_history['Volume'].fillna(0).to_numpy(dtype='int64'))
+
+    @classmethod
+    def from_stock_infos(cls, stock_infos):
+        stock_infos = list(stock_infos)
+        tickers, ticker_ids = np.unique(np.array([stock_info.ticker for stock_info in stock_infos], dtype=object), return_inverse=True)
+        return cls(tickers.tolist(),
+                   ticker_ids.astype('int32'),
+                   (np.array([stock_info.as_of_date for stock_info in stock_infos], dtype='datetime64[D]') - epoch_date).astype('int32'),
+                   np.array([stock_info.opening_price for stock_info in stock_infos], dtype='float64'),
+                   np.array([stock_info.closing_price for stock_info in stock_infos], dtype='float64'),
+                   np.array([stock_info.low_price for stock_info in stock_infos], dtype='float64'),
+                   np.array([stock_info.high_price for stock_info in stock_infos], dtype='float64'),
+                   np.array([stock_info.volume for stock_info in stock_infos], dtype='int64'))
+
+    @classmethod
+    def concatenate(cls, stock_info_batches):
+        stock_info_batches = [stock_info_batch for stock_info_batch in stock_info_batches if len(stock_info_batch) > 0]
+        if len(stock_info_batches) == 0:
+            return cls.create_empty()
+        if len(stock_info_batches) == 1:
+            return stock_info_batches[0]
+
+        # A daily batch concatenated with intraday ones gets its bars at midnight
+        as_of_seconds = None
+        if any(stock_info_batch.as_of_seconds is not None for stock_info_batch in stock_info_batches):
+            as_of_seconds = np.concatenate([stock_info_batch.get_as_of_seconds() for stock_info_batch in stock_info_batches])
+
+        # Merge the ticker lists and remap each batch's ticker ids onto the merged list
+        tickers = []
+        ticker_positions = {}
+        ticker_ids = []
+        for stock_info_batch in stock_info_batches:
+            ticker_id_map = np.empty(len(stock_info_batch.tickers), dtype='int32')
+            for ticker_id, stock_ticker in enumerate(stock_info_batch.tickers):
+                if stock_ticker not in ticker_positions:
+                    ticker_positions[stock_ticker] = len(tickers)
+                    tickers.append(stock_ticker)
+                ticker_id_map[ticker_id] = ticker_positions[stock_ticker]
+            ticker_ids.append(ticker_id_map[stock_info_batch.ticker_ids])
+
+        return cls(tickers,
+                   np.concatenate(ticker_ids),
+                   np.concatenate([stock_info_batch.as_of_dates for stock_info_batch in stock_info_batches]),
+                   np.concatenate([stock_info_batch.opening_prices for stock_info_batch in stock_info_batches]),
+                   np.concatenate([stock_info_batch.closing_prices for stock_info_batch in stock_info_batches]),
+                   np.concatenate([stock_info_batch.low_prices for stock_info_batch in stock_info_batches]),
+                   np.concatenate([stock_info_batch.high_prices for stock_info_batch in stock_info_batches]),
+                   np.concatenate([stock_info_batch.volumes for stock_info_batch in stock_info_batches]),
+                   as_of_seconds)
+
+    def __len__(self):
+        return len(self.ticker_ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return StockInfoBatch(self.tickers, self.ticker_ids[index], self.as_of_dates[index],
+                                  self.opening_prices[index], self.closing_prices[index], self.low_prices[index], self.high_prices[index],
+                                  self.volumes[index], None if self.as_of_seconds is None else self.as_of_seconds[index])
+        return StockInfo(self.tickers[self.ticker_ids[index]],
+                         self.get_as_of_date_string(index),
+                         float(self.opening_prices[index]),
+                         float(self.closing_prices[index]),
+                         float(self.low_prices[index]),
+                         float(self.high_prices[index]),
+                         int(self.volumes[index]))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __str__(self):
+        return f"  StockInfoBatch: {len(self)} bars, {len(self.tickers)} tickers, {self.nbytes} bytes"
+
+    def __repr__(self):
+        return self.__str__()
+
+    @property
+    def nbytes(self):
+        return (self.ticker_ids.nbytes + self.as_of_dates.nbytes + self.opening_prices.nbytes + self.closing_prices.nbytes
+                + self.low_prices.nbytes + self.high_prices.nbytes + self.volumes.nbytes
+                + (0 if self.as_of_seconds is None else self.as_of_seconds.nbytes))
+
+    def get_ticker_array(self):
+        return np.array(self.tickers, dtype=object)[self.ticker_ids]
+
+    def get_as_of_seconds(self):
+        return np.zeros(len(self), dtype='int32') if self.as_of_seconds is None else self.as_of_seconds
+
+    def get_as_of_datetimes(self):
+        return (epoch_date + self.as_of_dates).astype('datetime64[s]') + self.get_as_of_seconds().astype('timedelta64[s]')
+
+    def get_as_of_date_strings(self):
+        # Intraday bars use the same 'YYYY-MM-DD HH:MM:SS' text getprices.py writes for them
+        if self.as_of_seconds is None:
+            return np.datetime_as_string(epoch_date + self.as_of_dates, unit='D')
+        return np.char.replace(np.datetime_as_string(self.get_as_of_datetimes(), unit='s'), 'T', ' ')
+
+    def get_as_of_date_string(self, index):
+        if self.as_of_seconds is None:
+            return str(epoch_date + int(self.as_of_dates[index]))
+        return str(self.get_as_of_datetimes()[index]).replace('T', ' ')
+
+    def to_parameters(self):
+        # Bind parameters for the bulk writer. MERGE rejects a source with duplicate keys, so the last bar
+        # for a (Ticker, AsOfDate) wins.
+        stock_info_parameters = {}
+        for ticker, as_of_date, opening_price, closing_price, low_price, high_price, volume in zip(
+                self.get_ticker_array().tolist(), self.get_as_of_date_strings().tolist(),
+                self.opening_prices.tolist(), self.closing_prices.tolist(), self.low_prices.tolist(), self.high_prices.tolist(),
+                self.volumes.tolist()):
+            stock_info_parameters[(ticker, as_of_date)] = {
+                'ticker': ticker,
+                'as_of_date': as_of_date,
+                'opening_price': opening_price,
+                'closing_price': closing_price,
+                'low_price': low_price,
+                'high_price': high_price,
+                'volume': volume
+            }
+        return list(stock_info_parameters.values())
+
+    def to_frame(self):
+        # StockInfo column layout used by stock_analytics
+        return pd.DataFrame({
+            'Ticker': self.get_ticker_array(),
+            'AsOfDate': self.get_as_of_datetimes().astype('datetime64[ns]'),
+            'OpeningPrice': self.opening_prices,
+            'ClosingPrice': self.closing_prices,
+            'LowPrice': self.low_prices,
+            'HighPrice': self.high_prices,
+            'Volume': self.volumes
+        })
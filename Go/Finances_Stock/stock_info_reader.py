@@ -0,0 +1,98 @@
+# pip install numpy sqlalchemy
+# Time-range reads over the StockInfo table.
+#
+# ensure_stock_info_indexes() adds a covering index on (Ticker, AsOfDate) holding the OHLCV columns, so a
+# range read for a ticker is a single index seek and scan with no lookups into the base table. The range
+# readers stream rows through a server-side cursor (stream_results) and turn each fetched chunk straight into
+# a StockInfoBatch of typed arrays, so a long history never exists as one list of Python row objects.
+
+from stock_info import StockInfoBatch
+from stock_info_schema import create_sqlite_stock_info_table, sql_table_stockinfo
+
+import numpy as np
+import sqlalchemy
+
+from datetime import date, timedelta
+
+reader_chunk_rows = 50000
+reader_ticker_chunk_size = 500
+stock_info_covering_index = 'IX_StockInfo_Ticker_AsOfDate'
+
+select_stock_info_range_statement = sqlalchemy.text(
+    f"SELECT Ticker, AsOfDate, OpeningPrice, ClosingPrice, LowPrice, HighPrice, Volume FROM {sql_table_stockinfo} "
+    f"WHERE Ticker IN :tickers AND AsOfDate >= :start_date AND AsOfDate < :end_date_exclusive ORDER BY Ticker, AsOfDate"
+).bindparams(sqlalchemy.bindparam('tickers', expanding=True))
+
+
+def get_create_index_statement(dialect_name):
+    if dialect_name == 'sqlite':
+        return sqlalchemy.text(f"CREATE INDEX IF NOT EXISTS {stock_info_covering_index} ON {sql_table_stockinfo} "
+                               f"(Ticker, AsOfDate, OpeningPrice, ClosingPrice, LowPrice, HighPrice, Volume)")
+    # The clustered key stays on Id so the writers' inserts remain appends; the INCLUDE columns make this
+    # nonclustered index cover every range read
+    return sqlalchemy.text(f"""IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = '{stock_info_covering_index}' AND object_id = OBJECT_ID('{sql_table_stockinfo}'))
+        CREATE NONCLUSTERED INDEX {stock_info_covering_index} ON {sql_table_stockinfo} (Ticker, AsOfDate)
+        INCLUDE (OpeningPrice, ClosingPrice, LowPrice, HighPrice, Volume)""")
+
+
+def ensure_stock_info_indexes(db_engine):
+    # Safe to run on every start: both statements are no-ops once the table and index exist
+    print(f"  START - {ensure_stock_info_indexes.__name__}")
+    if db_engine.dialect.name == 'sqlite':
+        create_sqlite_stock_info_table(db_engine)
+    with db_engine.begin() as db_connection:
+        db_connection.execute(get_create_index_statement(db_engine.dialect.name))
+    print(f"    Index {stock_info_covering_index} ready on {sql_table_stockinfo}")
+    print(f"    END - {ensure_stock_info_indexes.__name__}")
+
+
+def get_stock_info_batch_from_rows(stock_info_rows):
+    # Rows are (Ticker, AsOfDate, Open, Close, Low, High, Volume); AsOfDate is text on SQLite and a date or
+    # datetime on SQL Server. Intraday bars keep their time of day, so bars on the same day stay distinct.
+    tickers, as_of_dates, opening_prices, closing_prices, low_prices, high_prices, volumes = zip(*stock_info_rows)
+    unique_tickers, ticker_ids = np.unique(np.array(tickers, dtype=object), return_inverse=True)
+    as_of_epoch_seconds = np.array([str(as_of_date) for as_of_date in as_of_dates], dtype='datetime64[s]').astype('int64')
+    as_of_seconds = (as_of_epoch_seconds % 86400).astype('int32')
+    return StockInfoBatch(unique_tickers.tolist(),
+                          ticker_ids.astype('int32'),
+                          (as_of_epoch_seconds // 86400).astype('int32'),
+                          np.array(opening_prices, dtype='float64'),
+                          np.array(closing_prices, dtype='float64'),
+                          np.array(low_prices, dtype='float64'),
+                          np.array(high_prices, dtype='float64'),
+                          np.array([volume or 0 for volume in volumes], dtype='int64'),
+                          as_of_seconds if as_of_seconds.any() else None)
+
+
+def get_end_date_exclusive(end_date):
+    # end_date is inclusive for whole days: the bound is the next midnight, so intraday bars on end_date are kept
+    return date.fromisoformat(str(end_date)[:10]) + timedelta(days=1)
+
+
+def iterate_stock_info_range(db_engine, stock_tickers, start_date, end_date, chunk_rows=reader_chunk_rows):
+    # Yields StockInfoBatch chunks of up to chunk_rows bars, ordered by Ticker then AsOfDate across all
+    # chunks. Dialects without server-side cursors (pyodbc, sqlite3) still fetch chunk_rows at a time
+    # from the DBAPI cursor, so memory stays bounded by one chunk either way.
+    stock_tickers = sorted(set(stock_tickers))
+    with db_engine.connect() as db_connection:
+        streaming_connection = db_connection.execution_options(stream_results=True, max_row_buffer=chunk_rows)
+        for ticker_chunk_start in range(0, len(stock_tickers), reader_ticker_chunk_size):
+            parameters = {'tickers': stock_tickers[ticker_chunk_start:ticker_chunk_start + reader_ticker_chunk_size],
+                          'start_date': str(start_date),
+                          'end_date_exclusive': str(get_end_date_exclusive(end_date))}
+            result = streaming_connection.execute(select_stock_info_range_statement, parameters)
+            for stock_info_rows in result.partitions(chunk_rows):
+                yield get_stock_info_batch_from_rows(stock_info_rows)
+
+
+def read_stock_info_range(db_engine, stock_tickers, start_date, end_date, chunk_rows=reader_chunk_rows):
+    # The whole range as one StockInfoBatch, assembled from the streamed chunks
+    print(f"  START - {read_stock_info_range.__name__}")
+    stock_info_batch = StockInfoBatch.concatenate(list(iterate_stock_info_range(db_engine, stock_tickers, start_date, end_date, chunk_rows)))
+    print(f"    Read {len(stock_info_batch)} rows from {sql_table_stockinfo}")
+    print(f"    END - {read_stock_info_range.__name__}")
+    return stock_info_batch
+
+
+def read_ticker_range(db_engine, stock_ticker, start_date, end_date, chunk_rows=reader_chunk_rows):
+    return read_stock_info_range(db_engine, [stock_ticker], start_date, end_date, chunk_rows)
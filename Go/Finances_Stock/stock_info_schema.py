@@ -0,0 +1,23 @@
+# pip install sqlalchemy
+# StockInfo table name and the local SQLite DDL, shared by the writers in getprices.py and the readers
+# in stock_info_reader.py without either side importing the other's Azure or Yahoo dependencies.
+
+import sqlalchemy
+
+sql_table_stockinfo = 'StockInfo'
+
+
+def create_sqlite_stock_info_table(db_engine):
+    create_table_statement = sqlalchemy.text(f"""CREATE TABLE IF NOT EXISTS {sql_table_stockinfo} (
+        Id INTEGER PRIMARY KEY AUTOINCREMENT,
+        Ticker TEXT NOT NULL,
+        AsOfDate TEXT NOT NULL,
+        OpeningPrice REAL,
+        ClosingPrice REAL,
+        LowPrice REAL,
+        HighPrice REAL,
+        Volume INTEGER,
+        LastUpdated TEXT DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (Ticker, AsOfDate))""")
+    with db_engine.begin() as db_connection:
+        db_connection.execute(create_table_statement)
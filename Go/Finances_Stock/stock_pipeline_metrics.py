@@ -0,0 +1,199 @@
+# Stage timing and counters for the stock pipeline, exported as Prometheus text or JSON lines.
+#
+# Wrap a stage with the timed_stage decorator or a stage_span() block to record its latency in a histogram and count the calls that raised.
+# add_rows() counts rows per operation and add_tickers() counts tickers per outcome.
+# Everything goes into the module's pipeline_metrics registry, which is thread safe because fetches run on worker threads.
+# profile_run() is the opt-in cProfile / tracemalloc mode for digging into a single slow run.
+
+from contextlib import contextmanager
+from functools import wraps
+
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+
+metrics_prefix = 'stock_pipeline'
+latency_buckets_seconds = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+profile_top_functions = 25
+trace_memory_top_lines = 10
+
+
+class StageLatencyHistogram:
+    def __init__(self, buckets=latency_buckets_seconds):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum_seconds = 0.0
+        self.max_seconds = 0.0
+        self.error_count = 0
+
+    def observe(self, elapsed_seconds):
+        # Bucket counts are stored cumulatively, the way Prometheus exposes them
+        for bucket_index, bucket in enumerate(self.buckets):
+            if elapsed_seconds <= bucket:
+                self.bucket_counts[bucket_index] += 1
+        self.count += 1
+        self.sum_seconds += elapsed_seconds
+        self.max_seconds = max(self.max_seconds, elapsed_seconds)
+
+    def __str__(self):
+        mean_seconds = self.sum_seconds / self.count if self.count else 0.0
+        return f"  Count: {self.count}, Errors: {self.error_count}, TotalSeconds: {self.sum_seconds:.3f}, MeanSeconds: {mean_seconds:.3f}, MaxSeconds: {self.max_seconds:.3f}"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class PipelineMetrics:
+    def __init__(self, prefix=metrics_prefix):
+        self.prefix = prefix
+        self.stage_histograms = {}
+        self.row_counts = {}
+        self.ticker_counts = {}
+        self.metrics_lock = threading.Lock()
+
+    def observe_stage(self, stage_name, elapsed_seconds, failed=False):
+        with self.metrics_lock:
+            stage_histogram = self.stage_histograms.setdefault(stage_name, StageLatencyHistogram())
+            stage_histogram.observe(elapsed_seconds)
+            if failed:
+                stage_histogram.error_count += 1
+
+    def add_rows(self, operation, row_count):
+        with self.metrics_lock:
+            self.row_counts[operation] = self.row_counts.get(operation, 0) + row_count
+
+    def add_tickers(self, outcome, ticker_count):
+        with self.metrics_lock:
+            self.ticker_counts[outcome] = self.ticker_counts.get(outcome, 0) + ticker_count
+
+    def reset(self):
+        with self.metrics_lock:
+            self.stage_histograms.clear()
+            self.row_counts.clear()
+            self.ticker_counts.clear()
+
+    def to_prometheus_text(self):
+        lines = [f"# HELP {self.prefix}_stage_seconds Latency of each pipeline stage",
+                 f"# TYPE {self.prefix}_stage_seconds histogram"]
+        with self.metrics_lock:
+            for stage_name, stage_histogram in sorted(self.stage_histograms.items()):
+                for bucket, bucket_count in zip(stage_histogram.buckets, stage_histogram.bucket_counts):
+                    lines.append(f'{self.prefix}_stage_seconds_bucket{{stage="{stage_name}",le="{bucket}"}} {bucket_count}')
+                lines.append(f'{self.prefix}_stage_seconds_bucket{{stage="{stage_name}",le="+Inf"}} {stage_histogram.count}')
+                lines.append(f'{self.prefix}_stage_seconds_sum{{stage="{stage_name}"}} {stage_histogram.sum_seconds}')
+                lines.append(f'{self.prefix}_stage_seconds_count{{stage="{stage_name}"}} {stage_histogram.count}')
+            lines.append(f"# HELP {self.prefix}_stage_errors_total Calls of each pipeline stage that raised")
+            lines.append(f"# TYPE {self.prefix}_stage_errors_total counter")
+            for stage_name, stage_histogram in sorted(self.stage_histograms.items()):
+                lines.append(f'{self.prefix}_stage_errors_total{{stage="{stage_name}"}} {stage_histogram.error_count}')
+            lines.append(f"# HELP {self.prefix}_rows_total Rows handled per operation")
+            lines.append(f"# TYPE {self.prefix}_rows_total counter")
+            for operation, row_count in sorted(self.row_counts.items()):
+                lines.append(f'{self.prefix}_rows_total{{operation="{operation}"}} {row_count}')
+            lines.append(f"# HELP {self.prefix}_tickers_total Tickers per batch outcome")
+            lines.append(f"# TYPE {self.prefix}_tickers_total counter")
+            for outcome, ticker_count in sorted(self.ticker_counts.items()):
+                lines.append(f'{self.prefix}_tickers_total{{outcome="{outcome}"}} {ticker_count}')
+        return '\n'.join(lines) + '\n'
+
+    def to_json_lines(self):
+        # One self-describing record per stage, row counter and ticker counter, stamped with the export time
+        timestamp = time.time()
+        records = []
+        with self.metrics_lock:
+            for stage_name, stage_histogram in sorted(self.stage_histograms.items()):
+                records.append({'timestamp': timestamp, 'metric': f"{self.prefix}_stage_seconds", 'stage': stage_name,
+                                'count': stage_histogram.count, 'errors': stage_histogram.error_count,
+                                'sum': stage_histogram.sum_seconds, 'max': stage_histogram.max_seconds,
+                                'buckets': dict(zip([str(bucket) for bucket in stage_histogram.buckets], stage_histogram.bucket_counts))})
+            for operation, row_count in sorted(self.row_counts.items()):
+                records.append({'timestamp': timestamp, 'metric': f"{self.prefix}_rows_total", 'operation': operation, 'value': row_count})
+            for outcome, ticker_count in sorted(self.ticker_counts.items()):
+                records.append({'timestamp': timestamp, 'metric': f"{self.prefix}_tickers_total", 'outcome': outcome, 'value': ticker_count})
+        return ''.join(json.dumps(record) + '\n' for record in records)
+
+    def write(self, metrics_file, metrics_format=None):
+        # The format follows the file extension unless given: .prom for Prometheus text, anything else JSON lines.
+        # JSON lines are appended so nightly runs accumulate in one file; Prometheus text is a snapshot.
+        metrics_format = metrics_format or ('prometheus' if metrics_file.endswith('.prom') else 'json')
+        if metrics_format == 'prometheus':
+            with open(metrics_file, 'w') as output_file:
+                output_file.write(self.to_prometheus_text())
+        else:
+            with open(metrics_file, 'a') as output_file:
+                output_file.write(self.to_json_lines())
+        print(f"    Metrics written to {metrics_file} ({metrics_format})")
+
+    def print_summary(self):
+        with self.metrics_lock:
+            for stage_name, stage_histogram in sorted(self.stage_histograms.items()):
+                print(f"      {stage_name}: {stage_histogram}")
+            for operation, row_count in sorted(self.row_counts.items()):
+                print(f"      rows {operation}: {row_count}")
+            for outcome, ticker_count in sorted(self.ticker_counts.items()):
+                print(f"      tickers {outcome}: {ticker_count}")
+
+
+pipeline_metrics = PipelineMetrics()
+
+
+@contextmanager
+def stage_span(stage_name, metrics=None):
+    metrics = metrics or pipeline_metrics
+    start_time = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        metrics.observe_stage(stage_name, time.perf_counter() - start_time, failed=True)
+        raise
+    metrics.observe_stage(stage_name, time.perf_counter() - start_time)
+
+
+def timed_stage(stage_function):
+    # Records each call of the decorated function under its own name
+    @wraps(stage_function)
+    def run_timed_stage(*args, **kwargs):
+        with stage_span(stage_function.__name__):
+            return stage_function(*args, **kwargs)
+    return run_timed_stage
+
+
+def add_rows(operation, row_count):
+    pipeline_metrics.add_rows(operation, row_count)
+
+
+def add_tickers(outcome, ticker_count):
+    pipeline_metrics.add_tickers(outcome, ticker_count)
+
+
+@contextmanager
+def profile_run(profile_file=None, trace_memory=False):
+    # Opt-in: profile_file saves cProfile stats for snakeviz / pstats and prints the top functions;
+    # trace_memory reports the peak and the lines that allocated the most. Both add noticeable overhead.
+    profiler = cProfile.Profile() if profile_file else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_file)
+            profile_output = io.StringIO()
+            pstats.Stats(profiler, stream=profile_output).sort_stats('cumulative').print_stats(profile_top_functions)
+            print(f"    Profile written to {profile_file}")
+            print(profile_output.getvalue())
+        if trace_memory:
+            memory_snapshot = tracemalloc.take_snapshot()
+            current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"    Traced memory: current {current_bytes / 1048576:.1f} MiB, peak {peak_bytes / 1048576:.1f} MiB")
+            for allocation_statistic in memory_snapshot.statistics('lineno')[:trace_memory_top_lines]:
+                print(f"      {allocation_statistic}")
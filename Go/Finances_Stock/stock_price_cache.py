@@ -0,0 +1,213 @@
+# pip install pandas sqlalchemy yfinance
+# Persistent on-disk cache in front of the Yahoo Finance price source.
+#
+# Bars are stored in a local SQLite file keyed by (Ticker, Interval, AsOfDate), and each (Ticker, Interval)
+# series remembers the date range it covers. A request only goes upstream for the part of the range that
+# is not covered yet, plus the tail of a series whose last fetch is older than the TTL (the latest bar of a
+# trading day keeps changing until the close). Whole series are evicted least recently used first once the
+# cache holds more than max_cached_bars bars.
+
+from datetime import date, timedelta
+
+import pandas as pd
+import sqlalchemy
+import threading
+import time
+import yfinance as yf
+
+cache_ttl_seconds = 6 * 60 * 60
+cache_max_cached_bars = 5000000
+price_columns = ['Open', 'Close', 'Low', 'High', 'Volume']
+select_series_statement = sqlalchemy.text("SELECT CoveredFrom, CoveredTo, FetchedAt FROM PriceSeries WHERE Ticker = :ticker AND Interval = :interval")
+insert_bar_statement = sqlalchemy.text("INSERT OR REPLACE INTO PriceBar (Ticker, Interval, AsOfDate, Open, Close, Low, High, Volume) VALUES (:Ticker, :Interval, :AsOfDate, :Open, :Close, :Low, :High, :Volume)")
+count_series_bars_statement = sqlalchemy.text("SELECT COUNT(*) FROM PriceBar WHERE Ticker = :ticker AND Interval = :interval")
+upsert_series_statement = sqlalchemy.text("INSERT OR REPLACE INTO PriceSeries (Ticker, Interval, CoveredFrom, CoveredTo, FetchedAt, LastAccessed, BarCount) VALUES (:ticker, :interval, :covered_from, :covered_to, :fetched_at, :last_accessed, :bar_count)")
+touch_series_statement = sqlalchemy.text("UPDATE PriceSeries SET LastAccessed = :now WHERE Ticker = :ticker AND Interval = :interval")
+select_bars_statement = sqlalchemy.text("SELECT AsOfDate, Open, Close, Low, High, Volume FROM PriceBar WHERE Ticker = :ticker AND Interval = :interval AND AsOfDate >= :start_date AND AsOfDate < :end_date ORDER BY AsOfDate")
+sum_cached_bars_statement = sqlalchemy.text("SELECT COALESCE(SUM(BarCount), 0) FROM PriceSeries")
+select_series_by_last_access_statement = sqlalchemy.text("SELECT Ticker, Interval, BarCount FROM PriceSeries ORDER BY LastAccessed")
+delete_series_bars_statement = sqlalchemy.text("DELETE FROM PriceBar WHERE Ticker = :ticker AND Interval = :interval")
+delete_series_statement = sqlalchemy.text("DELETE FROM PriceSeries WHERE Ticker = :ticker AND Interval = :interval")
+period_days = {'1d': 1, '5d': 5, '1mo': 31, '3mo': 92, '6mo': 183, '1y': 366, '2y': 731, '5y': 1827, '10y': 3653, 'max': 365 * 50}
+
+
+def get_period_date_range(period, end_date=None):
+    # Maps a yfinance period such as 5d or 1y onto an inclusive (start_date, end_date) range of calendar dates
+    end_date = end_date or date.today()
+    if period == 'ytd':
+        return date(end_date.year, 1, 1), end_date
+    if period not in period_days:
+        raise ValueError(f"Unsupported period for the price cache: {period}")
+    # 1d and 5d are trading days; widen by a weekend so the range still holds that many bars
+    extra_days = 3 if period in ('1d', '5d') else 0
+    return end_date - timedelta(days=period_days[period] - 1 + extra_days), end_date
+
+
+class YahooStockPriceFetcher:
+    # Fetchers return a yfinance-shaped DataFrame (DatetimeIndex, Open/Close/Low/High/Volume) for the
+    # inclusive date range. Any object with this fetch() method can be plugged into StockPriceCache.
+    def fetch(self, stock_ticker, start_date, end_date, interval):
+        stock_history = yf.Ticker(stock_ticker).history(start=start_date, end=end_date + timedelta(days=1), interval=interval)
+        return stock_history[price_columns] if len(stock_history) > 0 else pd.DataFrame(columns=price_columns)
+
+
+class FakeStockPriceFetcher:
+    # Deterministic offline data source: one bar per weekday, prices derived from the ticker and date
+    def __init__(self):
+        self.fetch_count = 0
+        self.fetched_ranges = []
+
+    def fetch(self, stock_ticker, start_date, end_date, interval):
+        self.fetch_count += 1
+        self.fetched_ranges.append((stock_ticker, start_date, end_date, interval))
+        as_of_dates = pd.bdate_range(start_date, end_date)
+        base_prices = (sum(ord(character) for character in stock_ticker) % 400 + 10) + (as_of_dates.dayofyear.to_numpy() % 30) / 10.0
+        return pd.DataFrame({'Open': base_prices,
+                             'Close': base_prices + 0.5,
+                             'Low': base_prices - 1.0,
+                             'High': base_prices + 1.0,
+                             'Volume': (base_prices * 1000).astype('int64')}, index=as_of_dates)
+
+
+class StockPriceCacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.upstream_fetches = 0
+        self.fetched_bars = 0
+        self.evicted_series = 0
+
+    def __str__(self):
+        return f"  Hits: {self.hits}, Misses: {self.misses}, UpstreamFetches: {self.upstream_fetches}, FetchedBars: {self.fetched_bars}, EvictedSeries: {self.evicted_series}"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class StockPriceCache:
+    def __init__(self, cache_database, fetcher=None, ttl_seconds=cache_ttl_seconds, max_cached_bars=cache_max_cached_bars):
+        self.fetcher = fetcher or YahooStockPriceFetcher()
+        self.ttl_seconds = ttl_seconds
+        self.max_cached_bars = max_cached_bars
+        self.stats = StockPriceCacheStats()
+        self.cache_lock = threading.Lock()
+        self.db_engine = sqlalchemy.create_engine(f"sqlite:///{cache_database}", connect_args={'check_same_thread': False})
+        with self.db_engine.begin() as db_connection:
+            db_connection.execute(sqlalchemy.text("""CREATE TABLE IF NOT EXISTS PriceBar (
+                Ticker TEXT NOT NULL, Interval TEXT NOT NULL, AsOfDate TEXT NOT NULL,
+                Open REAL, Close REAL, Low REAL, High REAL, Volume INTEGER,
+                PRIMARY KEY (Ticker, Interval, AsOfDate))"""))
+            db_connection.execute(sqlalchemy.text("""CREATE TABLE IF NOT EXISTS PriceSeries (
+                Ticker TEXT NOT NULL, Interval TEXT NOT NULL, CoveredFrom TEXT NOT NULL, CoveredTo TEXT NOT NULL,
+                FetchedAt REAL NOT NULL, LastAccessed REAL NOT NULL, BarCount INTEGER NOT NULL,
+                PRIMARY KEY (Ticker, Interval))"""))
+
+    def get_stock_history_for_period(self, stock_ticker, period, interval='1d'):
+        start_date, end_date = get_period_date_range(period)
+        stock_history = self.get_stock_history(stock_ticker, start_date, end_date, interval)
+        if period in ('1d', '5d'):
+            stock_history = stock_history.tail(int(period[:-1]))
+        return stock_history
+
+    def get_stock_history(self, stock_ticker, start_date, end_date, interval='1d'):
+        end_date = min(end_date, date.today())
+        with self.cache_lock:
+            series = self.get_series(stock_ticker, interval)
+        missing_ranges = self.get_missing_ranges(series, start_date, end_date)
+
+        if missing_ranges:
+            with self.cache_lock:
+                self.stats.misses += 1
+            for missing_start_date, missing_end_date in missing_ranges:
+                # Upstream calls run outside the lock so concurrent tickers are not serialised on the cache
+                fetched_history = self.fetcher.fetch(stock_ticker, missing_start_date, missing_end_date, interval)
+                with self.cache_lock:
+                    self.stats.upstream_fetches += 1
+                    self.stats.fetched_bars += len(fetched_history)
+                    self.store_bars(stock_ticker, interval, fetched_history)
+            # FetchedAt only moves when the tail of the series was fetched again, so a head-only backfill
+            # does not hide a stale last bar
+            tail_fetched = series is None or any(missing_end_date >= date.fromisoformat(series.CoveredTo) for missing_start_date, missing_end_date in missing_ranges)
+            with self.cache_lock:
+                self.store_series(stock_ticker, interval, series, start_date, end_date, tail_fetched)
+                self.evict_least_recently_used(stock_ticker, interval)
+        with self.cache_lock:
+            if not missing_ranges:
+                self.stats.hits += 1
+            return self.read_bars(stock_ticker, interval, start_date, end_date)
+
+    def get_series(self, stock_ticker, interval):
+        with self.db_engine.connect() as db_connection:
+            return db_connection.execute(select_series_statement, {'ticker': stock_ticker, 'interval': interval}).fetchone()
+
+    def get_missing_ranges(self, series, start_date, end_date):
+        if series is None:
+            return [(start_date, end_date)]
+
+        covered_from = date.fromisoformat(series.CoveredFrom)
+        covered_to = date.fromisoformat(series.CoveredTo)
+        # Missing ranges always reach back to the covered range so coverage stays one contiguous span
+        missing_ranges = []
+        # The last covered day may have been fetched intraday; once the TTL has passed it is fetched again,
+        # whether the request ends on it or extends past it
+        tail_is_stale = time.time() - series.FetchedAt > self.ttl_seconds
+        if start_date < covered_from:
+            missing_ranges.append((start_date, covered_from - timedelta(days=1)))
+        if end_date > covered_to:
+            missing_ranges.append((covered_to if tail_is_stale else covered_to + timedelta(days=1), end_date))
+        elif end_date == covered_to and tail_is_stale:
+            missing_ranges.append((covered_to, end_date))
+        return missing_ranges
+
+    def store_bars(self, stock_ticker, interval, stock_history):
+        if len(stock_history) == 0:
+            return
+        as_of_dates = stock_history.index.tz_localize(None) if stock_history.index.tz is not None else stock_history.index
+        bars = pd.DataFrame({'Ticker': stock_ticker,
+                             'Interval': interval,
+                             'AsOfDate': as_of_dates.strftime("%Y-%m-%d %H:%M:%S"),
+                             'Open': stock_history['Open'].to_numpy(dtype='float64'),
+                             'Close': stock_history['Close'].to_numpy(dtype='float64'),
+                             'Low': stock_history['Low'].to_numpy(dtype='float64'),
+                             'High': stock_history['High'].to_numpy(dtype='float64'),
+                             'Volume': stock_history['Volume'].fillna(0).to_numpy(dtype='int64')})
+        with self.db_engine.begin() as db_connection:
+            db_connection.execute(insert_bar_statement, bars.to_dict('records'))
+
+    def store_series(self, stock_ticker, interval, series, start_date, end_date, tail_fetched=True):
+        covered_from = min(start_date, date.fromisoformat(series.CoveredFrom)) if series is not None else start_date
+        covered_to = max(end_date, date.fromisoformat(series.CoveredTo)) if series is not None else end_date
+        now = time.time()
+        with self.db_engine.begin() as db_connection:
+            bar_count = db_connection.execute(count_series_bars_statement, {'ticker': stock_ticker, 'interval': interval}).scalar()
+            fetched_at = now if tail_fetched or series is None else series.FetchedAt
+            db_connection.execute(upsert_series_statement,
+                                  {'ticker': stock_ticker, 'interval': interval, 'covered_from': covered_from.isoformat(), 'covered_to': covered_to.isoformat(),
+                                   'fetched_at': fetched_at, 'last_accessed': now, 'bar_count': bar_count})
+
+    def read_bars(self, stock_ticker, interval, start_date, end_date):
+        parameters = {'ticker': stock_ticker, 'interval': interval, 'start_date': start_date.isoformat(), 'end_date': (end_date + timedelta(days=1)).isoformat()}
+        with self.db_engine.begin() as db_connection:
+            db_connection.execute(touch_series_statement, {'now': time.time(), 'ticker': stock_ticker, 'interval': interval})
+            stock_history = pd.read_sql(select_bars_statement, db_connection, params=parameters)
+        return stock_history.set_index(pd.DatetimeIndex(pd.to_datetime(stock_history.pop('AsOfDate')), name='Date'))
+
+    def evict_least_recently_used(self, current_stock_ticker, current_interval):
+        # The series being served is never evicted, even when it alone is larger than the limit
+        with self.db_engine.begin() as db_connection:
+            cached_bar_count = db_connection.execute(sum_cached_bars_statement).scalar()
+            if cached_bar_count <= self.max_cached_bars:
+                return
+            for series in db_connection.execute(select_series_by_last_access_statement).fetchall():
+                if cached_bar_count <= self.max_cached_bars:
+                    break
+                if series.Ticker == current_stock_ticker and series.Interval == current_interval:
+                    continue
+                series_key = {'ticker': series.Ticker, 'interval': series.Interval}
+                db_connection.execute(delete_series_bars_statement, series_key)
+                db_connection.execute(delete_series_statement, series_key)
+                cached_bar_count -= series.BarCount
+                self.stats.evicted_series += 1
+
+    def close(self):
+        self.db_engine.dispose()
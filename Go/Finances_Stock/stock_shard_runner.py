@@ -0,0 +1,210 @@
+# Sharded ticker ingestion across processes or machines.
+#
+# Every ticker belongs to exactly one of N shards, chosen by a stable hash of the symbol, so any number of
+# getprices.py processes started with --shard 0/N ... --shard N-1/N split the universe between them without
+# talking to each other or to a coordination service. Each shard writes its own batch through the normal
+# DB path and can leave a JSON run summary; summaries from every process or node merge into one report.
+#
+#   python getprices.py --file tickers.txt --shard 3/8 --summary-file shard-3.json        (one of 8 nodes)
+#   python stock_shard_runner.py --processes 4 --fake-prices --sqlite local.db AAPL MSFT ...  (local test)
+#   python stock_shard_runner.py --merge shard-*.json
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+shard_runner_processes = 4
+shard_runner_summary_folder = 'shard_summaries'
+shard_log_tail_lines = 20
+
+
+def parse_shard(shard_text):
+    # "i/N" with a zero-based shard index, e.g. 3/8 is the fourth of eight shards
+    try:
+        shard_index, shard_count = (int(shard_part) for shard_part in shard_text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like i/N, got {shard_text}")
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise argparse.ArgumentTypeError(f"Shard index must be between 0 and {shard_count - 1}, got {shard_text}")
+    return shard_index, shard_count
+
+
+def get_ticker_shard(stock_ticker, shard_count):
+    # hash() is salted per process, so a digest keeps the assignment identical on every node and every run
+    ticker_digest = hashlib.blake2b(stock_ticker.strip().upper().encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(ticker_digest, 'big') % shard_count
+
+
+def select_shard_tickers(stock_tickers, shard_index, shard_count):
+    return [stock_ticker for stock_ticker in stock_tickers if get_ticker_shard(stock_ticker, shard_count) == shard_index]
+
+
+class ShardRunSummary:
+    def __init__(self, shard_index=0, shard_count=1):
+        self.shard_count = shard_count
+        self.shards = [shard_index]
+        self.hosts = [f"{socket.gethostname()}:{os.getpid()}"]
+        self.started_at = time.time()
+        self.finished_at = self.started_at
+        self.elapsed_seconds = 0.0
+        self.tickers_requested = 0
+        self.inserted_row_count = 0
+        self.updated_row_count = 0
+        self.skipped_row_count = 0
+        self.no_data_tickers = []
+        self.failed_tickers = {}
+
+    @property
+    def succeeded(self):
+        return len(self.failed_tickers) == 0
+
+    @property
+    def missing_shards(self):
+        return sorted(set(range(self.shard_count)) - set(self.shards))
+
+    def __str__(self):
+        return (f"  Shards: {len(self.shards)}/{self.shard_count}, Tickers: {self.tickers_requested}, Inserted: {self.inserted_row_count}, "
+                f"Updated: {self.updated_row_count}, Skipped: {self.skipped_row_count}, NoData: {len(self.no_data_tickers)}, "
+                f"Failed: {len(self.failed_tickers)}, WallSeconds: {self.finished_at - self.started_at:.2f}")
+
+    def __repr__(self):
+        return self.__str__()
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, summary_values):
+        run_summary = cls()
+        for summary_key, summary_value in summary_values.items():
+            setattr(run_summary, summary_key, summary_value)
+        return run_summary
+
+    def write(self, summary_file):
+        temporary_summary_file = summary_file + '.tmp'
+        with open(temporary_summary_file, 'w') as output_file:
+            json.dump(self.to_dict(), output_file, indent=2)
+        os.replace(temporary_summary_file, summary_file)
+
+    @classmethod
+    def read(cls, summary_file):
+        with open(summary_file) as input_file:
+            return cls.from_dict(json.load(input_file))
+
+    @classmethod
+    def merge(cls, run_summaries):
+        # Counts add up, wall time spans the earliest start to the latest finish. A shard reported twice
+        # (a rerun, or two nodes given the same --shard) is an error since its rows would be counted twice.
+        run_summaries = list(run_summaries)
+        if not run_summaries:
+            raise ValueError("No run summaries to merge")
+        shard_counts = {run_summary.shard_count for run_summary in run_summaries}
+        if len(shard_counts) != 1:
+            raise ValueError(f"Run summaries come from different shard counts: {sorted(shard_counts)}")
+        merged_shards = [shard for run_summary in run_summaries for shard in run_summary.shards]
+        duplicate_shards = sorted({shard for shard in merged_shards if merged_shards.count(shard) > 1})
+        if duplicate_shards:
+            raise ValueError(f"Shards reported more than once: {duplicate_shards}")
+
+        merged_summary = cls(shard_count=shard_counts.pop())
+        merged_summary.shards = sorted(merged_shards)
+        merged_summary.hosts = [host for run_summary in run_summaries for host in run_summary.hosts]
+        merged_summary.started_at = min(run_summary.started_at for run_summary in run_summaries)
+        merged_summary.finished_at = max(run_summary.finished_at for run_summary in run_summaries)
+        merged_summary.elapsed_seconds = sum(run_summary.elapsed_seconds for run_summary in run_summaries)
+        for run_summary in run_summaries:
+            merged_summary.tickers_requested += run_summary.tickers_requested
+            merged_summary.inserted_row_count += run_summary.inserted_row_count
+            merged_summary.updated_row_count += run_summary.updated_row_count
+            merged_summary.skipped_row_count += run_summary.skipped_row_count
+            merged_summary.no_data_tickers.extend(run_summary.no_data_tickers)
+            merged_summary.failed_tickers.update(run_summary.failed_tickers)
+        merged_summary.no_data_tickers.sort()
+        return merged_summary
+
+
+def print_merged_summary(merged_summary):
+    wall_seconds = merged_summary.finished_at - merged_summary.started_at
+    print(f"    Merged run summary:")
+    print(f"      Shards reported: {len(merged_summary.shards)} of {merged_summary.shard_count}")
+    if merged_summary.missing_shards:
+        print(f"      Shards missing: {merged_summary.missing_shards}")
+    print(f"      Tickers requested: {merged_summary.tickers_requested}")
+    print(f"      Rows written: {merged_summary.inserted_row_count + merged_summary.updated_row_count} (inserted {merged_summary.inserted_row_count}, updated {merged_summary.updated_row_count})")
+    print(f"      Rows skipped unchanged: {merged_summary.skipped_row_count}")
+    print(f"      Tickers without data: {len(merged_summary.no_data_tickers)}")
+    print(f"      Tickers failed: {len(merged_summary.failed_tickers)}")
+    for stock_ticker, reason in sorted(merged_summary.failed_tickers.items()):
+        print(f"        {stock_ticker}: {reason}")
+    print(f"      Wall seconds: {wall_seconds:.2f}, shard seconds: {merged_summary.elapsed_seconds:.2f}")
+    print(f"      Throughput: {merged_summary.tickers_requested / wall_seconds if wall_seconds > 0 else 0.0:.2f} tickers/second")
+
+
+def merge_summary_files(summary_files):
+    print(f"  START - {merge_summary_files.__name__}")
+    merged_summary = ShardRunSummary.merge(ShardRunSummary.read(summary_file) for summary_file in summary_files)
+    print_merged_summary(merged_summary)
+    print(f"    END - {merge_summary_files.__name__}")
+    return merged_summary
+
+
+def print_log_tail(log_file):
+    with open(log_file) as shard_log:
+        for line in shard_log.readlines()[-shard_log_tail_lines:]:
+            print(f"        {line.rstrip()}")
+
+
+def run_local_shards(getprices_arguments, process_count=shard_runner_processes, summary_folder=shard_runner_summary_folder):
+    # Starts one getprices.py process per shard on this machine, each with its own log and summary file,
+    # then merges the summaries. With --sqlite every process writes the same WAL-mode database file.
+    print(f"  START - {run_local_shards.__name__}")
+    os.makedirs(summary_folder, exist_ok=True)
+    for stale_file in glob.glob(os.path.join(summary_folder, 'shard-*')):
+        os.remove(stale_file)
+    getprices_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'getprices.py')
+
+    shard_processes = []
+    for shard_index in range(process_count):
+        summary_file = os.path.join(summary_folder, f"shard-{shard_index}.json")
+        log_file = os.path.join(summary_folder, f"shard-{shard_index}.log")
+        command = [sys.executable, getprices_script, *getprices_arguments, '--shard', f"{shard_index}/{process_count}", '--summary-file', summary_file]
+        with open(log_file, 'w') as shard_log:
+            shard_processes.append((shard_index, subprocess.Popen(command, stdout=shard_log, stderr=subprocess.STDOUT), summary_file, log_file))
+    print(f"    Started {process_count} shard processes, logs in {summary_folder}")
+
+    summary_files = []
+    for shard_index, shard_process, summary_file, log_file in shard_processes:
+        return_code = shard_process.wait()
+        if os.path.exists(summary_file):
+            summary_files.append(summary_file)
+        if return_code != 0:
+            print(f"    Shard {shard_index}/{process_count} exited with {return_code}, last lines of {log_file}:")
+            print_log_tail(log_file)
+
+    merged_summary = merge_summary_files(summary_files) if summary_files else None
+    print(f"    END - {run_local_shards.__name__}")
+    return merged_summary is not None and merged_summary.succeeded and not merged_summary.missing_shards
+
+
+def parse_arguments():
+    # Anything not recognised here is passed through to every getprices.py process
+    parser = argparse.ArgumentParser(description="Sharded stock data collection")
+    parser.add_argument("--processes", type=int, default=shard_runner_processes, help="Shard processes to run on this machine")
+    parser.add_argument("--summary-folder", dest="summary_folder", default=shard_runner_summary_folder, help="Folder for each shard's log and run summary")
+    parser.add_argument("--merge", nargs="+", metavar="SUMMARY_FILE", help="Only merge existing run summary files, e.g. collected from several nodes")
+    return parser.parse_known_args()
+
+
+if __name__ == "__main__":
+    print("Sharded stock data collection - version 0.1")
+    arguments, getprices_arguments = parse_arguments()
+    if arguments.merge:
+        merged_summary = merge_summary_files(arguments.merge)
+        exit(0 if merged_summary.succeeded and not merged_summary.missing_shards else 1)
+    exit(0 if run_local_shards(getprices_arguments, max(1, arguments.processes), arguments.summary_folder) else 1)
@@ -0,0 +1,58 @@
+from stock_info import StockInfo
+
+import getprices
+import os
+import pandas as pd
+import stock_analytics
+import tempfile
+import unittest
+
+
+def get_stock_history(days):
+    return pd.DataFrame([{'Ticker': stock_ticker, 'AsOfDate': pd.Timestamp(2024, 3, 1) + pd.Timedelta(days=day),
+                          'OpeningPrice': 10.0 + day, 'ClosingPrice': 10.5 + day + ticker_index, 'LowPrice': 9.5 + day, 'HighPrice': 11.0 + day,
+                          'Volume': 1000 + 10 * day}
+                         for ticker_index, stock_ticker in enumerate(('AAA', 'BBB')) for day in days]).astype({'AsOfDate': 'datetime64[ns]'})
+
+
+class StockAnalyticsUnitTestSuite(unittest.TestCase):
+
+    def assert_indicators_equal(self, indicators, expected_indicators):
+        pd.testing.assert_frame_equal(indicators.sort_values(['Ticker', 'AsOfDate']).reset_index(drop=True),
+                                      expected_indicators.sort_values(['Ticker', 'AsOfDate']).reset_index(drop=True))
+
+    def test_case1_incremental_run_matches_full_run(self):
+        full_indicators, full_state = stock_analytics.compute_stock_indicators(get_stock_history(range(30)), window=5)
+        first_indicators, state = stock_analytics.compute_stock_indicators(get_stock_history(range(20)), window=5)
+        second_indicators, state = stock_analytics.compute_stock_indicators(get_stock_history(range(20, 30)), state=state)
+
+        self.assert_indicators_equal(pd.concat([first_indicators, second_indicators]), full_indicators)
+        pd.testing.assert_frame_equal(state.cumulative_totals.sort_index(), full_state.cumulative_totals.sort_index())
+
+    def test_case2_overlapping_rerun_only_adds_later_bars(self):
+        full_indicators, full_state = stock_analytics.compute_stock_indicators(get_stock_history(range(30)), window=5)
+        first_indicators, state = stock_analytics.compute_stock_indicators(get_stock_history(range(20)), window=5)
+        second_indicators, state = stock_analytics.compute_stock_indicators(get_stock_history(range(15, 30)), state=state)
+
+        self.assertEqual(len(second_indicators), 20)
+        self.assert_indicators_equal(pd.concat([first_indicators, second_indicators]), full_indicators)
+        self.assertFalse(state.tail_history.duplicated(['Ticker', 'AsOfDate']).any())
+        pd.testing.assert_frame_equal(state.cumulative_totals.sort_index(), full_state.cumulative_totals.sort_index())
+
+    def test_case3_iterated_chunks_yield_their_state(self):
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            db_engine = getprices.get_sqlite_db_engine(os.path.join(temporary_folder, 'stock_info.db'))
+            stock_history = get_stock_history(range(30))
+            getprices.upsert_stock_info_bulk(db_engine, [StockInfo(row.Ticker, f"{row.AsOfDate:%Y-%m-%d}", row.OpeningPrice, row.ClosingPrice, row.LowPrice, row.HighPrice, row.Volume)
+                                                         for row in stock_history.itertuples()])
+            chunk_results = list(stock_analytics.iterate_stock_indicators(db_engine, ['AAA', 'BBB'], '2024-03-01', '2024-03-30', window=5, chunk_rows=25))
+            db_engine.dispose()
+        full_indicators, full_state = stock_analytics.compute_stock_indicators(stock_history, window=5)
+
+        self.assertEqual(len(chunk_results), 3)
+        self.assert_indicators_equal(pd.concat([indicators for indicators, state in chunk_results]), full_indicators)
+        pd.testing.assert_frame_equal(chunk_results[-1][1].cumulative_totals.sort_index(), full_state.cumulative_totals.sort_index())
+
+
+if __name__ == '__main__':
+    unittest.main()
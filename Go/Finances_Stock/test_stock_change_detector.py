@@ -0,0 +1,71 @@
+from datetime import date
+from stock_change_detector import StockInfoChangeDetector
+from stock_info import StockInfo, StockInfoBatch
+
+import getprices
+import os
+import tempfile
+import unittest
+
+
+def get_stock_info_batch(closing_offset=0.0):
+    return StockInfoBatch.from_stock_infos([StockInfo(stock_ticker, f"2024-03-{day:02d}", 10.0 + day, 10.5 + day + closing_offset, 9.0 + day, 11.0 + day, 1000 * day)
+                                            for stock_ticker in ('AAA', 'BBB') for day in (11, 12, 13)])
+
+
+def get_stock_info_parameters(closing_offset=0.0):
+    return get_stock_info_batch(closing_offset).to_parameters()
+
+
+class StockChangeDetectorUnitTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary_folder = tempfile.TemporaryDirectory()
+        self.db_engine = getprices.get_sqlite_db_engine(os.path.join(self.temporary_folder.name, 'stock_info.db'))
+
+    def tearDown(self):
+        self.db_engine.dispose()
+        self.temporary_folder.cleanup()
+
+    def test_case1_stored_bars_are_skipped(self):
+        getprices.upsert_stock_info_bulk(self.db_engine, get_stock_info_batch())
+        change_detector = StockInfoChangeDetector(load_chunk_size=1)
+        change_detector.load(self.db_engine, ['AAA', 'BBB'], date(2024, 3, 12))
+
+        changed_parameters, changed_hashes = change_detector.get_changed_parameters(get_stock_info_parameters())
+        self.assertEqual(change_detector.stats.loaded_hashes, 4)
+        # Only the 11th is outside the loaded range, so it is the only bar treated as new
+        self.assertEqual(sorted((parameter['ticker'], parameter['as_of_date']) for parameter in changed_parameters), [('AAA', '2024-03-11'), ('BBB', '2024-03-11')])
+
+    def test_case2_changed_values_are_written_once(self):
+        change_detector = StockInfoChangeDetector()
+        changed_parameters, changed_hashes = change_detector.get_changed_parameters(get_stock_info_parameters())
+        self.assertEqual(len(changed_parameters), 6)
+        change_detector.mark_written(changed_hashes)
+
+        self.assertEqual(change_detector.get_changed_parameters(get_stock_info_parameters())[0], [])
+        revised_parameters, revised_hashes = change_detector.get_changed_parameters(get_stock_info_parameters(closing_offset=0.25))
+        self.assertEqual(len(revised_parameters), 6)
+        self.assertEqual((change_detector.stats.checked_rows, change_detector.stats.changed_rows, change_detector.stats.skipped_rows), (18, 12, 6))
+
+    def test_case3_hashes_agree_across_value_types(self):
+        # A fetched bar (float volume, text date) and the stored row (int volume, date object) hash the same
+        change_detector = StockInfoChangeDetector()
+        change_detector.mark_parameters_written([{'ticker': 'AAA', 'as_of_date': date(2024, 3, 11), 'opening_price': 10, 'closing_price': 11,
+                                                  'low_price': 9, 'high_price': 12, 'volume': 500}])
+        fetched_parameters = [{'ticker': 'AAA', 'as_of_date': '2024-03-11', 'opening_price': 10.0, 'closing_price': 11.0,
+                               'low_price': 9.0, 'high_price': 12.0, 'volume': 500.0}]
+        self.assertEqual(change_detector.get_changed_parameters(fetched_parameters)[0], [])
+
+
+    def test_case4_load_without_from_date_has_no_date_predicate(self):
+        getprices.upsert_stock_info_bulk(self.db_engine, get_stock_info_batch())
+        change_detector = StockInfoChangeDetector()
+        change_detector.load(self.db_engine, ['AAA', 'BBB'])
+
+        self.assertNotIn('AsOfDate >=', str(change_detector.select_content_statement))
+        self.assertEqual(change_detector.stats.loaded_hashes, 6)
+        self.assertEqual(change_detector.get_changed_parameters(get_stock_info_parameters())[0], [])
+
+if __name__ == '__main__':
+    unittest.main()
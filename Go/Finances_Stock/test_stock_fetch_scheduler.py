@@ -0,0 +1,109 @@
+from stock_fetch_scheduler import FlakyStockFetcher, StockFetchScheduler, iterate_scheduled_fetches
+
+import asyncio
+import random
+import threading
+import time
+import unittest
+
+
+class ConcurrencyTrackingFetcher:
+    # Wraps a FlakyStockFetcher and records the most calls it had in flight at once
+    def __init__(self, stock_fetcher):
+        self.stock_fetcher = stock_fetcher
+        self.active_calls = 0
+        self.max_active_calls = 0
+        self.tracking_lock = threading.Lock()
+
+    def __call__(self, ticker):
+        with self.tracking_lock:
+            self.active_calls += 1
+            self.max_active_calls = max(self.max_active_calls, self.active_calls)
+        try:
+            return self.stock_fetcher(ticker)
+        finally:
+            with self.tracking_lock:
+                self.active_calls -= 1
+
+
+class StockFetchSchedulerUnitTestSuite(unittest.TestCase):
+
+    def test_case1_token_bucket_caps_the_request_rate(self):
+        stock_fetcher = FlakyStockFetcher(latency_seconds=0)
+        stock_fetch_scheduler = StockFetchScheduler(stock_fetcher, requests_per_second=20, burst=1, max_concurrency=8)
+        start_time = time.perf_counter()
+        fetch_results = asyncio.run(stock_fetch_scheduler.fetch_many([f"T{ticker_index:02d}" for ticker_index in range(10)]))
+        elapsed_seconds = time.perf_counter() - start_time
+
+        # One token up front, then nine more at 20 per second
+        self.assertGreaterEqual(elapsed_seconds, 0.4)
+        self.assertGreater(stock_fetch_scheduler.token_bucket.waited_seconds, 0.4)
+        self.assertEqual(stock_fetch_scheduler.stats.upstream_calls, 10)
+        self.assertTrue(all(fetch_result.error is None for fetch_result in fetch_results.values()))
+
+    def test_case2_errors_are_retried_with_jittered_backoff(self):
+        stock_fetcher = FlakyStockFetcher(latency_seconds=0, failures_before_success=2)
+        stock_fetch_scheduler = StockFetchScheduler(stock_fetcher, requests_per_second=1000, burst=100, base_backoff_seconds=0.01, max_backoff_seconds=0.04)
+        fetch_result = asyncio.run(stock_fetch_scheduler.fetch_many(['AAA']))['AAA']
+
+        self.assertIsNone(fetch_result.error)
+        self.assertEqual(fetch_result.result, 'AAA')
+        self.assertEqual(fetch_result.attempts, 3)
+        self.assertEqual(stock_fetch_scheduler.stats.retries, 2)
+        random.seed(42)
+        backoff_seconds = [stock_fetch_scheduler.get_backoff_seconds(attempt) for attempt in (0, 3, 3, 3)]
+        self.assertTrue(0 <= backoff_seconds[0] <= 0.01)
+        # Capped at max_backoff_seconds, and spread rather than the same delay every time
+        self.assertTrue(all(0 <= backoff <= 0.04 for backoff in backoff_seconds[1:]))
+        self.assertEqual(len(set(backoff_seconds[1:])), 3)
+
+    def test_case3_duplicate_tickers_share_one_upstream_call(self):
+        stock_fetcher = FlakyStockFetcher(latency_seconds=0.05)
+        stock_fetch_scheduler = StockFetchScheduler(stock_fetcher, requests_per_second=1000, burst=100)
+        fetch_results = asyncio.run(stock_fetch_scheduler.fetch_many(['AAA', 'AAA', 'BBB', 'AAA']))
+
+        self.assertEqual(stock_fetcher.call_counts, {'AAA': 1, 'BBB': 1})
+        self.assertEqual(stock_fetch_scheduler.stats.requests, 4)
+        self.assertEqual(stock_fetch_scheduler.stats.coalesced, 2)
+        self.assertEqual(fetch_results['AAA'].result, 'AAA')
+
+    def test_case4_ticker_deadline_covers_every_attempt(self):
+        stock_fetcher = FlakyStockFetcher(latency_seconds=0.05, failures_before_success=100)
+        stock_fetch_scheduler = StockFetchScheduler(stock_fetcher, requests_per_second=1000, burst=100, max_attempts=100,
+                                                    base_backoff_seconds=0.05, max_backoff_seconds=0.05, ticker_deadline_seconds=0.3)
+        fetch_result = asyncio.run(stock_fetch_scheduler.fetch_many(['AAA']))['AAA']
+
+        self.assertIsInstance(fetch_result.error, TimeoutError)
+        self.assertLess(fetch_result.elapsed_seconds, 1.0)
+        self.assertLess(fetch_result.attempts, 100)
+        self.assertEqual(stock_fetch_scheduler.stats.deadline_exceeded, 1)
+        self.assertEqual(stock_fetch_scheduler.stats.failures, 1)
+
+    def test_case5_concurrency_is_bounded(self):
+        tracking_fetcher = ConcurrencyTrackingFetcher(FlakyStockFetcher(latency_seconds=0.05))
+        stock_fetch_scheduler = StockFetchScheduler(tracking_fetcher, requests_per_second=1000, burst=100, max_concurrency=3)
+        fetch_results = list(iterate_scheduled_fetches(stock_fetch_scheduler, [f"T{ticker_index:02d}" for ticker_index in range(12)]))
+
+        self.assertEqual(len(fetch_results), 12)
+        self.assertEqual(tracking_fetcher.max_active_calls, 3)
+
+    def test_case6_empty_results_are_only_retried_when_asked(self):
+        empty_fetch_counts = []
+
+        def fetch_nothing(ticker):
+            empty_fetch_counts.append(ticker)
+            return None
+
+        for retry_empty_results, expected_attempts in ((False, 1), (True, 3)):
+            empty_fetch_counts.clear()
+            stock_fetch_scheduler = StockFetchScheduler(fetch_nothing, requests_per_second=1000, burst=100, max_attempts=3,
+                                                        base_backoff_seconds=0.001, retry_empty_results=retry_empty_results)
+            fetch_result = asyncio.run(stock_fetch_scheduler.fetch_many(['DELISTED']))['DELISTED']
+
+            self.assertIsNone(fetch_result.result)
+            self.assertEqual(fetch_result.attempts, expected_attempts)
+            self.assertEqual(len(empty_fetch_counts), expected_attempts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+from stock_group_fetcher import FakeGroupPriceDownloader, StockGroupFetcher, price_columns, split_group_history
+
+import numpy as np
+import pandas as pd
+import unittest
+
+
+class RecordingGroupPriceDownloader(FakeGroupPriceDownloader):
+    # Remembers the size of every group it was asked for, failed ones included
+    def __init__(self, **downloader_arguments):
+        super().__init__(**downloader_arguments)
+        self.group_sizes = []
+
+    def download(self, stock_tickers, period, interval):
+        self.group_sizes.append(len(stock_tickers))
+        return super().download(stock_tickers, period, interval)
+
+
+def fetch_no_history(stock_ticker, period, interval):
+    return None
+
+
+class StockGroupFetcherUnitTestSuite(unittest.TestCase):
+
+    def test_case1_wide_frame_is_split_per_ticker(self):
+        as_of_dates = pd.bdate_range('2024-03-04', periods=3)
+        group_history = pd.concat({
+            'AAA': pd.DataFrame({'Open': [10.0, 11.0, 12.0], 'Close': [10.5, 11.5, 12.5], 'Low': [9.5, 10.5, 11.5], 'High': [11.0, 12.0, 13.0], 'Volume': [100, 200, 300]}, index=as_of_dates),
+            # BBB has no bar on the first day of the union index
+            'BBB': pd.DataFrame({'Close': [np.nan, 20.5, 21.5], 'Volume': [np.nan, 400, 500], 'Open': [np.nan, 20.0, 21.0], 'High': [np.nan, 21.0, 22.0], 'Low': [np.nan, 19.5, 20.5]}, index=as_of_dates)
+        }, axis=1)
+        stock_histories = split_group_history(group_history, ['AAA', 'BBB', 'MISSING'])
+
+        self.assertEqual(sorted(stock_histories), ['AAA', 'BBB'])
+        self.assertEqual(list(stock_histories['BBB'].columns), price_columns)
+        self.assertEqual(len(stock_histories['AAA']), 3)
+        self.assertEqual(stock_histories['BBB'].index.tolist(), as_of_dates[1:].tolist())
+        self.assertEqual(stock_histories['BBB']['Close'].tolist(), [20.5, 21.5])
+        self.assertEqual(split_group_history(pd.DataFrame(), ['AAA']), {})
+
+    def test_case2_group_shrinks_on_errors(self):
+        group_downloader = RecordingGroupPriceDownloader(base_latency_seconds=0, per_ticker_latency_seconds=0, max_accepted_size=10)
+        stock_group_fetcher = StockGroupFetcher(fetch_no_history, downloader=group_downloader, initial_group_size=40)
+        fetch_results = list(stock_group_fetcher.fetch([f"T{ticker_index:02d}" for ticker_index in range(60)], '5d', '1d'))
+
+        self.assertEqual(group_downloader.group_sizes[:3], [40, 20, 10])
+        self.assertGreaterEqual(stock_group_fetcher.stats.group_failures, 2)
+        self.assertEqual(stock_group_fetcher.stats.fallback_fetches, 0)
+        self.assertTrue(all(stock_history is not None for stock_ticker, stock_history, fetch_error in fetch_results))
+        self.assertEqual(len(fetch_results), 60)
+
+    def test_case3_group_shrinks_on_high_latency(self):
+        group_downloader = RecordingGroupPriceDownloader(base_latency_seconds=0, per_ticker_latency_seconds=0.02)
+        stock_group_fetcher = StockGroupFetcher(fetch_no_history, downloader=group_downloader, initial_group_size=20, target_seconds=0.15)
+        list(stock_group_fetcher.fetch([f"T{ticker_index:02d}" for ticker_index in range(50)], '5d', '1d'))
+
+        # 20 symbols take 0.4s and 10 take 0.2s, both over target; 5 take 0.1s and the next group grows again
+        self.assertEqual(group_downloader.group_sizes[:4], [20, 10, 5, 6])
+        self.assertEqual(stock_group_fetcher.stats.group_failures, 0)
+
+    def test_case4_group_grows_back_on_fast_successes(self):
+        stock_group_fetcher = StockGroupFetcher(fetch_no_history, downloader=FakeGroupPriceDownloader(), initial_group_size=4, max_group_size=12)
+        group_sizes = []
+        for group_failed in (False, False, False, True, False, False, False, False):
+            stock_group_fetcher.adapt_group_size(group_failed, 0.01)
+            group_sizes.append(stock_group_fetcher.group_size)
+
+        # Multiplicative growth to the cap, halved by the failure, then one symbol at a time past the size that failed
+        self.assertEqual(group_sizes, [6, 9, 12, 6, 7, 8, 9, 10])
+        self.assertEqual(stock_group_fetcher.stats.group_size, 10)
+
+    def test_case5_fallback_refetches_only_the_missing_symbols(self):
+        fallback_tickers = []
+
+        def fetch_single_stock_history(stock_ticker, period, interval):
+            fallback_tickers.append(stock_ticker)
+            if stock_ticker == 'DDD':
+                raise ConnectionError("Simulated fallback failure")
+            return f"{stock_ticker} history"
+
+        group_downloader = FakeGroupPriceDownloader(base_latency_seconds=0, per_ticker_latency_seconds=0, missing_tickers={'BBB', 'DDD'})
+        stock_group_fetcher = StockGroupFetcher(fetch_single_stock_history, downloader=group_downloader)
+        fetch_results = {stock_ticker: (stock_history, fetch_error) for stock_ticker, stock_history, fetch_error
+                         in stock_group_fetcher.fetch(['AAA', 'BBB', 'CCC', 'DDD', 'EEE'], '5d', '1d')}
+
+        self.assertEqual(fallback_tickers, ['BBB', 'DDD'])
+        self.assertEqual(fetch_results['BBB'], ('BBB history', None))
+        self.assertIsInstance(fetch_results['DDD'][1], ConnectionError)
+        self.assertEqual(len(fetch_results['AAA'][0]), 5)
+        self.assertEqual(group_downloader.group_call_count, 1)
+        self.assertEqual(stock_group_fetcher.stats.symbol_requests, 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+from stock_info import StockInfo
+
+import getprices
+import os
+import stock_info_reader
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+class StockInfoReaderUnitTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary_folder = tempfile.TemporaryDirectory()
+        self.db_engine = getprices.get_sqlite_db_engine(os.path.join(self.temporary_folder.name, 'stock_info.db'))
+        stock_info_reader.ensure_stock_info_indexes(self.db_engine)
+
+    def tearDown(self):
+        self.db_engine.dispose()
+        self.temporary_folder.cleanup()
+
+    def test_case1_daily_range_reads_in_chunks(self):
+        stock_infos = [StockInfo(stock_ticker, f"2024-03-{day:02d}", 10.0, 10.5, 9.5, 11.0, day) for stock_ticker in ('BBB', 'AAA') for day in range(4, 16)]
+        getprices.upsert_stock_info_bulk(self.db_engine, stock_infos)
+        stock_info_batches = list(stock_info_reader.iterate_stock_info_range(self.db_engine, ['AAA', 'BBB'], '2024-03-05', '2024-03-14', chunk_rows=7))
+        stock_info_batch = stock_info_reader.read_stock_info_range(self.db_engine, ['AAA', 'BBB'], '2024-03-05', '2024-03-14')
+
+        self.assertEqual([len(chunk_batch) for chunk_batch in stock_info_batches], [7, 7, 6])
+        self.assertIsNone(stock_info_batch.as_of_seconds)
+        self.assertEqual(stock_info_batch[0].ticker, 'AAA')
+        self.assertEqual(stock_info_batch[0].as_of_date, '2024-03-05')
+        self.assertEqual(stock_info_batch[19].as_of_date, '2024-03-14')
+
+    def test_case2_intraday_bars_keep_their_time(self):
+        stock_infos = [StockInfo('AAA', f"2024-03-11 {hour:02d}:30:00", 10.0, 10.5, 9.5, 11.0, hour) for hour in (10, 11, 12)]
+        getprices.upsert_stock_info_bulk(self.db_engine, stock_infos)
+        stock_info_batch = stock_info_reader.read_ticker_range(self.db_engine, 'AAA', '2024-03-11', '2024-03-12')
+
+        self.assertEqual(stock_info_batch.get_as_of_date_strings().tolist(), ['2024-03-11 10:30:00', '2024-03-11 11:30:00', '2024-03-11 12:30:00'])
+        self.assertEqual(len(stock_info_batch.to_parameters()), 3)
+        self.assertEqual(stock_info_batch.to_frame()['AsOfDate'].dt.hour.tolist(), [10, 11, 12])
+
+    def test_case3_reader_does_not_import_the_collector(self):
+        imported_modules = subprocess.run([sys.executable, '-c', 'import stock_info_reader, sys; print("getprices" in sys.modules, "yfinance" in sys.modules)'],
+                                          cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout
+        self.assertEqual(imported_modules.strip(), 'False False')
+
+    def test_case4_intraday_bars_on_the_end_date_are_included(self):
+        stock_infos = [StockInfo('AAA', as_of_date, 10.0, 10.5, 9.5, 11.0, 100) for as_of_date in
+                       ('2024-03-10 15:30:00', '2024-03-11 09:30:00', '2024-03-12 00:00:00', '2024-03-12 15:30:00', '2024-03-13 09:30:00')]
+        getprices.upsert_stock_info_bulk(self.db_engine, stock_infos)
+        stock_info_batch = stock_info_reader.read_ticker_range(self.db_engine, 'AAA', '2024-03-11', '2024-03-12')
+
+        self.assertEqual(stock_info_batch.get_as_of_date_strings().tolist(), ['2024-03-11 09:30:00', '2024-03-12 00:00:00', '2024-03-12 15:30:00'])
+        self.assertEqual(stock_info_reader.get_end_date_exclusive('2024-03-12 15:30:00').isoformat(), '2024-03-13')
+
+
+if __name__ == '__main__':
+    unittest.main()
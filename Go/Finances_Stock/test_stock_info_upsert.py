@@ -0,0 +1,73 @@
+from stock_change_detector import StockInfoChangeDetector
+from stock_info import StockInfo, StockInfoBatch
+
+import getprices
+import os
+import sqlalchemy
+import tempfile
+import unittest
+
+
+def get_stock_infos(closing_offset=0.0):
+    return [StockInfo(stock_ticker, f"2024-03-{day:02d}", 10.0 + day, 10.5 + day + closing_offset, 9.0 + day, 11.0 + day, 1000 * day)
+            for stock_ticker in ('AAA', 'BBB') for day in (11, 12, 13)]
+
+
+class StockInfoUpsertUnitTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary_folder = tempfile.TemporaryDirectory()
+        self.db_engine = getprices.get_sqlite_db_engine(os.path.join(self.temporary_folder.name, 'stock_info.db'))
+
+    def tearDown(self):
+        self.db_engine.dispose()
+        self.temporary_folder.cleanup()
+
+    def get_stored_rows(self):
+        with self.db_engine.connect() as db_connection:
+            return db_connection.execute(sqlalchemy.text("SELECT Ticker, AsOfDate, ClosingPrice, Volume FROM StockInfo ORDER BY Ticker, AsOfDate")).fetchall()
+
+    def test_case1_bulk_upsert_inserts_then_updates(self):
+        insert_result = getprices.upsert_stock_info_bulk(self.db_engine, get_stock_infos(), chunk_size=4)
+        update_result = getprices.upsert_stock_info_bulk(self.db_engine, get_stock_infos(closing_offset=1.0), chunk_size=4)
+
+        self.assertEqual((insert_result.chunk_count, insert_result.inserted_row_count, insert_result.updated_row_count), (2, 6, 0))
+        self.assertEqual((update_result.inserted_row_count, update_result.updated_row_count), (0, 6))
+        self.assertEqual(self.get_stored_rows()[0], ('AAA', '2024-03-11', 22.5, 11000))
+
+    def test_case2_batches_and_last_duplicate_wins(self):
+        stock_infos = get_stock_infos() + [StockInfo('AAA', '2024-03-11', 1.0, 2.0, 0.5, 2.5, 7)]
+        stock_info_batch = StockInfoBatch.from_stock_infos(stock_infos)
+        upsert_result = getprices.upsert_stock_info_bulk(self.db_engine, stock_info_batch)
+
+        self.assertEqual(upsert_result.inserted_row_count, 6)
+        self.assertEqual(self.get_stored_rows()[0], ('AAA', '2024-03-11', 2.0, 7))
+
+    def test_case3_intraday_bars_stay_distinct(self):
+        stock_infos = [StockInfo('AAA', f"2024-03-11 {hour:02d}:00:00", 10.0, 10.5, 9.5, 11.0, hour) for hour in (10, 11, 12)]
+        upsert_result = getprices.upsert_stock_info_bulk(self.db_engine, stock_infos)
+        self.assertEqual(upsert_result.inserted_row_count, 3)
+        self.assertEqual(len(self.get_stored_rows()), 3)
+
+    def test_case4_failed_chunk_is_retried_row_by_row(self):
+        stock_infos = get_stock_infos()
+        stock_infos[1] = StockInfo('BAD', '2024-03-12', 1.0, 1.0, 1.0, 1.0, None)
+        change_detector = StockInfoChangeDetector()
+        upsert_result = getprices.upsert_stock_info_bulk(self.db_engine, stock_infos, change_detector=change_detector)
+
+        self.assertEqual(upsert_result.inserted_row_count, 5)
+        self.assertEqual(list(upsert_result.failed_tickers), ['BAD'])
+        # Rows written by the retry are known to the detector, so the next chunk with them is skipped
+        rerun_result = getprices.upsert_stock_info_bulk(self.db_engine, [stock_infos[0]], change_detector=change_detector)
+        self.assertEqual((rerun_result.inserted_row_count, rerun_result.updated_row_count, rerun_result.skipped_row_count), (0, 0, 1))
+
+    def test_case5_single_row_upsert_skips_unchanged_row(self):
+        stock_info = get_stock_infos()[0]
+        self.assertEqual(getprices.upsert_stock_info(self.db_engine, stock_info), 'INSERT')
+        self.assertEqual(getprices.upsert_stock_info(self.db_engine, stock_info), 'SKIP')
+        stock_info.closing_price += 1.0
+        self.assertEqual(getprices.upsert_stock_info(self.db_engine, stock_info), 'UPDATE')
+
+
+if __name__ == '__main__':
+    unittest.main()
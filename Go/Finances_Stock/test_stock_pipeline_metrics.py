@@ -0,0 +1,43 @@
+from stock_group_fetcher import FakeGroupPriceDownloader, StockGroupFetcher
+from stock_pipeline_metrics import pipeline_metrics
+from stock_price_cache import FakeStockPriceFetcher, StockPriceCache
+
+import getprices
+import os
+import tempfile
+import unittest
+
+
+class StockPipelineMetricsUnitTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary_folder = tempfile.TemporaryDirectory()
+        # Fallback fetches go through get_stock_price(), served offline by the price cache
+        getprices.stock_price_cache = StockPriceCache(os.path.join(self.temporary_folder.name, 'price_cache.db'), fetcher=FakeStockPriceFetcher())
+        pipeline_metrics.reset()
+
+    def tearDown(self):
+        getprices.stock_price_cache.close()
+        getprices.stock_price_cache = None
+        pipeline_metrics.reset()
+        self.temporary_folder.cleanup()
+
+    def test_case1_group_and_fallback_rows_are_counted_once(self):
+        stock_group_fetcher = StockGroupFetcher(getprices.get_stock_price, downloader=FakeGroupPriceDownloader(base_latency_seconds=0, per_ticker_latency_seconds=0, missing_tickers={'BBB'}))
+        fetch_results = list(getprices.fetch_stock_info_groups(stock_group_fetcher, ['AAA', 'BBB', 'CCC'], '5d', '1d'))
+
+        self.assertEqual(stock_group_fetcher.stats.fallback_fetches, 1)
+        self.assertEqual(pipeline_metrics.row_counts['fetched'], sum(len(stock_infos) for stock_ticker, stock_infos, fetch_error in fetch_results))
+
+    def test_case2_ticker_counts_have_their_own_metric(self):
+        getprices.add_tickers('requested', 3)
+        getprices.add_rows('inserted', 10)
+        prometheus_text = pipeline_metrics.to_prometheus_text()
+
+        self.assertIn('stock_pipeline_tickers_total{outcome="requested"} 3', prometheus_text)
+        self.assertIn('stock_pipeline_rows_total{operation="inserted"} 10', prometheus_text)
+        self.assertNotIn('operation="tickers_requested"', prometheus_text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+from datetime import date
+from stock_price_cache import FakeStockPriceFetcher, StockPriceCache
+
+import os
+import sqlalchemy
+import tempfile
+import unittest
+
+
+class ChangingStockPriceFetcher(FakeStockPriceFetcher):
+    # Adds closing_offset to every close, so a test can make the upstream revise bars it already served
+    def __init__(self):
+        super().__init__()
+        self.closing_offset = 0.0
+
+    def fetch(self, stock_ticker, start_date, end_date, interval):
+        stock_history = super().fetch(stock_ticker, start_date, end_date, interval)
+        stock_history['Close'] = stock_history['Close'] + self.closing_offset
+        return stock_history
+
+
+class StockPriceCacheUnitTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary_folder = tempfile.TemporaryDirectory()
+        self.fetcher = ChangingStockPriceFetcher()
+        self.stock_price_cache = StockPriceCache(os.path.join(self.temporary_folder.name, 'price_cache.db'), fetcher=self.fetcher)
+
+    def tearDown(self):
+        self.stock_price_cache.close()
+        self.temporary_folder.cleanup()
+
+    def get_closing_price(self, stock_history, as_of_date):
+        return float(stock_history.loc[str(as_of_date), 'Close'])
+
+    def set_fetched_at(self, fetched_at):
+        with self.stock_price_cache.db_engine.begin() as db_connection:
+            db_connection.execute(sqlalchemy.text("UPDATE PriceSeries SET FetchedAt = :fetched_at"), {'fetched_at': fetched_at})
+
+    def get_fetched_at(self):
+        with self.stock_price_cache.db_engine.connect() as db_connection:
+            return db_connection.execute(sqlalchemy.text("SELECT FetchedAt FROM PriceSeries")).scalar()
+
+    def test_case1_covered_range_is_served_from_cache(self):
+        self.stock_price_cache.get_stock_history('AAA', date(2024, 3, 4), date(2024, 3, 8))
+        stock_history = self.stock_price_cache.get_stock_history('AAA', date(2024, 3, 5), date(2024, 3, 7))
+        self.assertEqual(self.fetcher.fetch_count, 1)
+        self.assertEqual(len(stock_history), 3)
+
+    def test_case2_only_missing_ranges_are_fetched(self):
+        self.stock_price_cache.get_stock_history('AAA', date(2024, 3, 6), date(2024, 3, 8))
+        self.stock_price_cache.get_stock_history('AAA', date(2024, 3, 4), date(2024, 3, 12))
+        self.assertEqual(self.fetcher.fetched_ranges[1:], [('AAA', date(2024, 3, 4), date(2024, 3, 5), '1d'),
+                                                          ('AAA', date(2024, 3, 9), date(2024, 3, 12), '1d')])
+
+    def test_case3_stale_tail_is_refetched_when_range_extends(self):
+        first_history = self.stock_price_cache.get_stock_history('AAA', date(2024, 3, 11), date(2024, 3, 12))
+        self.set_fetched_at(0)
+        self.fetcher.closing_offset = 100.0
+        second_history = self.stock_price_cache.get_stock_history('AAA', date(2024, 3, 11), date(2024, 3, 14))
+
+        self.assertEqual(self.fetcher.fetched_ranges[-1], ('AAA', date(2024, 3, 12), date(2024, 3, 14), '1d'))
+        self.assertEqual(self.get_closing_price(second_history, '2024-03-12'), self.get_closing_price(first_history, '2024-03-12') + 100.0)
+        self.assertEqual(self.get_closing_price(second_history, '2024-03-11'), self.get_closing_price(first_history, '2024-03-11'))
+
+    def test_case4_fresh_tail_is_not_refetched(self):
+        self.stock_price_cache.get_stock_history('AAA', date(2024, 3, 11), date(2024, 3, 12))
+        self.stock_price_cache.get_stock_history('AAA', date(2024, 3, 11), date(2024, 3, 14))
+        self.assertEqual(self.fetcher.fetched_ranges[-1], ('AAA', date(2024, 3, 13), date(2024, 3, 14), '1d'))
+
+    def test_case5_head_backfill_keeps_tail_fetched_at(self):
+        self.stock_price_cache.get_stock_history('AAA', date(2024, 3, 11), date(2024, 3, 14))
+        self.set_fetched_at(0)
+        self.stock_price_cache.get_stock_history('AAA', date(2024, 3, 4), date(2024, 3, 12))
+        self.assertEqual(self.fetcher.fetched_ranges[-1], ('AAA', date(2024, 3, 4), date(2024, 3, 10), '1d'))
+        self.assertEqual(self.get_fetched_at(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
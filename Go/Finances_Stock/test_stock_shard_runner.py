@@ -0,0 +1,56 @@
+from stock_shard_runner import ShardRunSummary, get_ticker_shard, parse_shard, select_shard_tickers
+
+import argparse
+import os
+import subprocess
+import sys
+import unittest
+
+stock_tickers = [f"T{ticker_index:04d}" for ticker_index in range(2000)]
+
+
+class StockShardRunnerUnitTestSuite(unittest.TestCase):
+
+    def test_case1_every_ticker_lands_in_exactly_one_shard(self):
+        shard_tickers = [select_shard_tickers(stock_tickers, shard_index, 8) for shard_index in range(8)]
+        self.assertEqual(sorted(stock_ticker for tickers in shard_tickers for stock_ticker in tickers), stock_tickers)
+        # A stable hash spreads 2000 symbols within a few percent of the 250 per shard average
+        self.assertTrue(all(200 < len(tickers) < 300 for tickers in shard_tickers))
+
+    def test_case2_assignment_is_stable_across_processes(self):
+        # Pinned values: a change here reshuffles every node's tickers
+        self.assertEqual([get_ticker_shard(stock_ticker, 8) for stock_ticker in ('AAPL', 'MSFT', 'GOOG', 'BRK-B')], [4, 2, 0, 6])
+        self.assertEqual(get_ticker_shard(' aapl ', 8), get_ticker_shard('AAPL', 8))
+        shard_script = 'from stock_shard_runner import get_ticker_shard; print([get_ticker_shard(f"T{i:04d}", 8) for i in range(50)])'
+        for hash_seed in ('1', '2'):
+            shard_output = subprocess.run([sys.executable, '-c', shard_script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                          env=dict(os.environ, PYTHONHASHSEED=hash_seed), capture_output=True, text=True, check=True).stdout
+            self.assertEqual(shard_output.strip(), str([get_ticker_shard(stock_ticker, 8) for stock_ticker in stock_tickers[:50]]))
+
+    def test_case3_parse_shard_rejects_out_of_range(self):
+        self.assertEqual(parse_shard('3/8'), (3, 8))
+        for shard_text in ('8/8', '-1/8', '0/0', 'three/8'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_shard(shard_text)
+
+    def test_case4_merge_adds_counts_and_rejects_duplicate_shards(self):
+        run_summaries = []
+        for shard_index in range(3):
+            run_summary = ShardRunSummary(shard_index, 4)
+            run_summary.tickers_requested = 10
+            run_summary.inserted_row_count = 100 * (shard_index + 1)
+            run_summary.failed_tickers = {f"F{shard_index}": 'fetch: error'} if shard_index == 1 else {}
+            run_summaries.append(run_summary)
+        merged_summary = ShardRunSummary.merge(run_summaries)
+
+        self.assertEqual((merged_summary.tickers_requested, merged_summary.inserted_row_count), (30, 600))
+        self.assertEqual(merged_summary.missing_shards, [3])
+        self.assertFalse(merged_summary.succeeded)
+        with self.assertRaises(ValueError):
+            ShardRunSummary.merge(run_summaries + [ShardRunSummary(0, 4)])
+        with self.assertRaises(ValueError):
+            ShardRunSummary.merge(run_summaries + [ShardRunSummary(3, 8)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import api_client
+import json
+import threading
+import time
+
+# Refresh a cached token this many seconds before the auth server says it expires
+auth_token_expiry_margin_seconds = 60
+# Used when the token response does not include expires_in
+auth_token_default_lifetime_seconds = 300
+
+auth_token_cache = {}
+auth_token_lock = threading.Lock()
+auth_token_stats = {'requested': 0, 'acquired': 0}
+
+
+def request_auth_token(auth_token_api_url, client_id, client_secret, grant_type='client_credentials'):
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    auth_parameters = {
+        'client_id': client_id,
+        'grant_type': grant_type,
+        'client_secret': client_secret
+    }
+
+    response = api_client.get_api_session().post(auth_token_api_url, data=auth_parameters, headers=headers, verify=False)
+    response_as_dict = json.loads(response.text)
+    return response_as_dict['access_token'], int(response_as_dict.get('expires_in', auth_token_default_lifetime_seconds))
+
+
+def get_shared_auth_token(auth_token_api_url, client_id, client_secret, grant_type='client_credentials'):
+    # One client-credentials token per (token url, client) is shared by every test in the run, across threads,
+    # and only requested again once it is close to expiring
+    cache_key = (auth_token_api_url, client_id, grant_type)
+    with auth_token_lock:
+        auth_token_stats['requested'] += 1
+        cached_token = auth_token_cache.get(cache_key)
+        if cached_token is not None and cached_token[1] > time.monotonic():
+            return cached_token[0]
+
+        access_token, expires_in = request_auth_token(auth_token_api_url, client_id, client_secret, grant_type)
+        auth_token_stats['acquired'] += 1
+        auth_token_cache[cache_key] = (access_token, time.monotonic() + max(0, expires_in - auth_token_expiry_margin_seconds))
+        return access_token
+
+
+def clear_shared_auth_tokens():
+    with auth_token_lock:
+        auth_token_cache.clear()
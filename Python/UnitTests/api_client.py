@@ -0,0 +1,164 @@
+import colorama
+import os
+import requests
+import socket
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Connection pool sizing for the shared session, overridable from the environment
+api_pool_connections = int(os.environ.get('API_POOL_CONNECTIONS', '10'))
+api_pool_size = int(os.environ.get('API_POOL_SIZE', '16'))
+
+api_session = None
+api_session_lock = threading.Lock()
+api_call_timings = []
+api_call_timings_lock = threading.Lock()
+
+# Connection setup timings recorded by the connection classes, picked up by the response hook on the same thread
+pending_connection_timings = threading.local()
+
+
+class ApiCallTiming:
+    def __init__(self, method, url, host, status_code, reused_connection, dns_seconds, connect_seconds, tls_seconds, ttfb_seconds, elapsed_seconds):
+        self.method = method
+        self.url = url
+        self.host = host
+        self.status_code = status_code
+        self.reused_connection = reused_connection
+        self.dns_seconds = dns_seconds
+        self.connect_seconds = connect_seconds
+        self.tls_seconds = tls_seconds
+        self.ttfb_seconds = ttfb_seconds
+        self.elapsed_seconds = elapsed_seconds
+
+    def __str__(self):
+        return (f"  {self.method} {self.url} -> {self.status_code}, Reused: {self.reused_connection}, DNS: {self.dns_seconds * 1000:.1f}ms, "
+                f"Connect: {self.connect_seconds * 1000:.1f}ms, TLS: {self.tls_seconds * 1000:.1f}ms, TTFB: {self.ttfb_seconds * 1000:.1f}ms")
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class TimedConnectionMixin:
+    # Splits new connection setup into DNS resolution and TCP connect. The resolved address is handed to
+    # urllib3 for the connect so the name is not looked up twice; TLS still verifies against self.host.
+    def _new_conn(self):
+        dns_start_time = time.perf_counter()
+        resolved_address = socket.getaddrinfo(self._dns_host, self.port, type=socket.SOCK_STREAM)[0][4][0]
+        connect_start_time = time.perf_counter()
+
+        dns_host = self._dns_host
+        self._dns_host = resolved_address
+        try:
+            new_socket = super()._new_conn()
+        finally:
+            self._dns_host = dns_host
+
+        pending_connection_timings.dns_seconds = connect_start_time - dns_start_time
+        pending_connection_timings.connect_seconds = time.perf_counter() - connect_start_time
+        pending_connection_timings.tls_seconds = 0.0
+        return new_socket
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        connect_start_time = time.perf_counter()
+        super().connect()
+        # Whatever connect() spent beyond DNS and TCP is the TLS handshake
+        tcp_seconds = pending_connection_timings.dns_seconds + pending_connection_timings.connect_seconds
+        pending_connection_timings.tls_seconds = max(0.0, time.perf_counter() - connect_start_time - tcp_seconds)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+
+def record_api_call_timing(response, *args, **kwargs):
+    dns_seconds = getattr(pending_connection_timings, 'dns_seconds', None)
+    reused_connection = dns_seconds is None
+    connect_seconds = 0.0 if reused_connection else pending_connection_timings.connect_seconds
+    tls_seconds = 0.0 if reused_connection else pending_connection_timings.tls_seconds
+    dns_seconds = dns_seconds or 0.0
+    pending_connection_timings.__dict__.clear()
+
+    # response.elapsed runs from sending the request to parsing the headers, connection setup included
+    elapsed_seconds = response.elapsed.total_seconds()
+    api_call_timing = ApiCallTiming(response.request.method,
+                                    response.url,
+                                    requests.utils.urlparse(response.url).hostname,
+                                    response.status_code,
+                                    reused_connection,
+                                    dns_seconds,
+                                    connect_seconds,
+                                    tls_seconds,
+                                    max(0.0, elapsed_seconds - dns_seconds - connect_seconds - tls_seconds),
+                                    elapsed_seconds)
+    with api_call_timings_lock:
+        api_call_timings.append(api_call_timing)
+    return response
+
+
+def create_api_session(pool_connections=api_pool_connections, pool_size=api_pool_size, record_timings=True):
+    session = requests.Session()
+    timed_adapter = TimedHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_size)
+    session.mount('https://', timed_adapter)
+    session.mount('http://', timed_adapter)
+    session.headers['Connection'] = 'keep-alive'
+    if record_timings:
+        session.hooks['response'].append(record_api_call_timing)
+    return session
+
+
+def get_api_session():
+    # One pooled keep-alive session is shared by all API suites and threads in the run
+    global api_session
+    with api_session_lock:
+        if api_session is None:
+            api_session = create_api_session()
+        return api_session
+
+
+def close_api_session():
+    global api_session
+    with api_session_lock:
+        if api_session is not None:
+            api_session.close()
+            api_session = None
+
+
+def get_api_call_timings():
+    with api_call_timings_lock:
+        return list(api_call_timings)
+
+
+def print_api_call_timing_summary():
+    timings_by_host = {}
+    for api_call_timing in get_api_call_timings():
+        timings_by_host.setdefault(api_call_timing.host, []).append(api_call_timing)
+
+    print(colorama.Fore.WHITE + '\n  API call timings by host (averages)')
+    for host, host_timings in sorted(timings_by_host.items()):
+        new_connections = [api_call_timing for api_call_timing in host_timings if not api_call_timing.reused_connection]
+        new_connection_count = max(1, len(new_connections))
+        print(colorama.Fore.WHITE + f'    {host}: {len(host_timings)} calls, {len(host_timings) - len(new_connections)} on reused connections, '
+              f'DNS {sum(api_call_timing.dns_seconds for api_call_timing in new_connections) / new_connection_count * 1000:.1f}ms, '
+              f'Connect {sum(api_call_timing.connect_seconds for api_call_timing in new_connections) / new_connection_count * 1000:.1f}ms, '
+              f'TLS {sum(api_call_timing.tls_seconds for api_call_timing in new_connections) / new_connection_count * 1000:.1f}ms, '
+              f'TTFB {sum(api_call_timing.ttfb_seconds for api_call_timing in host_timings) / len(host_timings) * 1000:.1f}ms')
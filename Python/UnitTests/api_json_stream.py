@@ -0,0 +1,161 @@
+import codecs
+import json
+import time
+
+# Incremental reader for the array under one top-level key of a JSON response, e.g. the 'Data' list of
+# the /get endpoints. Items are decoded one at a time from the streamed body, so memory stays at about one
+# item plus one chunk however many records the endpoint returns.
+json_stream_chunk_size = 64 * 1024
+json_whitespace = ' \t\r\n'
+
+
+class JsonStreamStats:
+    def __init__(self):
+        self.item_count = 0
+        self.invalid_item_count = 0
+        self.byte_count = 0
+        self.elapsed_seconds = 0.0
+
+    @property
+    def items_per_second(self):
+        return self.item_count / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+
+    @property
+    def megabytes_per_second(self):
+        return self.byte_count / 1024 / 1024 / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+
+    def __str__(self):
+        return (f"  Items: {self.item_count}, InvalidItems: {self.invalid_item_count}, Bytes: {self.byte_count}, "
+                f"ElapsedSeconds: {self.elapsed_seconds:.3f}, Items/s: {self.items_per_second:.0f}, MB/s: {self.megabytes_per_second:.2f}")
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class JsonTextReader:
+    # Decodes byte chunks into a text buffer on demand and drops text that has already been consumed
+    def __init__(self, chunks, stats):
+        self.chunks = iter(chunks)
+        self.stats = stats
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.position = 0
+        self.finished = False
+
+    def read_more(self):
+        if self.finished:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.finished = True
+            self.buffer = self.buffer[self.position:] + self.text_decoder.decode(b'', final=True)
+        else:
+            self.stats.byte_count += len(chunk)
+            self.buffer = self.buffer[self.position:] + self.text_decoder.decode(chunk)
+        self.position = 0
+        return True
+
+    def next_char(self):
+        while self.position >= len(self.buffer):
+            if not self.read_more():
+                return None
+        char = self.buffer[self.position]
+        self.position += 1
+        return char
+
+    def skip(self, characters):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in characters:
+                self.position += 1
+            if self.position < len(self.buffer) or not self.read_more():
+                return
+
+    def drain(self):
+        # Reads the rest of the body so the connection can go back to the pool
+        for chunk in self.chunks:
+            self.stats.byte_count += len(chunk)
+        self.finished = True
+
+
+def find_array_start(text_reader, array_key):
+    # Walks the top-level object until '[' is reached as the value of array_key. Only strings directly
+    # inside the top-level object are collected, to recognise keys.
+    depth = 0
+    last_string = None
+    current_key = None
+    while True:
+        char = text_reader.next_char()
+        if char is None:
+            raise ValueError(f"JSON response has no '{array_key}' array")
+        if char == '"':
+            string_characters = []
+            while True:
+                char = text_reader.next_char()
+                if char is None:
+                    raise ValueError('JSON response ended inside a string')
+                if char == '\\':
+                    string_characters.append(char)
+                    char = text_reader.next_char()
+                elif char == '"':
+                    break
+                if depth == 1:
+                    string_characters.append(char)
+            if depth == 1:
+                last_string = json.loads('"' + ''.join(string_characters) + '"')
+        elif char == ':' and depth == 1:
+            current_key = last_string
+        elif char == ',' and depth == 1:
+            current_key = None
+        elif char in '{[':
+            if char == '[' and depth == 1 and current_key == array_key:
+                return
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+
+
+def iterate_json_array_items(chunks, array_key, stats=None):
+    stats = stats if stats is not None else JsonStreamStats()
+    text_reader = JsonTextReader(chunks, stats)
+    json_decoder = json.JSONDecoder()
+    find_array_start(text_reader, array_key)
+
+    while True:
+        text_reader.skip(json_whitespace + ',')
+        if text_reader.position >= len(text_reader.buffer):
+            raise ValueError(f"JSON response ended inside the '{array_key}' array")
+        if text_reader.buffer[text_reader.position] == ']':
+            text_reader.position += 1
+            break
+        try:
+            item, item_end = json_decoder.raw_decode(text_reader.buffer, text_reader.position)
+            # A number cut by a chunk boundary ('12' of '12.5') decodes fine, so the item only counts as
+            # complete once the character after it is a separator
+            item_complete = text_reader.finished or (item_end < len(text_reader.buffer) and text_reader.buffer[item_end] in json_whitespace + ',]')
+        except json.JSONDecodeError:
+            if text_reader.finished:
+                raise
+            item_complete = False
+        if not item_complete:
+            text_reader.read_more()
+            continue
+        text_reader.position = item_end
+        stats.item_count += 1
+        yield item
+
+    text_reader.drain()
+
+
+def read_json_array_items(response, array_key, validate_item=None, chunk_size=json_stream_chunk_size):
+    # Counts, and optionally validates, the items of a streamed requests response (stream=True) without
+    # holding the decoded payload
+    stats = JsonStreamStats()
+    start_time = time.perf_counter()
+    try:
+        for item in iterate_json_array_items(response.iter_content(chunk_size=chunk_size), array_key, stats):
+            if validate_item is not None and not validate_item(item):
+                stats.invalid_item_count += 1
+    finally:
+        response.close()
+    stats.elapsed_seconds = time.perf_counter() - start_time
+    return stats
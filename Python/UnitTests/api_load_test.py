@@ -0,0 +1,188 @@
+import api_auth_token
+import api_client
+import api_stub_server
+import api_test_engine
+import argparse
+import colorama
+import json
+import math
+import threading
+import time
+import test_bill_api
+import test_project_api
+import test_vendor_api
+from concurrent.futures import ThreadPoolExecutor
+
+# Load test defaults
+load_test_concurrency = 8
+load_test_duration_seconds = 10.0
+load_test_rate_per_second = 50.0
+
+
+class LoadTestEndpoint:
+    def __init__(self, name, method, url, filter_data_query=None):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.filter_data_query = filter_data_query
+
+    def __str__(self):
+        return f"  {self.name}: {self.method} {self.url}"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class LoadTestEndpointStats:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.latencies_seconds = []
+        self.error_count = 0
+
+    def get_percentile_seconds(self, percentile):
+        # Nearest-rank percentile
+        if not self.latencies_seconds:
+            return 0.0
+        sorted_latencies = sorted(self.latencies_seconds)
+        return sorted_latencies[max(0, math.ceil(percentile / 100 * len(sorted_latencies)) - 1)]
+
+    @property
+    def request_count(self):
+        return len(self.latencies_seconds)
+
+
+def get_load_test_endpoints():
+    # Built from the same resource descriptors the API unit tests use, for both the direct and APIM front doors
+    load_test_endpoints = []
+    for descriptor in [test_bill_api.bill_api_descriptor, test_project_api.project_api_descriptor, test_vendor_api.vendor_api_descriptor]:
+        for front_door, api_url_prefix in descriptor.get_front_doors():
+            load_test_endpoints.append(LoadTestEndpoint(f'{descriptor.resource_name} {front_door} /get', 'GET', api_url_prefix + '/get'))
+            load_test_endpoints.append(LoadTestEndpoint(f'{descriptor.resource_name} {front_door} /getwithfilter', 'POST', api_url_prefix + '/getwithfilter', descriptor.filter_data_query))
+    return load_test_endpoints
+
+
+def send_load_test_request(session, endpoint, access_token):
+    if endpoint.method == 'GET':
+        response = session.get(endpoint.url, headers={'access_token': access_token}, verify=False)
+    else:
+        response = session.post(endpoint.url, data=json.dumps(endpoint.filter_data_query),
+                                headers={'Content-Type': 'application/json', 'access_token': access_token}, verify=False)
+    # Read the whole body so the latency covers the full response, as the unit tests see it
+    response.content
+    return response.status_code == 200
+
+
+def record_load_test_request(session, endpoint, access_token, endpoint_stats, stats_lock, start_time):
+    try:
+        succeeded = send_load_test_request(session, endpoint, access_token)
+    except Exception:
+        succeeded = False
+    latency_seconds = time.perf_counter() - start_time
+    with stats_lock:
+        endpoint_stats[endpoint.name].latencies_seconds.append(latency_seconds)
+        if not succeeded:
+            endpoint_stats[endpoint.name].error_count += 1
+
+
+def run_closed_loop(session, endpoints, access_token, endpoint_stats, stats_lock, concurrency, duration_seconds):
+    # Each worker sends its next request as soon as the previous one completes
+    deadline = time.perf_counter() + duration_seconds
+
+    def run_worker(worker_index):
+        request_index = worker_index
+        while time.perf_counter() < deadline:
+            endpoint = endpoints[request_index % len(endpoints)]
+            record_load_test_request(session, endpoint, access_token, endpoint_stats, stats_lock, time.perf_counter())
+            request_index += 1
+
+    workers = [threading.Thread(target=run_worker, args=(worker_index,)) for worker_index in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def run_open_loop(session, endpoints, access_token, endpoint_stats, stats_lock, concurrency, duration_seconds, rate_per_second):
+    # Requests are released on a fixed schedule whether or not earlier ones have completed. Latency is measured
+    # from the scheduled send time, so time spent queued behind a saturated worker pool is counted too.
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        request_index = 0
+        while True:
+            scheduled_time = start_time + request_index / rate_per_second
+            if scheduled_time - start_time >= duration_seconds:
+                break
+            sleep_seconds = scheduled_time - time.perf_counter()
+            if sleep_seconds > 0:
+                time.sleep(sleep_seconds)
+            endpoint = endpoints[request_index % len(endpoints)]
+            executor.submit(record_load_test_request, session, endpoint, access_token, endpoint_stats, stats_lock, scheduled_time)
+            request_index += 1
+
+
+def run_load_test(endpoints, access_token, mode='closed', concurrency=load_test_concurrency, duration_seconds=load_test_duration_seconds, rate_per_second=load_test_rate_per_second):
+    print(colorama.Fore.WHITE + f'\n  Running {mode}-loop load test against {len(endpoints)} endpoints for {duration_seconds}s with concurrency {concurrency}'
+          + (f' at {rate_per_second} requests/second' if mode == 'open' else ''))
+
+    session = api_client.create_api_session(pool_size=concurrency, record_timings=False)
+    endpoint_stats = {endpoint.name: LoadTestEndpointStats(endpoint) for endpoint in endpoints}
+    stats_lock = threading.Lock()
+    start_time = time.perf_counter()
+    if mode == 'open':
+        run_open_loop(session, endpoints, access_token, endpoint_stats, stats_lock, concurrency, duration_seconds, rate_per_second)
+    else:
+        run_closed_loop(session, endpoints, access_token, endpoint_stats, stats_lock, concurrency, duration_seconds)
+    elapsed_seconds = time.perf_counter() - start_time
+    session.close()
+
+    print_load_test_report(endpoint_stats, elapsed_seconds)
+    return endpoint_stats
+
+
+def print_load_test_report(endpoint_stats, elapsed_seconds):
+    print(colorama.Fore.WHITE + f"\n  {'Endpoint':<32} {'Requests':>9} {'Errors':>7} {'Error%':>7} {'Req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for stats in endpoint_stats.values():
+        error_percent = stats.error_count / stats.request_count * 100 if stats.request_count else 0.0
+        report_color = colorama.Fore.RED if stats.error_count else colorama.Fore.GREEN
+        print(report_color + f'  {stats.endpoint.name:<32} {stats.request_count:>9} {stats.error_count:>7} {error_percent:>6.1f}% '
+              f'{stats.request_count / elapsed_seconds:>8.1f} {stats.get_percentile_seconds(50) * 1000:>8.1f} '
+              f'{stats.get_percentile_seconds(95) * 1000:>8.1f} {stats.get_percentile_seconds(99) * 1000:>8.1f}')
+    print(colorama.Fore.WHITE + '')
+
+
+if __name__ == '__main__':
+
+    # Initialize colorama for console text colors
+    colorama.init()
+
+    parser = argparse.ArgumentParser(description='Latency and throughput load test for the Bill/Project/Vendor APIs')
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed', help='closed: fixed concurrency, open: fixed arrival rate')
+    parser.add_argument('--concurrency', type=int, default=load_test_concurrency, help='Workers (closed) or maximum requests in flight (open)')
+    parser.add_argument('--rate', type=float, default=load_test_rate_per_second, help='Requests per second across all endpoints in open mode')
+    parser.add_argument('--duration', type=float, default=load_test_duration_seconds, help='Seconds to generate load for')
+    parser.add_argument('--endpoint', action='append', help='Only run endpoints whose name contains this text, may be repeated')
+    parser.add_argument('--stub', action='store_true', help='Run against a local stub server instead of the real APIs')
+    parser.add_argument('--stub-latency', type=float, default=api_stub_server.stub_latency_seconds, help='Seconds the stub adds to every response')
+    arguments = parser.parse_args()
+
+    print(colorama.Fore.WHITE + '\nRunning main - API LOAD TEST: api_load_test.py')
+
+    endpoints = get_load_test_endpoints()
+    if arguments.endpoint:
+        endpoints = [endpoint for endpoint in endpoints if any(endpoint_filter in endpoint.name for endpoint_filter in arguments.endpoint)]
+    auth_token_api_url = api_test_engine.auth_token_public_api_url
+    if arguments.stub:
+        stub_server = api_stub_server.start_api_stub_server(latency_seconds=arguments.stub_latency)
+        print(colorama.Fore.WHITE + f'  Using API stub server at {stub_server.base_url}')
+        for endpoint in endpoints:
+            endpoint.url = api_stub_server.get_stub_url(endpoint.url, stub_server.base_url)
+        auth_token_api_url = api_stub_server.get_stub_url(auth_token_api_url, stub_server.base_url)
+
+    access_token = api_auth_token.get_shared_auth_token(auth_token_api_url, api_test_engine.var_client_id, api_test_engine.var_client_secret, api_test_engine.var_grant_type)
+    endpoint_stats = run_load_test(endpoints, access_token, arguments.mode, max(1, arguments.concurrency), arguments.duration, arguments.rate)
+
+    if any(stats.error_count for stats in endpoint_stats.values()):
+        print(colorama.Fore.RED + f'  LOAD TEST HAD ERRORS, exiting with code 1')
+        exit(1)
+    print(colorama.Fore.GREEN + f'  LOAD TEST COMPLETED, exiting with code 0')
+    exit(0)
@@ -0,0 +1,198 @@
+import colorama
+import json
+import math
+import os
+import threading
+import time
+
+# Response time and payload size of every measured API call are checked against a local baseline file.
+# An endpoint is seeded from passing calls until it holds api_perf_min_baseline_samples samples and is only
+# checked from then on, so one slow or lucky first call does not set the threshold. Seeded baselines only take
+# new samples when API_PERF_UPDATE_BASELINE=1, so a gradual slowdown is not absorbed without someone asking for it.
+# Runs against the local stub keep their own files (see use_stub_performance_files), away from the real baseline.
+api_perf_baseline_file = os.environ.get('API_PERF_BASELINE_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api_performance_baseline.json'))
+api_perf_report_file = os.environ.get('API_PERF_REPORT_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api_performance_report.json'))
+api_perf_stub_baseline_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api_performance_baseline.stub.json')
+api_perf_stub_report_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api_performance_report.stub.json')
+api_perf_update_baseline = os.environ.get('API_PERF_UPDATE_BASELINE', '0') == '1'
+
+# A call fails when it is slower than baseline_percentile of the stored samples times the regression factor,
+# plus a small absolute allowance so endpoints answering in a few milliseconds do not fail on jitter
+api_perf_baseline_percentile = 95
+api_perf_regression_factor = float(os.environ.get('API_PERF_REGRESSION_FACTOR', '2.0'))
+api_perf_allowance_seconds = float(os.environ.get('API_PERF_ALLOWANCE_SECONDS', '0.1'))
+# Samples an endpoint needs before calls are checked against it, and stored samples per endpoint, oldest dropped first
+api_perf_min_baseline_samples = int(os.environ.get('API_PERF_MIN_BASELINE_SAMPLES', '5'))
+api_perf_max_baseline_samples = 100
+
+api_perf_samples = []
+api_perf_lock = threading.Lock()
+api_perf_baseline = None
+
+
+class ApiPerformanceSample:
+    def __init__(self, test_name, method, url, status_code, elapsed_seconds, payload_bytes):
+        self.test_name = test_name
+        self.method = method
+        self.url = url
+        self.status_code = status_code
+        self.elapsed_seconds = elapsed_seconds
+        self.payload_bytes = payload_bytes
+        self.threshold_seconds = None
+        self.regressed = False
+
+    @property
+    def endpoint_key(self):
+        return f'{self.method} {self.url}'
+
+    def to_dict(self):
+        return {
+            'test_name': self.test_name,
+            'endpoint': self.endpoint_key,
+            'status_code': self.status_code,
+            'elapsed_seconds': round(self.elapsed_seconds, 6),
+            'payload_bytes': self.payload_bytes,
+            'threshold_seconds': None if self.threshold_seconds is None else round(self.threshold_seconds, 6),
+            'regressed': self.regressed
+        }
+
+    def __str__(self):
+        return f"  {self.test_name}: {self.endpoint_key} -> {self.status_code}, {self.elapsed_seconds * 1000:.1f}ms, {self.payload_bytes} bytes"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def get_percentile(values, percentile):
+    # Nearest-rank percentile
+    if not values:
+        return 0.0
+    sorted_values = sorted(values)
+    return sorted_values[max(0, math.ceil(percentile / 100 * len(sorted_values)) - 1)]
+
+
+def load_api_performance_baseline():
+    global api_perf_baseline
+    with api_perf_lock:
+        if api_perf_baseline is None:
+            if os.path.exists(api_perf_baseline_file):
+                with open(api_perf_baseline_file, 'r') as baseline_file:
+                    api_perf_baseline = json.load(baseline_file)
+            else:
+                api_perf_baseline = {'endpoints': {}}
+        return api_perf_baseline
+
+
+def use_stub_performance_files():
+    # Stub latencies say nothing about the real APIs, so they are measured against a baseline of their own
+    global api_perf_baseline, api_perf_baseline_file, api_perf_report_file
+    with api_perf_lock:
+        api_perf_baseline_file = api_perf_stub_baseline_file
+        api_perf_report_file = api_perf_stub_report_file
+        api_perf_baseline = None
+
+
+def get_threshold_seconds(endpoint_baseline):
+    return get_percentile(endpoint_baseline['elapsed_seconds'], api_perf_baseline_percentile) * api_perf_regression_factor + api_perf_allowance_seconds
+
+
+def record_api_performance(test_name, response, elapsed_seconds, payload_bytes=None):
+    # elapsed_seconds should cover the whole call including the body download, not just response.elapsed.
+    # Streamed responses have no content left to measure, so their caller passes payload_bytes.
+    payload_bytes = len(response.content) if payload_bytes is None else payload_bytes
+    sample = ApiPerformanceSample(test_name, response.request.method, response.url, response.status_code, elapsed_seconds, payload_bytes)
+    endpoint_baseline = load_api_performance_baseline()['endpoints'].get(sample.endpoint_key)
+    if endpoint_baseline and len(endpoint_baseline['elapsed_seconds']) >= api_perf_min_baseline_samples:
+        sample.threshold_seconds = get_threshold_seconds(endpoint_baseline)
+        sample.regressed = elapsed_seconds > sample.threshold_seconds
+    with api_perf_lock:
+        api_perf_samples.append(sample)
+    return sample
+
+
+def assert_within_baseline(sample):
+    if sample.regressed:
+        message = (f'FAILED: {sample.endpoint_key} took {sample.elapsed_seconds * 1000:.1f}ms, over the baseline threshold of '
+                   f'{sample.threshold_seconds * 1000:.1f}ms (p{api_perf_baseline_percentile} x {api_perf_regression_factor} + {api_perf_allowance_seconds * 1000:.0f}ms)')
+        print(colorama.Fore.RED + '    ' + message)
+        raise AssertionError(message)
+
+
+def get_api_performance_samples():
+    with api_perf_lock:
+        return list(api_perf_samples)
+
+
+def get_endpoint_summaries(samples):
+    samples_by_endpoint = {}
+    for sample in samples:
+        samples_by_endpoint.setdefault(sample.endpoint_key, []).append(sample)
+
+    endpoint_summaries = {}
+    for endpoint_key, endpoint_samples in sorted(samples_by_endpoint.items()):
+        elapsed_seconds = [sample.elapsed_seconds for sample in endpoint_samples]
+        endpoint_summaries[endpoint_key] = {
+            'call_count': len(endpoint_samples),
+            'p50_seconds': round(get_percentile(elapsed_seconds, 50), 6),
+            'p95_seconds': round(get_percentile(elapsed_seconds, 95), 6),
+            'max_seconds': round(max(elapsed_seconds), 6),
+            'payload_bytes': max(sample.payload_bytes for sample in endpoint_samples),
+            'threshold_seconds': endpoint_samples[0].threshold_seconds,
+            'regressed': any(sample.regressed for sample in endpoint_samples)
+        }
+    return endpoint_summaries
+
+
+def update_api_performance_baseline(samples):
+    # Only successful calls feed the baseline, and only endpoints still seeding unless an update was asked for
+    baseline = load_api_performance_baseline()
+    updated_endpoint_keys = set()
+    with api_perf_lock:
+        for sample in samples:
+            if sample.status_code != 200 or sample.regressed:
+                continue
+            # Samples checked against an existing baseline stay out of it unless an update was asked for
+            if sample.threshold_seconds is not None and not api_perf_update_baseline:
+                continue
+            endpoint_baseline = baseline['endpoints'].setdefault(sample.endpoint_key, {'elapsed_seconds': [], 'payload_bytes': []})
+            endpoint_baseline['elapsed_seconds'] = (endpoint_baseline['elapsed_seconds'] + [round(sample.elapsed_seconds, 6)])[-api_perf_max_baseline_samples:]
+            endpoint_baseline['payload_bytes'] = (endpoint_baseline['payload_bytes'] + [sample.payload_bytes])[-api_perf_max_baseline_samples:]
+            updated_endpoint_keys.add(sample.endpoint_key)
+        if not updated_endpoint_keys:
+            return updated_endpoint_keys
+        baseline['updated'] = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+
+        with open(api_perf_baseline_file, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2)
+    return updated_endpoint_keys
+
+
+def write_api_performance_report():
+    samples = get_api_performance_samples()
+    if not samples:
+        return None
+
+    endpoint_summaries = get_endpoint_summaries(samples)
+    report = {
+        'run_timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'baseline_file': api_perf_baseline_file,
+        'baseline_percentile': api_perf_baseline_percentile,
+        'regression_factor': api_perf_regression_factor,
+        'allowance_seconds': api_perf_allowance_seconds,
+        'regression_count': sum(1 for sample in samples if sample.regressed),
+        'endpoints': endpoint_summaries,
+        'calls': [sample.to_dict() for sample in samples]
+    }
+    with open(api_perf_report_file, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+
+    update_api_performance_baseline(samples)
+
+    print(colorama.Fore.WHITE + f'\n  API performance against baseline {api_perf_baseline_file}')
+    for endpoint_key, endpoint_summary in endpoint_summaries.items():
+        threshold = 'seeding baseline' if endpoint_summary['threshold_seconds'] is None else f"threshold {endpoint_summary['threshold_seconds'] * 1000:.1f}ms"
+        report_color = colorama.Fore.RED if endpoint_summary['regressed'] else colorama.Fore.WHITE
+        print(report_color + f"    {endpoint_key}: {endpoint_summary['call_count']} calls, p50 {endpoint_summary['p50_seconds'] * 1000:.1f}ms, "
+              f"p95 {endpoint_summary['p95_seconds'] * 1000:.1f}ms, {endpoint_summary['payload_bytes']} bytes, {threshold}")
+    print(colorama.Fore.WHITE + f'  API performance report written to {api_perf_report_file}')
+    return report
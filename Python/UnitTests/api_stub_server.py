@@ -0,0 +1,109 @@
+import argparse
+import colorama
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the public Bill/Project/Vendor APIs and the auth token endpoint, so the
+# API tooling can run offline. Paths ending in /auth/token, /get and /getwithfilter are served
+# for any resource prefix.
+stub_port = 18080
+stub_record_count = 50
+stub_latency_seconds = 0.005
+stub_error_rate = 0.0
+
+
+class ApiStubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, so Nagle would hold the body back for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def send_json(self, status_code, response_body):
+        response_bytes = json.dumps(response_body).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response_bytes)))
+        self.end_headers()
+        self.wfile.write(response_bytes)
+
+    def read_request_body(self):
+        content_length = int(self.headers.get('Content-Length', '0'))
+        return self.rfile.read(content_length) if content_length > 0 else b''
+
+    def get_stub_records(self, record_count):
+        resource_name = self.path.rstrip('/').split('/')[-2]
+        return [{'Id': record_index + 1, 'Name': f'{resource_name} {record_index + 1}', 'Reference': f'REF{record_index + 1:06d}'}
+                for record_index in range(record_count)]
+
+    def handle_stub_request(self):
+        stub_server = self.server
+        # Always drain the body so the next request on a kept-alive connection starts at its request line
+        request_body = self.read_request_body()
+        time.sleep(stub_server.latency_seconds)
+        if stub_server.error_rate > 0 and random.random() < stub_server.error_rate:
+            self.send_json(500, {'Message': 'Simulated server error'})
+            return
+
+        if self.path.endswith('/auth/token'):
+            self.send_json(200, {'access_token': 'stub-access-token', 'token_type': 'Bearer', 'expires_in': 3600})
+        elif self.path.endswith('/getwithfilter'):
+            filter_data_query = json.loads(request_body or b'{}')
+            self.send_json(200, {'Data': self.get_stub_records(1), 'Filters': filter_data_query.get('Filters', [])})
+        elif self.path.endswith('/get'):
+            self.send_json(200, {'Data': self.get_stub_records(stub_server.record_count)})
+        else:
+            self.send_json(404, {'Message': f'No stub for {self.path}'})
+
+    def do_GET(self):
+        self.handle_stub_request()
+
+    def do_POST(self):
+        self.handle_stub_request()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ApiStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, record_count=stub_record_count, latency_seconds=stub_latency_seconds, error_rate=stub_error_rate):
+        super().__init__(('127.0.0.1', port), ApiStubRequestHandler)
+        self.record_count = record_count
+        self.latency_seconds = latency_seconds
+        self.error_rate = error_rate
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+
+def start_api_stub_server(port=0, record_count=stub_record_count, latency_seconds=stub_latency_seconds, error_rate=stub_error_rate):
+    stub_server = ApiStubServer(port, record_count, latency_seconds, error_rate)
+    threading.Thread(target=stub_server.serve_forever, name='api-stub-server', daemon=True).start()
+    return stub_server
+
+
+def get_stub_url(api_url, stub_base_url):
+    # Keeps the path of a real API url and swaps its scheme and host for the stub's
+    path_start = api_url.index('/', api_url.index('//') + 2)
+    return stub_base_url + api_url[path_start:]
+
+
+if __name__ == '__main__':
+
+    # Initialize colorama for console text colors
+    colorama.init()
+
+    parser = argparse.ArgumentParser(description='Local stub for the public APIs')
+    parser.add_argument('--port', type=int, default=stub_port)
+    parser.add_argument('--records', type=int, default=stub_record_count, help='Records returned by /get')
+    parser.add_argument('--latency', type=float, default=stub_latency_seconds, help='Seconds added to every response')
+    parser.add_argument('--error-rate', type=float, default=stub_error_rate, help='Share of requests answered with a 500')
+    arguments = parser.parse_args()
+
+    stub_server = ApiStubServer(arguments.port, arguments.records, arguments.latency, arguments.error_rate)
+    print(colorama.Fore.WHITE + f'API stub server listening on {stub_server.base_url}')
+    stub_server.serve_forever()
@@ -0,0 +1,132 @@
+import api_auth_token
+import api_client
+import api_performance_baseline
+import api_stub_server
+import api_test_engine
+import argparse
+import colorama
+import io
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+# Default number of API test cases run at the same time
+parallel_max_workers = 8
+
+
+class ThreadOutputRouter:
+    # Stands in for sys.stdout so each worker thread's prints land in that test's own buffer;
+    # the buffers are replayed one test at a time so the report is not interleaved
+    def __init__(self, console_stream):
+        self.console_stream = console_stream
+        self.thread_buffers = threading.local()
+
+    def get_stream(self):
+        return getattr(self.thread_buffers, 'stream', None) or self.console_stream
+
+    def write(self, text):
+        return self.get_stream().write(text)
+
+    def flush(self):
+        self.get_stream().flush()
+
+    def __getattr__(self, attribute_name):
+        return getattr(self.console_stream, attribute_name)
+
+
+def get_test_cases(test_suite):
+    for test in test_suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from get_test_cases(test)
+        else:
+            yield test
+
+
+def run_test_case(test_case, output_router):
+    test_output = io.StringIO()
+    output_router.thread_buffers.stream = test_output
+    test_result = unittest.TestResult()
+    start_time = time.perf_counter()
+    try:
+        test_case.run(test_result)
+    finally:
+        output_router.thread_buffers.stream = None
+    return test_case, test_result, test_output.getvalue(), time.perf_counter() - start_time
+
+
+def merge_test_result(merged_result, test_result):
+    merged_result.testsRun += test_result.testsRun
+    merged_result.failures.extend(test_result.failures)
+    merged_result.errors.extend(test_result.errors)
+    merged_result.skipped.extend(test_result.skipped)
+    merged_result.expectedFailures.extend(test_result.expectedFailures)
+    merged_result.unexpectedSuccesses.extend(test_result.unexpectedSuccesses)
+
+
+def run_parallel_test_suite(test_suite, max_workers=parallel_max_workers):
+    console_stream = sys.stdout
+    output_router = ThreadOutputRouter(console_stream)
+    merged_result = unittest.TestResult()
+    test_cases = list(get_test_cases(test_suite))
+
+    suite_start_time = time.perf_counter()
+    sys.stdout = output_router
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            test_futures = [executor.submit(run_test_case, test_case, output_router) for test_case in test_cases]
+            for test_future in test_futures:
+                test_case, test_result, test_output, elapsed_seconds = test_future.result()
+                merge_test_result(merged_result, test_result)
+                status = 'ok' if test_result.wasSuccessful() else 'FAILED'
+                console_stream.write(colorama.Fore.WHITE + f'\n{test_case.id()} ... {status} ({elapsed_seconds:.2f}s)')
+                console_stream.write(test_output)
+    finally:
+        sys.stdout = console_stream
+    suite_elapsed_seconds = time.perf_counter() - suite_start_time
+
+    # Single merged report in the same shape unittest.TextTestRunner prints
+    report_runner = unittest.TextTestRunner(stream=sys.stderr)
+    report_result = report_runner._makeResult()
+    merge_test_result(report_result, merged_result)
+    report_result.printErrors()
+    print(colorama.Fore.WHITE + f'\nRan {merged_result.testsRun} tests in {suite_elapsed_seconds:.3f}s with {max_workers} workers')
+    print(colorama.Fore.WHITE + f'  Auth tokens requested: {api_auth_token.auth_token_stats["requested"]}, acquired: {api_auth_token.auth_token_stats["acquired"]}')
+    print(colorama.Fore.WHITE + f'  Failures: {len(merged_result.failures)}, Errors: {len(merged_result.errors)}, Skipped: {len(merged_result.skipped)}')
+    api_client.print_api_call_timing_summary()
+    api_performance_baseline.write_api_performance_report()
+    return merged_result
+
+
+if __name__ == '__main__':
+
+    # Initialize colorama for console text colors
+    colorama.init()
+
+    parser = argparse.ArgumentParser(description='Run the API unit test suites concurrently')
+    parser.add_argument('--workers', type=int, default=parallel_max_workers, help='Test cases to run at the same time')
+    parser.add_argument('--stub', action='store_true', help='Run against a local stub server instead of the real APIs')
+    arguments = parser.parse_args()
+
+    print(colorama.Fore.WHITE + '\nRunning main - PARALLEL UNIT TEST SUITE: parallel_test_suite.py')
+
+    # Create a test suite
+    suite = unittest.TestLoader().discover(start_dir='.', pattern='test_*.py')
+    if arguments.stub:
+        stub_server = api_stub_server.start_api_stub_server(api_stub_server.stub_port)
+        print(colorama.Fore.WHITE + f'  Using API stub server at {stub_server.base_url}')
+        api_performance_baseline.use_stub_performance_files()
+        api_test_engine.point_api_tests_at_stub(get_test_cases(suite), stub_server.base_url)
+
+    # Run the test suite
+    result = run_parallel_test_suite(suite, max(1, arguments.workers))
+    api_client.close_api_session()
+
+    # Exit with 1 if there are init test failures
+    if not result.wasSuccessful():
+        print(colorama.Fore.GREEN + f'  TEST SUITE FAILED, exiting with code 1')
+        exit(1)
+    else:
+        print(colorama.Fore.GREEN + f'  TEST SUITE PASSED, exiting with code 0')
+        exit(0)
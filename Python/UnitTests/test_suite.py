@@ -1,3 +1,5 @@
+import api_client
+import api_performance_baseline
 import colorama
 import unittest
 
@@ -13,6 +15,9 @@ if __name__ == '__main__':
     
     # Run the test suite
     result = unittest.TextTestRunner().run(suite)
+    api_client.print_api_call_timing_summary()
+    api_performance_baseline.write_api_performance_report()
+    api_client.close_api_session()
 
     # Exit with 1 if there are init test failures
     if not result.wasSuccessful():
@@ -0,0 +1,352 @@
+# Streaming ingest of Azure Cost Management export CSVs into Parquet partitioned by subscription and date.
+#
+# Exports land as {root}/{export name}/{YYYYMMDD-YYYYMMDD}/{run id}/*.csv (older exports put the CSVs
+# straight under the date range folder). Each export window is ingested from its latest run only, so a
+# rerun of the same window replaces that window's output instead of adding a second copy of its rows.
+# CSVs are read in fixed-size chunks with explicit dtypes and appended to one Parquet file per
+# (subscription, date) partition and window. Rows are buffered per partition and written in row groups of
+# up to ingest_row_group_rows, so memory stays bounded by the chunk size plus the buffered rows.
+#
+# The source is a directory: a local folder standing in for blob storage, or the export container
+# mounted into the Spark pool with mssparkutils.fs.mount().
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ingest_chunk_rows = 200000
+ingest_row_group_rows = 128000
+ingest_max_buffered_rows = 1000000
+ingest_manifest_file_name = '_ingest_manifest.json'
+ingest_unknown_partition_value = 'unknown'
+
+# Export column names vary in case between agreement types (EA 'Date', MCA 'date'), so they are matched lowercased
+cost_export_float_columns = {
+    'quantity', 'effectiveprice', 'unitprice', 'paygprice', 'costinbillingcurrency', 'costinpricingcurrency', 'costinusd',
+    'paygcostinbillingcurrency', 'paygcostinusd', 'exchangeratepricingtobilling', 'exchangerate', 'cost'
+}
+cost_export_date_columns = {
+    'date', 'billingperiodstartdate', 'billingperiodenddate', 'serviceperiodstartdate', 'serviceperiodenddate', 'exchangeratedate'
+}
+cost_export_date_partition_columns = ['date', 'usagedatetime']
+cost_export_subscription_partition_columns = ['subscriptionid', 'subscriptionguid']
+cost_export_date_formats = ['%m/%d/%Y', '%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%SZ']
+
+
+class ExportWindowRun:
+    # The CSV files of one run of one export window
+    def __init__(self, window_key, run_key, source_files):
+        self.window_key = window_key
+        self.run_key = run_key
+        self.source_files = source_files
+
+    @property
+    def source_signature(self):
+        return {os.path.basename(source_file): [os.path.getsize(source_file), int(os.path.getmtime(source_file))] for source_file in self.source_files}
+
+    def __str__(self):
+        return f"  Window: {self.window_key}, Run: {self.run_key}, Files: {len(self.source_files)}"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class IngestStats:
+    def __init__(self):
+        self.windows_ingested = 0
+        self.windows_skipped = 0
+        self.runs_superseded = 0
+        self.files_read = 0
+        self.rows_read = 0
+        self.rows_written = 0
+        self.bytes_read = 0
+        self.partition_files_written = 0
+        self.elapsed_seconds = 0.0
+
+    def __str__(self):
+        megabytes_per_second = self.bytes_read / 1024 / 1024 / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+        return (f"  WindowsIngested: {self.windows_ingested}, WindowsSkipped: {self.windows_skipped}, RunsSuperseded: {self.runs_superseded}, "
+                f"FilesRead: {self.files_read}, RowsRead: {self.rows_read}, RowsWritten: {self.rows_written}, PartitionFiles: {self.partition_files_written}, "
+                f"ElapsedSeconds: {self.elapsed_seconds:.2f}, MB/s: {megabytes_per_second:.1f}")
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def get_export_window_runs(source_root):
+    # Groups the CSVs under source_root by export window and keeps the newest run of each window
+    runs_by_window = {}
+    for directory_path, directory_names, file_names in os.walk(source_root):
+        directory_names.sort()
+        for file_name in sorted(file_names):
+            if not (file_name.lower().endswith('.csv') or file_name.lower().endswith('.csv.gz')):
+                continue
+            source_file = os.path.join(directory_path, file_name)
+            relative_parts = os.path.relpath(source_file, source_root).split(os.sep)
+            if len(relative_parts) >= 4:
+                # {export name}/{date range}/{run id}/{file}
+                window_key = '/'.join(relative_parts[:-2])
+                run_key = relative_parts[-2]
+            else:
+                # {export name}/{date range}/{export name}_{run id}.csv, one file per run
+                window_key = '/'.join(relative_parts[:-1]) or '.'
+                run_key = file_name
+            runs_by_window.setdefault(window_key, {}).setdefault(run_key, []).append(source_file)
+
+    export_window_runs = []
+    superseded_run_count = 0
+    for window_key, runs in sorted(runs_by_window.items()):
+        latest_run_key = max(runs, key=lambda run_key: max(os.path.getmtime(source_file) for source_file in runs[run_key]))
+        superseded_run_count += len(runs) - 1
+        export_window_runs.append(ExportWindowRun(window_key, latest_run_key, runs[latest_run_key]))
+    return export_window_runs, superseded_run_count
+
+
+def find_column(column_names, candidate_columns):
+    lowered_columns = {column_name.lower(): column_name for column_name in column_names}
+    for candidate_column in candidate_columns:
+        if candidate_column in lowered_columns:
+            return lowered_columns[candidate_column]
+    return None
+
+
+def get_csv_dtypes(column_names):
+    # Explicit dtypes: no type inference per chunk, so every chunk of every file has the same schema.
+    # Dates are read as strings and parsed once the format is known.
+    return {column_name: 'float64' if column_name.lower() in cost_export_float_columns else 'string' for column_name in column_names}
+
+
+def get_arrow_schema(column_names, partition_columns):
+    arrow_fields = []
+    for column_name in column_names:
+        if column_name in partition_columns:
+            continue
+        if column_name.lower() in cost_export_float_columns:
+            arrow_fields.append(pa.field(column_name, pa.float64()))
+        elif column_name.lower() in cost_export_date_columns:
+            arrow_fields.append(pa.field(column_name, pa.date32()))
+        else:
+            arrow_fields.append(pa.field(column_name, pa.string()))
+    return pa.schema(arrow_fields)
+
+
+def get_date_format(date_values):
+    sample_value = next((date_value for date_value in date_values if isinstance(date_value, str) and date_value), None)
+    if sample_value is None:
+        return None
+    for date_format in cost_export_date_formats:
+        try:
+            pd.to_datetime(sample_value, format=date_format)
+            return date_format
+        except ValueError:
+            continue
+    return None
+
+
+def parse_date_columns(chunk, date_formats, partition_date_column=None):
+    # The partition date column is always parsed, whichever of the partition candidates the export uses
+    for column_name in chunk.columns:
+        if column_name.lower() not in cost_export_date_columns and column_name != partition_date_column:
+            continue
+        if column_name not in date_formats:
+            date_formats[column_name] = get_date_format(chunk[column_name].dropna().head(100))
+        chunk[column_name] = pd.to_datetime(chunk[column_name], format=date_formats[column_name], errors='coerce').dt.date
+    return chunk
+
+
+def get_partition_path(output_root, subscription_value, date_value):
+    subscription_value = ingest_unknown_partition_value if pd.isna(subscription_value) or not subscription_value else str(subscription_value).strip('/').split('/')[-1]
+    date_value = ingest_unknown_partition_value if pd.isna(date_value) else date_value.isoformat()
+    return os.path.join(output_root, f'SubscriptionId={subscription_value}', f'Date={date_value}')
+
+
+def get_window_file_name(window_key):
+    return 'part-' + ''.join(character if character.isalnum() or character in '-_' else '_' for character in window_key) + '.parquet'
+
+
+class PartitionBuffer:
+    # Rows waiting to be written to one partition's Parquet file, flushed as a single row group
+    def __init__(self, partition_writer):
+        self.partition_writer = partition_writer
+        self.tables = []
+        self.row_count = 0
+
+    def append(self, partition_table):
+        self.tables.append(partition_table)
+        self.row_count += partition_table.num_rows
+
+    def flush(self):
+        if self.row_count == 0:
+            return
+        self.partition_writer.write_table(pa.concat_tables(self.tables), row_group_size=max(self.row_count, 1))
+        self.tables = []
+        self.row_count = 0
+
+
+def ingest_export_window_run(export_window_run, output_root, ingest_stats, chunk_rows=ingest_chunk_rows,
+                             row_group_rows=ingest_row_group_rows, max_buffered_rows=ingest_max_buffered_rows):
+    # Streams every CSV of one window run into one Parquet file per (subscription, date) partition.
+    # Files are written under a temporary name and only renamed into place once the whole run is read;
+    # if the run fails part way the temporary files are removed again.
+    partition_buffers = {}
+    window_file_name = get_window_file_name(export_window_run.window_key)
+    row_count = 0
+    buffered_row_count = 0
+    succeeded = False
+    # One schema for the whole run: the union of every file's columns in first-seen order. The files of a run
+    # can list their columns in a different order or add some, and every chunk is conformed to this schema,
+    # since a partition's Parquet file may receive rows from more than one of them.
+    source_column_names = {source_file: list(pd.read_csv(source_file, nrows=0).columns) for source_file in export_window_run.source_files}
+    window_column_names = list(dict.fromkeys(column_name for column_names in source_column_names.values() for column_name in column_names))
+    window_partition_columns = {column_name for column_names in source_column_names.values()
+                                for column_name in [find_column(column_names, cost_export_subscription_partition_columns),
+                                                    find_column(column_names, cost_export_date_partition_columns)] if column_name is not None}
+    arrow_schema = get_arrow_schema(window_column_names, window_partition_columns)
+    try:
+        for source_file in export_window_run.source_files:
+            column_names = source_column_names[source_file]
+            subscription_column = find_column(column_names, cost_export_subscription_partition_columns)
+            date_column = find_column(column_names, cost_export_date_partition_columns)
+            missing_columns = [column_name for column_name in arrow_schema.names if column_name not in column_names]
+            date_formats = {}
+
+            ingest_stats.files_read += 1
+            ingest_stats.bytes_read += os.path.getsize(source_file)
+            for chunk in pd.read_csv(source_file, dtype=get_csv_dtypes(column_names), chunksize=chunk_rows):
+                ingest_stats.rows_read += len(chunk)
+                chunk = parse_date_columns(chunk, date_formats, date_column)
+                for missing_column in missing_columns:
+                    chunk[missing_column] = None
+                partition_keys = [chunk[subscription_column] if subscription_column else pd.Series(ingest_unknown_partition_value, index=chunk.index),
+                                  chunk[date_column] if date_column else pd.Series(pd.NaT, index=chunk.index)]
+                for (subscription_value, date_value), partition_chunk in chunk.groupby(partition_keys, dropna=False, sort=False):
+                    partition_path = get_partition_path(output_root, subscription_value, date_value)
+                    partition_buffer = partition_buffers.get(partition_path)
+                    if partition_buffer is None:
+                        os.makedirs(partition_path, exist_ok=True)
+                        partition_buffer = PartitionBuffer(pq.ParquetWriter(os.path.join(partition_path, window_file_name + '.tmp'), arrow_schema))
+                        partition_buffers[partition_path] = partition_buffer
+                    partition_table = pa.Table.from_pandas(partition_chunk[arrow_schema.names], schema=arrow_schema, preserve_index=False)
+                    partition_buffer.append(partition_table)
+                    buffered_row_count += len(partition_chunk)
+                    row_count += len(partition_chunk)
+                    if partition_buffer.row_count >= row_group_rows:
+                        buffered_row_count -= partition_buffer.row_count
+                        partition_buffer.flush()
+
+                # Many small partitions could otherwise hold the whole window in memory
+                if buffered_row_count >= max_buffered_rows:
+                    for partition_buffer in partition_buffers.values():
+                        partition_buffer.flush()
+                    buffered_row_count = 0
+
+        for partition_buffer in partition_buffers.values():
+            partition_buffer.flush()
+        succeeded = True
+    finally:
+        for partition_path, partition_buffer in partition_buffers.items():
+            partition_buffer.partition_writer.close()
+            temporary_file = os.path.join(partition_path, window_file_name + '.tmp')
+            if not succeeded and os.path.exists(temporary_file):
+                os.remove(temporary_file)
+
+    output_files = []
+    for partition_path in partition_buffers:
+        output_file = os.path.join(partition_path, window_file_name)
+        os.replace(output_file + '.tmp', output_file)
+        output_files.append(os.path.relpath(output_file, output_root))
+    ingest_stats.rows_written += row_count
+    ingest_stats.partition_files_written += len(output_files)
+    return output_files, row_count
+
+
+def read_ingest_manifest(output_root):
+    manifest_file = os.path.join(output_root, ingest_manifest_file_name)
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, 'r') as ingest_manifest_file:
+        return json.load(ingest_manifest_file)
+
+
+def write_ingest_manifest(output_root, ingest_manifest):
+    manifest_file = os.path.join(output_root, ingest_manifest_file_name)
+    with open(manifest_file + '.tmp', 'w') as ingest_manifest_file:
+        json.dump(ingest_manifest, ingest_manifest_file, indent=2)
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+
+def ingest_cost_exports(source_root, output_root, chunk_rows=ingest_chunk_rows, row_group_rows=ingest_row_group_rows):
+    ingest_stats = IngestStats()
+    start_time = time.perf_counter()
+    os.makedirs(output_root, exist_ok=True)
+    ingest_manifest = read_ingest_manifest(output_root)
+
+    export_window_runs, ingest_stats.runs_superseded = get_export_window_runs(source_root)
+    for export_window_run in export_window_runs:
+        previous_ingest = ingest_manifest.get(export_window_run.window_key)
+        source_signature = export_window_run.source_signature
+        if previous_ingest is not None and previous_ingest['run_key'] == export_window_run.run_key and previous_ingest['source_files'] == source_signature:
+            ingest_stats.windows_skipped += 1
+            continue
+
+        output_files, row_count = ingest_export_window_run(export_window_run, output_root, ingest_stats, chunk_rows, row_group_rows)
+        # Partitions the previous run of this window wrote but the new run no longer has
+        for previous_output_file in (previous_ingest or {}).get('output_files', []):
+            if previous_output_file not in output_files and os.path.exists(os.path.join(output_root, previous_output_file)):
+                os.remove(os.path.join(output_root, previous_output_file))
+        ingest_manifest[export_window_run.window_key] = {
+            'run_key': export_window_run.run_key,
+            'source_files': source_signature,
+            'output_files': output_files,
+            'row_count': row_count
+        }
+        write_ingest_manifest(output_root, ingest_manifest)
+        ingest_stats.windows_ingested += 1
+
+    ingest_stats.elapsed_seconds = time.perf_counter() - start_time
+    return ingest_stats
+
+
+def write_sample_cost_export(source_root, export_name, window_start, day_count, subscription_count, rows_per_day, run_key):
+    # Writes a CSV in the amortized export layout, for running the ingest without a storage account
+    dates = pd.date_range(window_start, periods=day_count, freq='D')
+    window_folder = f"{dates[0]:%Y%m%d}-{dates[-1]:%Y%m%d}"
+    run_folder = os.path.join(source_root, export_name, window_folder, run_key)
+    os.makedirs(run_folder, exist_ok=True)
+    row_count = day_count * subscription_count * rows_per_day
+    sample_export = pd.DataFrame({
+        'Date': dates.repeat(subscription_count * rows_per_day).strftime('%m/%d/%Y'),
+        'SubscriptionId': [f'00000000-0000-0000-0000-{subscription_index:012d}' for subscription_index in range(subscription_count)] * (day_count * rows_per_day),
+        'ResourceGroup': 'showcase-dev-rg',
+        'MeterCategory': 'Storage',
+        'Quantity': 1.0,
+        'EffectivePrice': 0.25,
+        'CostInBillingCurrency': [row_index * 0.01 for row_index in range(row_count)],
+        'BillingCurrency': 'USD',
+        'ChargeType': 'Usage'
+    })
+    sample_export.to_csv(os.path.join(run_folder, 'part_0_0001.csv'), index=False)
+    return row_count
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Ingest Azure cost export CSVs into Parquet partitioned by subscription and date')
+    parser.add_argument('--source', required=True, help='Folder holding the exports, e.g. a local copy or mount of storage_export_folder')
+    parser.add_argument('--output', required=True, help='Folder the partitioned Parquet dataset is written to')
+    parser.add_argument('--chunk-rows', type=int, default=ingest_chunk_rows, help='CSV rows held in memory at a time')
+    parser.add_argument('--sample', action='store_true', help='Write a sample export into --source first (the folder is replaced)')
+    arguments = parser.parse_args()
+
+    if arguments.sample:
+        shutil.rmtree(arguments.source, ignore_errors=True)
+        sample_row_count = write_sample_cost_export(arguments.source, 'DevAdhocAmortized', '2023-10-01', 7, 3, 2000, 'run-1')
+        print(f"  Wrote a sample export of {sample_row_count} rows to {arguments.source}")
+
+    print(ingest_cost_exports(arguments.source, arguments.output, arguments.chunk_rows))
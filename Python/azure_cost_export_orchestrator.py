@@ -0,0 +1,479 @@
+# asyncio orchestration of Azure Cost Management exports.
+#
+# exports.execute() only queues an export run; the CSV lands in storage minutes later. The orchestrator
+# creates/updates an export per (scope, date window), executes them concurrently and polls each export's
+# run history with adaptive backoff until the run completes and its blobs are ready, so the rest of the
+# billing pipeline can start as soon as the data is there instead of on a fixed schedule.
+#
+# Works with the sync azure.mgmt.costmanagement CostManagementClient (calls are moved to threads), the
+# aio client, or FakeCostManagementClient below for running it in-process without Azure.
+
+import asyncio
+import inspect
+import json
+import os
+import random
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+export_max_concurrency = 4
+export_initial_poll_seconds = 10.0
+export_max_poll_seconds = 120.0
+export_poll_backoff_factor = 1.5
+export_deadline_seconds = 3600.0
+export_backfill_window_days = 7
+export_backfill_state_file = 'export_backfill_state.json'
+storage_blob_scope = "https://storage.azure.com/.default"
+storage_blob_api_version = "2021-08-06"
+
+# Run history statuses, as reported by the Cost Management API
+export_status_completed = 'Completed'
+export_failed_statuses = {'Failed', 'Timeout', 'DataNotAvailable', 'NewDataNotAvailable'}
+
+
+class ExportJob:
+    def __init__(self, scope, export_name, export_definition):
+        self.scope = scope
+        self.export_name = export_name
+        self.export_definition = export_definition
+
+    def __str__(self):
+        return f"  Scope: {self.scope}, ExportName: {self.export_name}"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class ExportJobResult:
+    def __init__(self, export_job, status=None, export_run=None, poll_count=0, elapsed_seconds=0.0, error=None):
+        self.export_job = export_job
+        self.status = status
+        self.export_run = export_run
+        self.poll_count = poll_count
+        self.elapsed_seconds = elapsed_seconds
+        self.error = error
+        self.definition_deleted = False
+
+    @property
+    def succeeded(self):
+        return self.status == export_status_completed and self.error is None
+
+    def __str__(self):
+        return f"  Scope: {self.export_job.scope}, ExportName: {self.export_job.export_name}, Status: {self.status}, Polls: {self.poll_count}, ElapsedSeconds: {self.elapsed_seconds:.1f}, DefinitionDeleted: {self.definition_deleted}, Error: {self.error}"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def get_export_definition(date_from, date_to, storage_container, storage_resource_id, storage_export_folder, export_cost_type='AmortizedCost'):
+    # Same export body the billing notebooks create, for one custom time period
+    return {
+        "definition": {
+            "type": export_cost_type,
+            "timeframe": "Custom",
+            "time_period": {
+                "from_property": f'{date_from}',
+                "to": f'{date_to}'
+            }
+        },
+        "format": "Csv",
+        "deliveryInfo": {
+            "destination": {
+                "container": f'{storage_container}',
+                "resourceId": f'{storage_resource_id}',
+                "rootFolderPath": f'{storage_export_folder}',
+            },
+        }
+    }
+
+
+def get_export_run_value(export_run, name):
+    # azure-mgmt-costmanagement 4.x puts run fields on the run itself, 3.x under .properties
+    if hasattr(export_run, name):
+        return getattr(export_run, name)
+    return getattr(getattr(export_run, 'properties', None), name, None)
+
+
+def as_utc(value):
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+class ExportOrchestrator:
+    def __init__(self, cost_management_client,
+                 max_concurrency=export_max_concurrency,
+                 initial_poll_seconds=export_initial_poll_seconds,
+                 max_poll_seconds=export_max_poll_seconds,
+                 poll_backoff_factor=export_poll_backoff_factor,
+                 deadline_seconds=export_deadline_seconds,
+                 blob_ready_function=None,
+                 result_callback=None,
+                 delete_completed_exports=False):
+        self.cost_management_client = cost_management_client
+        self.max_concurrency = max_concurrency
+        self.initial_poll_seconds = initial_poll_seconds
+        self.max_poll_seconds = max_poll_seconds
+        self.poll_backoff_factor = poll_backoff_factor
+        self.deadline_seconds = deadline_seconds
+        # Optional check, given the job and its completed run, that the exported files are readable in storage
+        self.blob_ready_function = blob_ready_function
+        # Called on the event loop thread with each ExportJobResult as soon as that export finishes
+        self.result_callback = result_callback
+        # Delete the export definition once its run is complete, for one-off exports such as backfill windows
+        self.delete_completed_exports = delete_completed_exports
+        self.concurrency_semaphore = None
+
+    async def call_client(self, client_function, *args):
+        if inspect.iscoroutinefunction(client_function):
+            return await client_function(*args)
+        return await asyncio.to_thread(client_function, *args)
+
+    def get_next_poll_seconds(self, poll_seconds, status_changed):
+        # Back off while nothing changes; once a run moves (e.g. Queued -> InProgress) the end is usually
+        # close, so go back to polling quickly. Jitter keeps concurrent exports from polling in lockstep.
+        if status_changed:
+            return self.initial_poll_seconds
+        return min(self.max_poll_seconds, poll_seconds * self.poll_backoff_factor) * random.uniform(0.9, 1.1)
+
+    async def get_latest_export_run(self, export_job, submitted_after):
+        execution_history = await self.call_client(self.cost_management_client.exports.get_execution_history, export_job.scope, export_job.export_name)
+        latest_run = None
+        latest_submitted_time = None
+        for export_run in getattr(execution_history, 'value', None) or []:
+            submitted_time = as_utc(get_export_run_value(export_run, 'submitted_time'))
+            # Runs from before this execute() belong to earlier pipeline runs
+            if submitted_time is not None and submitted_time < submitted_after:
+                continue
+            if latest_run is None or (submitted_time is not None and (latest_submitted_time is None or submitted_time > latest_submitted_time)):
+                latest_run = export_run
+                latest_submitted_time = submitted_time
+        return latest_run
+
+    async def wait_for_export_run(self, export_job, export_job_result, submitted_after):
+        poll_seconds = self.initial_poll_seconds
+        while True:
+            await asyncio.sleep(poll_seconds)
+            export_job_result.poll_count += 1
+            export_run = await self.get_latest_export_run(export_job, submitted_after)
+            status = get_export_run_value(export_run, 'status') if export_run is not None else None
+            status_changed = status != export_job_result.status
+            export_job_result.status = status
+            export_job_result.export_run = export_run
+
+            if status in export_failed_statuses:
+                export_job_result.error = get_export_run_value(export_run, 'error') or f"Export run ended with status {status}"
+                return
+            if status == export_status_completed:
+                if self.blob_ready_function is None or await self.call_client(self.blob_ready_function, export_job, export_run):
+                    return
+                # Completed but the files are not readable yet, keep polling storage on the same backoff
+                status_changed = False
+            poll_seconds = self.get_next_poll_seconds(poll_seconds, status_changed)
+
+    async def run_export(self, export_job):
+        export_job_result = ExportJobResult(export_job)
+        start_time = time.perf_counter()
+        # A slot is held until the run is finished, so max_concurrency caps the export runs queued in Azure at once
+        async with self.concurrency_semaphore:
+            try:
+                await self.call_client(self.cost_management_client.exports.create_or_update, export_job.scope, export_job.export_name, export_job.export_definition)
+                # Allow for clock skew between here and the service when matching runs to this execute()
+                submitted_after = datetime.now(timezone.utc) - timedelta(minutes=5)
+                await self.call_client(self.cost_management_client.exports.execute, export_job.scope, export_job.export_name)
+                await asyncio.wait_for(self.wait_for_export_run(export_job, export_job_result, submitted_after), self.deadline_seconds)
+            except asyncio.TimeoutError:
+                export_job_result.error = TimeoutError(f"Export not ready within {self.deadline_seconds}s, last status {export_job_result.status}")
+            except Exception as export_error:
+                export_job_result.error = export_error
+            if export_job_result.succeeded and self.delete_completed_exports:
+                export_job_result.definition_deleted = await self.delete_export(export_job)
+        export_job_result.elapsed_seconds = time.perf_counter() - start_time
+        if self.result_callback is not None:
+            self.result_callback(export_job_result)
+        return export_job_result
+
+    async def delete_export(self, export_job):
+        # The exported files stay in storage; a failed delete does not fail the export, it is retried by the next backfill
+        try:
+            await self.call_client(self.cost_management_client.exports.delete, export_job.scope, export_job.export_name)
+            return True
+        except Exception as delete_error:
+            print(f"  WARNING: Unable to delete export {export_job.export_name} at scope {export_job.scope}: {delete_error}")
+            return False
+
+    async def run_exports(self, export_jobs):
+        self.concurrency_semaphore = asyncio.Semaphore(self.max_concurrency)
+        return await asyncio.gather(*[self.run_export(export_job) for export_job in export_jobs])
+
+
+class ExportBlobReadyCheck:
+    # blob_ready_function that lists the export's folder in the destination storage account. Exports write
+    # to <rootFolderPath>/<export name>/<date range>/<run id>/..., so a run is ready once the blob named by
+    # the run's file_name is listed, or, when the run does not report one, once a data file or manifest
+    # under the export's folder was written after the run was submitted. Listing blobs needs the
+    # Storage Blob Data Reader role for the credential behind token_provider.
+    def __init__(self, token_provider, session=None):
+        # token_provider is anything with get_bearer_header(scope), e.g. azure_token_provider.SharedTokenProvider
+        self.token_provider = token_provider
+        self.session = session or requests.Session()
+        self.list_calls = 0
+
+    def get_blob_prefix(self, export_job):
+        root_folder_path = export_job.export_definition['deliveryInfo']['destination']['rootFolderPath']
+        return '/'.join(folder for folder in root_folder_path.replace('\\', '/').split('/') + [export_job.export_name] if folder) + '/'
+
+    def list_blobs(self, export_job):
+        destination = export_job.export_definition['deliveryInfo']['destination']
+        storage_account_name = destination['resourceId'].rstrip('/').split('/')[-1]
+        container_url = f"https://{storage_account_name}.blob.core.windows.net/{destination['container']}"
+        headers = dict(self.token_provider.get_bearer_header(storage_blob_scope), **{'x-ms-version': storage_blob_api_version})
+        parameters = {'restype': 'container', 'comp': 'list', 'prefix': self.get_blob_prefix(export_job)}
+        blobs = []
+        while True:
+            response = self.session.get(container_url, params=parameters, headers=headers)
+            self.list_calls += 1
+            if response.status_code == 404:
+                # Container not created yet, the first run of an export creates it
+                return blobs
+            response.raise_for_status()
+            blob_list = ElementTree.fromstring(response.content)
+            for blob in blob_list.iter('Blob'):
+                blobs.append((blob.findtext('Name'), as_utc(parsedate_to_datetime(blob.findtext('Properties/Last-Modified')))))
+            next_marker = blob_list.findtext('NextMarker')
+            if not next_marker:
+                return blobs
+            parameters['marker'] = next_marker
+
+    def blob_ready(self, export_job, export_run):
+        blobs = self.list_blobs(export_job)
+        file_name = get_export_run_value(export_run, 'file_name')
+        if file_name:
+            file_name = file_name.replace('\\', '/').lstrip('/')
+            return any(blob_name == file_name or blob_name.endswith('/' + file_name) for blob_name, _ in blobs)
+        submitted_time = as_utc(get_export_run_value(export_run, 'submitted_time'))
+        return any((blob_name.endswith('.csv') or blob_name.endswith('.csv.gz') or blob_name.endswith('manifest.json'))
+                   and (submitted_time is None or last_modified >= submitted_time)
+                   for blob_name, last_modified in blobs)
+
+
+def run_exports(cost_management_client, export_jobs, **orchestrator_arguments):
+    # Blocking entry point for notebooks and scripts
+    export_orchestrator = ExportOrchestrator(cost_management_client, **orchestrator_arguments)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(export_orchestrator.run_exports(export_jobs))
+    # Synapse and Jupyter kernels already run an event loop on this thread, where asyncio.run() refuses to
+    # start, so the exports get their own loop on a worker thread. Callers that can await use run_exports_async().
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, export_orchestrator.run_exports(export_jobs)).result()
+
+
+async def run_exports_async(cost_management_client, export_jobs, **orchestrator_arguments):
+    export_orchestrator = ExportOrchestrator(cost_management_client, **orchestrator_arguments)
+    return await export_orchestrator.run_exports(export_jobs)
+
+
+def parse_export_date(export_date):
+    # Accepts the notebooks' '2023-10-01T00:00:00Z' form as well as plain dates
+    return as_utc(datetime.fromisoformat(export_date.replace('Z', '+00:00')))
+
+
+def format_export_date(export_datetime):
+    return export_datetime.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def get_export_date_windows(date_from, date_to, window_days=export_backfill_window_days):
+    # Splits date_from..date_to into consecutive windows of window_days. Cost Management treats the end of a
+    # custom time period as inclusive, like the notebooks' own date_to, so each window ends one second before
+    # the next one starts and the last window ends at date_to.
+    window_start = parse_export_date(date_from)
+    range_end = parse_export_date(date_to)
+    export_date_windows = []
+    while window_start <= range_end:
+        next_window_start = window_start + timedelta(days=window_days)
+        export_date_windows.append((window_start, min(next_window_start - timedelta(seconds=1), range_end)))
+        window_start = next_window_start
+    return export_date_windows
+
+
+def get_window_export_name(export_name, window_start, window_end):
+    # Each window gets its own export definition so windows can run side by side. The definition is deleted
+    # once the window completes; a failed window keeps it and the next run reuses it under the same name.
+    return f"{export_name}-{window_start:%Y%m%d}-{window_end:%Y%m%d}"
+
+
+class ExportBackfillState:
+    # Windows that completed, per scope and base export name, kept in a JSON file so a re-run only submits
+    # the windows that are still missing or failed last time. Each entry records whether the window's
+    # export definition was deleted, so definitions left behind by a failed delete are cleaned up later.
+    def __init__(self, state_file=export_backfill_state_file):
+        self.state_file = state_file
+        self.completed_windows = {}
+        if os.path.exists(state_file):
+            with open(state_file, 'r') as backfill_state_file:
+                self.completed_windows = json.load(backfill_state_file)
+
+    def get_state_key(self, scope, export_name):
+        return f"{scope}|{export_name}"
+
+    def is_completed(self, scope, export_name, window_export_name):
+        return window_export_name in self.completed_windows.get(self.get_state_key(scope, export_name), {})
+
+    def get_undeleted_windows(self, scope, export_name):
+        return [window_export_name for window_export_name, completed_window in self.completed_windows.get(self.get_state_key(scope, export_name), {}).items()
+                if not completed_window.get('definition_deleted')]
+
+    def mark_completed(self, scope, export_name, export_job_result):
+        self.completed_windows.setdefault(self.get_state_key(scope, export_name), {})[export_job_result.export_job.export_name] = {
+            'completed': format_export_date(datetime.now(timezone.utc)),
+            'file_name': get_export_run_value(export_job_result.export_run, 'file_name'),
+            'definition_deleted': export_job_result.definition_deleted
+        }
+        self.save()
+
+    def mark_deleted(self, scope, export_name, window_export_name):
+        self.completed_windows[self.get_state_key(scope, export_name)][window_export_name]['definition_deleted'] = True
+        self.save()
+
+    def save(self):
+        # Written after every window, so an interrupted backfill keeps what it already finished
+        temporary_state_file = self.state_file + '.tmp'
+        with open(temporary_state_file, 'w') as backfill_state_file:
+            json.dump(self.completed_windows, backfill_state_file, indent=2)
+        os.replace(temporary_state_file, self.state_file)
+
+
+def run_export_backfill(cost_management_client, scope, export_name, date_from, date_to, storage_container, storage_resource_id, storage_export_folder,
+                        window_days=export_backfill_window_days, state_file=export_backfill_state_file, export_cost_type='AmortizedCost',
+                        **orchestrator_arguments):
+    # scope is one export scope or a list of them (e.g. one per subscription); all their windows run in the same batch
+    scopes = [scope] if isinstance(scope, str) else list(scope)
+    backfill_state = ExportBackfillState(state_file)
+    for export_scope in scopes:
+        for window_export_name in backfill_state.get_undeleted_windows(export_scope, export_name):
+            # Completed on an earlier run, but deleting its definition failed then
+            try:
+                cost_management_client.exports.delete(export_scope, window_export_name)
+                backfill_state.mark_deleted(export_scope, export_name, window_export_name)
+            except Exception as delete_error:
+                print(f"  WARNING: Unable to delete export {window_export_name} at scope {export_scope}: {delete_error}")
+
+    export_jobs = []
+    skipped_window_count = 0
+    for window_start, window_end in get_export_date_windows(date_from, date_to, window_days):
+        window_export_name = get_window_export_name(export_name, window_start, window_end)
+        export_definition = get_export_definition(format_export_date(window_start), format_export_date(window_end),
+                                                  storage_container, storage_resource_id, storage_export_folder, export_cost_type)
+        for export_scope in scopes:
+            if backfill_state.is_completed(export_scope, export_name, window_export_name):
+                skipped_window_count += 1
+                continue
+            export_jobs.append(ExportJob(export_scope, window_export_name, export_definition))
+
+    print(f"  Backfill {export_name}: {len(export_jobs)} windows to export across {len(scopes)} scopes, {skipped_window_count} already completed")
+
+    def record_export_result(export_job_result):
+        if export_job_result.succeeded:
+            backfill_state.mark_completed(export_job_result.export_job.scope, export_name, export_job_result)
+
+    orchestrator_arguments.setdefault('delete_completed_exports', True)
+    return run_exports(cost_management_client, export_jobs, result_callback=record_export_result, **orchestrator_arguments)
+
+
+class FakeExportRun:
+    def __init__(self, status, submitted_time, file_name=None, error=None):
+        self.status = status
+        self.submitted_time = submitted_time
+        self.file_name = file_name
+        self.error = error
+
+
+class FakeExecutionHistory:
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeExportsOperations:
+    # Each execute() queues a run that is Queued for queued_seconds, InProgress for in_progress_seconds and then
+    # Completed (or Failed for a failure_rate share of runs); its blob shows up blob_delay_seconds later.
+    def __init__(self, queued_seconds=0.2, in_progress_seconds=0.5, blob_delay_seconds=0.1, failure_rate=0.0, seed=42):
+        self.queued_seconds = queued_seconds
+        self.in_progress_seconds = in_progress_seconds
+        self.blob_delay_seconds = blob_delay_seconds
+        self.failure_rate = failure_rate
+        self.random_generator = random.Random(seed)
+        self.export_definitions = {}
+        self.export_runs = {}
+        self.call_counts = {'create_or_update': 0, 'execute': 0, 'get_execution_history': 0, 'delete': 0}
+        self.exports_lock = threading.Lock()
+
+    def create_or_update(self, scope, export_name, parameters):
+        with self.exports_lock:
+            self.call_counts['create_or_update'] += 1
+            self.export_definitions[(scope, export_name)] = parameters
+        return parameters
+
+    def execute(self, scope, export_name):
+        with self.exports_lock:
+            self.call_counts['execute'] += 1
+            if (scope, export_name) not in self.export_definitions:
+                raise LookupError(f"Export {export_name} does not exist at scope {scope}")
+            will_fail = self.random_generator.random() < self.failure_rate
+            self.export_runs.setdefault((scope, export_name), []).append((time.monotonic(), datetime.now(timezone.utc), will_fail))
+
+    def delete(self, scope, export_name):
+        with self.exports_lock:
+            self.call_counts['delete'] += 1
+            if self.export_definitions.pop((scope, export_name), None) is None:
+                raise LookupError(f"Export {export_name} does not exist at scope {scope}")
+
+    def get_run_status(self, monotonic_submitted, will_fail):
+        run_seconds = time.monotonic() - monotonic_submitted
+        if run_seconds < self.queued_seconds:
+            return 'Queued'
+        if run_seconds < self.queued_seconds + self.in_progress_seconds:
+            return 'InProgress'
+        return 'Failed' if will_fail else export_status_completed
+
+    def get_execution_history(self, scope, export_name):
+        with self.exports_lock:
+            self.call_counts['get_execution_history'] += 1
+            export_runs = list(self.export_runs.get((scope, export_name), []))
+        return FakeExecutionHistory([FakeExportRun(self.get_run_status(monotonic_submitted, will_fail), submitted_time,
+                                                   file_name=f"{export_name}/{submitted_time:%Y%m%d%H%M%S}.csv")
+                                     for monotonic_submitted, submitted_time, will_fail in export_runs])
+
+    def blob_exists(self, export_job, export_run):
+        with self.exports_lock:
+            monotonic_submitted = self.export_runs[(export_job.scope, export_job.export_name)][-1][0]
+        return time.monotonic() - monotonic_submitted >= self.queued_seconds + self.in_progress_seconds + self.blob_delay_seconds
+
+
+class FakeCostManagementClient:
+    def __init__(self, **exports_arguments):
+        self.exports = FakeExportsOperations(**exports_arguments)
+
+
+if __name__ == '__main__':
+
+    # Offline demonstration: twelve exports against the fake client, all in flight at once
+    fake_client = FakeCostManagementClient(queued_seconds=0.5, in_progress_seconds=1.0, blob_delay_seconds=0.3, failure_rate=0.1)
+    export_jobs = [ExportJob(f'/subscriptions/{subscription_index:04d}', f'DevAdhocAmortized-2023{month:02d}',
+                             get_export_definition(f'2023-{month:02d}-01T00:00:00Z', f'2023-{month:02d}-28T00:00:00Z', 'container', 'storage-id', 'folder'))
+                   for subscription_index in range(3) for month in range(1, 5)]
+
+    start_time = time.perf_counter()
+    export_job_results = run_exports(fake_client, export_jobs, max_concurrency=8, initial_poll_seconds=0.1, max_poll_seconds=1.0,
+                                     deadline_seconds=30.0, blob_ready_function=fake_client.exports.blob_exists)
+    for export_job_result in export_job_results:
+        print(export_job_result)
+    print(f"  {sum(export_job_result.succeeded for export_job_result in export_job_results)} of {len(export_jobs)} exports ready "
+          f"in {time.perf_counter() - start_time:.1f}s, client calls: {fake_client.exports.call_counts}")
@@ -0,0 +1,132 @@
+# Cached lookups of Azure subscriptions and storage account resource ids through the management REST API.
+#
+# Subscriptions are enumerated across every page of nextLink and storage account ids are looked up by
+# name, in parallel when several are needed; both are kept in a JSON file with a TTL so repeated notebook runs reuse them instead of making the
+# same REST calls each time. On an ephemeral driver (Synapse) the cache file has to live on mounted,
+# persistent storage to survive the session: pass cache_file or set AZURE_RESOURCE_CACHE_FILE.
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+azure_management_url = "https://management.azure.com"
+azure_management_scope = f"{azure_management_url}/.default"
+subscriptions_api_version = "2022-12-01"
+storage_accounts_api_version = "2021-04-01"
+resource_cache_file = os.environ.get('AZURE_RESOURCE_CACHE_FILE', 'azure_resource_cache.json')
+resource_cache_ttl_seconds = 24 * 3600
+resource_lookup_max_workers = 8
+
+
+class AzureResourceResolverStats:
+    def __init__(self):
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.rest_calls = 0
+        self.pages_read = 0
+
+    def __str__(self):
+        return f"  CacheHits: {self.cache_hits}, CacheMisses: {self.cache_misses}, RestCalls: {self.rest_calls}, PagesRead: {self.pages_read}"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class AzureResourceResolver:
+    def __init__(self, token_provider, cache_file=resource_cache_file, ttl_seconds=resource_cache_ttl_seconds,
+                 max_workers=resource_lookup_max_workers, session=None, management_url=azure_management_url):
+        # token_provider is anything with get_bearer_header(scope), e.g. azure_token_provider.SharedTokenProvider
+        self.token_provider = token_provider
+        self.cache_file = cache_file
+        self.ttl_seconds = ttl_seconds
+        self.max_workers = max_workers
+        self.session = session or requests.Session()
+        self.management_url = management_url
+        self.stats = AzureResourceResolverStats()
+        self.cache_lock = threading.Lock()
+        self.cached_resources = {}
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, 'r') as resource_cache:
+                self.cached_resources = json.load(resource_cache)
+
+    def get_cached_resource(self, cache_key):
+        with self.cache_lock:
+            cached_resource = self.cached_resources.get(cache_key)
+            if cached_resource is not None and cached_resource['expires'] > time.time():
+                self.stats.cache_hits += 1
+                return cached_resource
+            self.stats.cache_misses += 1
+            return None
+
+    def set_cached_resource(self, cache_key, value):
+        with self.cache_lock:
+            self.cached_resources[cache_key] = {'value': value, 'expires': time.time() + self.ttl_seconds}
+            if self.cache_file:
+                os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+                temporary_cache_file = self.cache_file + '.tmp'
+                with open(temporary_cache_file, 'w') as resource_cache:
+                    json.dump(self.cached_resources, resource_cache, indent=2)
+                os.replace(temporary_cache_file, self.cache_file)
+
+    def get_management_json(self, url):
+        response = self.session.get(url, headers=self.token_provider.get_bearer_header(azure_management_scope))
+        with self.cache_lock:
+            self.stats.rest_calls += 1
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def list_subscriptions(self, refresh=False):
+        cached_resource = None if refresh else self.get_cached_resource('subscriptions')
+        if cached_resource is not None:
+            return cached_resource['value']
+
+        subscriptions = []
+        next_link = f"{self.management_url}/subscriptions?api-version={subscriptions_api_version}"
+        while next_link:
+            subscription_page = self.get_management_json(next_link)
+            if subscription_page is None:
+                # 404 on the listing or one of its nextLinks; the list may be incomplete, so it is not cached
+                print(f"  WARNING: Subscription page not found: {next_link}")
+                return subscriptions
+            self.stats.pages_read += 1
+            for subscription in subscription_page.get('value', []):
+                subscriptions.append({
+                    'id': subscription['id'],
+                    'subscriptionId': subscription.get('subscriptionId'),
+                    'displayName': subscription.get('displayName'),
+                    'state': subscription.get('state')
+                })
+            next_link = subscription_page.get('nextLink')
+        self.set_cached_resource('subscriptions', subscriptions)
+        return subscriptions
+
+    def get_storage_resource_id(self, subscription_id, resource_group_name, storage_resource_name, refresh=False):
+        # subscription_id is the '/subscriptions/<guid>' id, as the notebooks use it; None when the account does not exist
+        cache_key = f"storage|{subscription_id}|{resource_group_name}|{storage_resource_name}".lower()
+        cached_resource = None if refresh else self.get_cached_resource(cache_key)
+        if cached_resource is not None:
+            return cached_resource['value']
+
+        storage_resource_url = (f"{self.management_url}/{subscription_id.strip('/')}/resourcegroups/{resource_group_name}"
+                                f"/providers/Microsoft.Storage/storageAccounts/{storage_resource_name}?api-version={storage_accounts_api_version}")
+        storage_resource_info = self.get_management_json(storage_resource_url)
+        if storage_resource_info is None:
+            # Not cached, so an account created after this run is picked up by the next one
+            return None
+        self.set_cached_resource(cache_key, storage_resource_info['id'])
+        return storage_resource_info['id']
+
+    def get_storage_resource_ids(self, storage_lookups, refresh=False):
+        # storage_lookups are (subscription_id, resource_group_name, storage_resource_name) tuples; cached ones cost no REST call
+        storage_lookups = list(dict.fromkeys(tuple(storage_lookup) for storage_lookup in storage_lookups))
+        if not storage_lookups:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(storage_lookups))) as executor:
+            storage_resource_ids = executor.map(lambda storage_lookup: self.get_storage_resource_id(*storage_lookup, refresh=refresh), storage_lookups)
+            return dict(zip(storage_lookups, storage_resource_ids))
@@ -0,0 +1,236 @@
+# Shared Azure AD token cache with proactive background refresh.
+#
+# SharedTokenProvider wraps any azure-identity credential and is itself a credential, so it can be passed
+# to SDK clients (CostManagementClient, AzureAppConfigurationClient, ...) and also used for raw REST calls
+# through get_bearer_header(). Tokens are cached per scope; a background thread renews each one
+# refresh_margin_seconds before it expires, so callers on any thread or event loop never wait on an
+# expired token and never re-authenticate while a cached token is still good.
+
+import asyncio
+import threading
+import time
+
+from azure.core.credentials import AccessToken
+
+token_refresh_margin_seconds = 300
+token_min_valid_seconds = 30
+token_refresh_retry_seconds = 30
+token_min_refresh_seconds = 10
+
+
+class TokenProviderStats:
+    def __init__(self):
+        self.requests = 0
+        self.cache_hits = 0
+        self.acquisitions = 0
+        self.background_refreshes = 0
+        self.refresh_failures = 0
+
+    def __str__(self):
+        return (f"  TokenRequests: {self.requests}, CacheHits: {self.cache_hits}, Acquisitions: {self.acquisitions}, "
+                f"BackgroundRefreshes: {self.background_refreshes}, RefreshFailures: {self.refresh_failures}")
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class SharedTokenProvider:
+    def __init__(self, credential, refresh_margin_seconds=token_refresh_margin_seconds, background_refresh=True):
+        self.credential = credential
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.background_refresh = background_refresh
+        self.stats = TokenProviderStats()
+        self.cached_tokens = {}
+        self.refresh_after = {}
+        self.token_lock = threading.Lock()
+        # One lock per scope, so concurrent misses for the same scope make a single acquisition
+        self.acquisition_locks = {}
+        self.refresh_wakeup = threading.Event()
+        self.refresh_stopped = False
+        self.refresh_thread = None
+
+    def get_token_key(self, scopes, tenant_id):
+        return tuple(sorted(scopes)), tenant_id
+
+    def get_cached_token(self, token_key):
+        cached_token = self.cached_tokens.get(token_key)
+        if cached_token is None or cached_token.expires_on - time.time() < token_min_valid_seconds:
+            return None
+        # Without the background thread a token close to expiry is renewed by the next caller instead
+        if not self.background_refresh and time.time() >= self.refresh_after[token_key]:
+            return None
+        return cached_token
+
+    def acquire_token(self, token_key, **kwargs):
+        scopes, tenant_id = token_key
+        if tenant_id is not None:
+            kwargs['tenant_id'] = tenant_id
+        access_token = self.credential.get_token(*scopes, **kwargs)
+        with self.token_lock:
+            self.cached_tokens[token_key] = access_token
+            self.refresh_after[token_key] = self.get_refresh_after(access_token)
+        return access_token
+
+    def get_refresh_after(self, access_token, now=None):
+        # A token living no longer than the margin is renewed half way through its lifetime instead, and never
+        # sooner than token_min_refresh_seconds from now, so short-lived tokens cannot spin the refresh thread
+        now = time.time() if now is None else now
+        lifetime_seconds = access_token.expires_on - now
+        return max(now + token_min_refresh_seconds, access_token.expires_on - min(self.refresh_margin_seconds, lifetime_seconds / 2))
+
+    def get_token(self, *scopes, claims=None, tenant_id=None, **kwargs):
+        # azure.core TokenCredential protocol
+        token_key = self.get_token_key(scopes, tenant_id)
+        with self.token_lock:
+            self.stats.requests += 1
+            cached_token = self.get_cached_token(token_key) if claims is None else None
+            if cached_token is not None:
+                self.stats.cache_hits += 1
+                return cached_token
+            acquisition_lock = self.acquisition_locks.setdefault(token_key, threading.Lock())
+
+        with acquisition_lock:
+            # Another thread may have acquired it while this one waited
+            with self.token_lock:
+                cached_token = self.get_cached_token(token_key) if claims is None else None
+                if cached_token is not None:
+                    self.stats.cache_hits += 1
+                    return cached_token
+            if claims is not None:
+                kwargs['claims'] = claims
+            access_token = self.acquire_token(token_key, **kwargs)
+            with self.token_lock:
+                self.stats.acquisitions += 1
+        self.start_background_refresh()
+        return access_token
+
+    async def get_token_async(self, *scopes, claims=None, tenant_id=None, **kwargs):
+        # Cache hits are answered on the event loop; a miss runs the blocking credential call in a thread
+        if claims is None:
+            token_key = self.get_token_key(scopes, tenant_id)
+            with self.token_lock:
+                cached_token = self.get_cached_token(token_key)
+                if cached_token is not None:
+                    self.stats.requests += 1
+                    self.stats.cache_hits += 1
+                    return cached_token
+        return await asyncio.to_thread(self.get_token, *scopes, claims=claims, tenant_id=tenant_id, **kwargs)
+
+    def get_bearer_header(self, *scopes):
+        return {"Authorization": f"Bearer {self.get_token(*scopes).token}"}
+
+    def start_background_refresh(self):
+        if not self.background_refresh:
+            return
+        with self.token_lock:
+            if self.refresh_thread is None and not self.refresh_stopped:
+                self.refresh_thread = threading.Thread(target=self.run_background_refresh, name='token-refresh', daemon=True)
+                self.refresh_thread.start()
+        self.refresh_wakeup.set()
+
+    def run_background_refresh(self):
+        while True:
+            with self.token_lock:
+                if self.refresh_stopped:
+                    return
+                due_token_keys = [token_key for token_key, refresh_after in self.refresh_after.items() if refresh_after <= time.time()]
+                next_refresh_after = min(self.refresh_after.values(), default=None)
+
+            for token_key in due_token_keys:
+                try:
+                    self.acquire_token(token_key)
+                    with self.token_lock:
+                        self.stats.background_refreshes += 1
+                except Exception:
+                    # The cached token is still valid for a while; try again shortly rather than give up on it
+                    with self.token_lock:
+                        self.stats.refresh_failures += 1
+                        self.refresh_after[token_key] = time.time() + token_refresh_retry_seconds
+
+            if due_token_keys:
+                continue
+            wait_seconds = None if next_refresh_after is None else max(0.0, next_refresh_after - time.time())
+            self.refresh_wakeup.wait(wait_seconds)
+            self.refresh_wakeup.clear()
+
+    def close(self):
+        with self.token_lock:
+            self.refresh_stopped = True
+        self.refresh_wakeup.set()
+        if self.refresh_thread is not None:
+            self.refresh_thread.join()
+        if hasattr(self.credential, 'close'):
+            self.credential.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncSharedTokenCredential:
+    # azure.core AsyncTokenCredential view of a SharedTokenProvider, for the SDKs' aio clients. Closing it
+    # leaves the provider running, since sync callers may still be sharing it.
+    def __init__(self, token_provider):
+        self.token_provider = token_provider
+
+    async def get_token(self, *scopes, **kwargs):
+        return await self.token_provider.get_token_async(*scopes, **kwargs)
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class FakeTokenCredential:
+    # In-process stand-in for ClientSecretCredential: each call takes latency_seconds and returns a token
+    # valid for lifetime_seconds
+    def __init__(self, lifetime_seconds=3600, latency_seconds=0.05):
+        self.lifetime_seconds = lifetime_seconds
+        self.latency_seconds = latency_seconds
+        self.call_count = 0
+        self.call_lock = threading.Lock()
+
+    def get_token(self, *scopes, **kwargs):
+        with self.call_lock:
+            self.call_count += 1
+            call_count = self.call_count
+        time.sleep(self.latency_seconds)
+        return AccessToken(f"fake-token-{call_count}", int(time.time() + self.lifetime_seconds))
+
+
+if __name__ == '__main__':
+
+    # Offline demonstration: threads and asyncio tasks sharing one provider and one credential call
+    from concurrent.futures import ThreadPoolExecutor
+
+    management_scope = "https://management.azure.com/.default"
+    fake_credential = FakeTokenCredential(lifetime_seconds=3600, latency_seconds=0.05)
+    with SharedTokenProvider(fake_credential) as token_provider:
+
+        def call_management_api(call_index):
+            time.sleep(0.01)
+            return token_provider.get_bearer_header(management_scope)
+
+        async def call_management_api_async(call_index):
+            await asyncio.sleep(0.01)
+            return await token_provider.get_token_async(management_scope)
+
+        async def run_async_calls():
+            for _ in range(20):
+                await asyncio.gather(*[call_management_api_async(call_index) for call_index in range(10)])
+                await asyncio.sleep(0.1)
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            thread_calls = executor.map(call_management_api, range(400))
+            asyncio.run(run_async_calls())
+            list(thread_calls)
+        print(token_provider.stats)
+        print(f"  Credential calls: {fake_credential.call_count} in {time.perf_counter() - start_time:.1f}s")
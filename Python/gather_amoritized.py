@@ -1,10 +1,14 @@
 azure_management_api_linked_service = ""
+export_backfill_state_file = ""
 export_date_start_from = ""
 export_date_start_to = ""
 export_name_amortized = ""
+export_subscription_ids = ""
 export_type = ""
+export_window_days = ""
 key_vault_linked_service = ""
 key_vault_name = ""
+resource_cache_file = ""
 resource_group_name = ""
 storage_export_folder = ""
 storage_resource_name = ""
@@ -13,6 +17,8 @@ synapse_notebook_name = "acquire_azure_billing_amortized"
 # debug values
 if not azure_management_api_linked_service:
     azure_management_api_linked_service = "azure_management_api"
+if not export_backfill_state_file:
+    export_backfill_state_file = "export_backfill_state.json"
 if not export_date_start_from:
     export_date_start_from = "2023-10-01T00:00:00Z"
 if not export_date_start_to:
@@ -21,6 +27,8 @@ if not export_name_amortized:
     export_name_amortized = "DevAdhocAmortized"
 if not export_type:
     export_type = "amortized"
+if not export_window_days:
+    export_window_days = "0"
 if not key_vault_linked_service:
     key_vault_linked_service = "showcase_key_vault"
 if not key_vault_name:
@@ -41,8 +49,10 @@ if not storage_resource_name:
 
 from azure.identity import ClientSecretCredential
 from azure.mgmt.costmanagement import CostManagementClient
+from azure_cost_export_orchestrator import ExportBlobReadyCheck, ExportJob, get_export_definition, run_export_backfill, run_exports
+from azure_resource_resolver import AzureResourceResolver, resource_cache_file as default_resource_cache_file
+from azure_token_provider import SharedTokenProvider
 from notebookutils import mssparkutils
-import requests
 
 print(f"Starting notebook: {synapse_notebook_name}")
 
@@ -63,66 +73,73 @@ tenant_id = mssparkutils.credentials.getSecret(key_vault_name, "azure-billing-se
 print("Creating a ClientSecretCredential")
 secret_credential = ClientSecretCredential(tenant_id, service_principal_client_id, service_principal_client_secret)
 
-print("Creating an Azure CostManagementClient")
-cost_management_client = CostManagementClient(secret_credential)
-
-print("Getting an Azure Management REST API token for environment")
-azure_base_url = "https://management.azure.com"
-secret_credential_token = secret_credential.get_token(f"{azure_base_url}/.default").token
+# Tokens are cached per scope and renewed in the background before they expire, for the SDK client and the REST calls alike
+token_provider = SharedTokenProvider(secret_credential)
 
-print("Getting the subscription_id for environment")
-azure_mgmt_rest_api_url = "https://management.azure.com/subscriptions?api-version=2022-12-01"
-subscription_response = requests.get(azure_mgmt_rest_api_url, headers={"Authorization": f"Bearer {secret_credential_token}"})
-subscription_response.raise_for_status()
-subscription_info = subscription_response.json()
-
-subscription_id = subscription_info['value'][0]['id']
-if subscription_id is None:
+print("Creating an Azure CostManagementClient")
+cost_management_client = CostManagementClient(token_provider)
+
+# Subscriptions (all nextLink pages) and storage account ids are cached on disk between runs. The driver's working
+# directory does not outlive a Synapse session, so resource_cache_file (or AZURE_RESOURCE_CACHE_FILE) should point
+# at a mounted storage path for the cache to be reused.
+resource_resolver = AzureResourceResolver(token_provider, cache_file=resource_cache_file or default_resource_cache_file)
+
+print("Getting the subscription_ids for environment")
+subscriptions = resource_resolver.list_subscriptions()
+# export_subscription_ids: empty exports the first subscription only, "*" every enabled one, otherwise a comma separated list of ids
+if export_subscription_ids.strip() == "*":
+    export_subscriptions = [subscription for subscription in subscriptions if subscription.get('state') in (None, 'Enabled')]
+elif export_subscription_ids.strip():
+    requested_subscription_ids = {subscription_id.strip().split('/')[-1].lower() for subscription_id in export_subscription_ids.split(',') if subscription_id.strip()}
+    export_subscriptions = [subscription for subscription in subscriptions if subscription['id'].split('/')[-1].lower() in requested_subscription_ids]
+else:
+    export_subscriptions = subscriptions[:1]
+if not export_subscriptions:
     mssparkutils.session.stop()
     mssparkutils.notebook.exit({"return_code": 1, "message": "FAILED to get subscription_id"})
-print(f"   subscription_id: {subscription_id}")
+subscription_id = export_subscriptions[0]['id']
+print(f"   subscription_ids: {[subscription['id'] for subscription in export_subscriptions]} (of {len(subscriptions)} subscriptions)")
 
 print("Getting the storage_resource_id for Cost Export targets")
-azure_mgmt_rest_api_storage_url = f"https://management.azure.com/{subscription_id}/resourcegroups/{resource_group_name}/providers/Microsoft.Storage/storageAccounts/{storage_resource_name}?api-version=2021-04-01"
-
-storage_resource_response = requests.get(azure_mgmt_rest_api_storage_url, headers={"Authorization": f"Bearer {secret_credential_token}"})
-storage_resource_response.raise_for_status()
-storage_resource_info = storage_resource_response.json()
-
-storage_resource_id = storage_resource_info['id']
+# The storage account lives in one of the subscriptions; every candidate is looked up in parallel and cached for later runs
+storage_resource_ids = resource_resolver.get_storage_resource_ids(
+    (subscription['id'], resource_group_name, storage_resource_name) for subscription in export_subscriptions + subscriptions)
+storage_resource_id = next((resource_id for resource_id in storage_resource_ids.values() if resource_id is not None), None)
 if storage_resource_id is None:
     mssparkutils.session.stop()
     mssparkutils.notebook.exit({"return_code": 1, "message": "FAILED to get storage_resource_id"})
 print(f"   storage_resource_id: {storage_resource_id}")
-
-# Define the export scope to the tenant, subscription, resource group, etc.
-scope=f'{subscription_id}'
-
-print("Defining the Azure cost export parameters")
-parameters = {
-    "definition": {
-        "type": "AmortizedCost",
-        "timeframe": "Custom",
-        "time_period": {
-            "from_property": f'{export_date_start_from}',
-            "to": f'{export_date_start_to}'
-        }
-    },
-    "format": "Csv",
-    "deliveryInfo": {
-        "destination": {
-            "container": f'{storage_resource_name}',
-            "resourceId": f'{storage_resource_id}',
-            "rootFolderPath": f'{storage_export_folder}',
-        },
-    }
-}
-
-print("Creating / Updating the scoped export")
-export = cost_management_client.exports.create_or_update(scope, export_name_amortized, parameters)
-
-print("Executing the export")
-cost_management_client.exports.execute(scope, export_name_amortized)
+print(resource_resolver.stats)
+
+# Define the export scopes to the tenant, subscription, resource group, etc.; one export per subscription
+scopes = [f"{subscription['id']}" for subscription in export_subscriptions]
+
+# A completed run only counts once its files are listed in the export's storage folder
+export_blob_ready_check = ExportBlobReadyCheck(token_provider)
+
+if int(export_window_days) > 0:
+    # Backfill mode: one export per window, run in parallel, skipping windows an earlier run already completed
+    print(f"Backfilling {export_date_start_from} to {export_date_start_to} in {export_window_days} day windows")
+    export_job_results = run_export_backfill(cost_management_client, scopes, export_name_amortized, export_date_start_from, export_date_start_to,
+                                             storage_resource_name, storage_resource_id, storage_export_folder,
+                                             window_days=int(export_window_days), state_file=export_backfill_state_file,
+                                             blob_ready_function=export_blob_ready_check.blob_ready)
+else:
+    print("Defining the Azure cost export parameters")
+    parameters = get_export_definition(export_date_start_from, export_date_start_to, storage_resource_name, storage_resource_id, storage_export_folder)
+
+    print(f"Creating / Updating and executing the scoped exports for {len(scopes)} subscriptions, waiting for the export files")
+    export_job_results = run_exports(cost_management_client, [ExportJob(scope, export_name_amortized, parameters) for scope in scopes],
+                                     blob_ready_function=export_blob_ready_check.blob_ready)
+
+failed_export_job_results = [export_job_result for export_job_result in export_job_results if not export_job_result.succeeded]
+for export_job_result in export_job_results:
+    print(export_job_result)
+print(token_provider.stats)
+token_provider.close()
+if failed_export_job_results:
+    mssparkutils.session.stop()
+    mssparkutils.notebook.exit({"return_code": 1, "message": f"FAILED {len(failed_export_job_results)} of {len(export_job_results)} exports for {export_name_amortized}"})
 
 print(f"END notebook: {synapse_notebook_name}")
 mssparkutils.notebook.exit({"return_code": 0, "message": "SUCCESS"})
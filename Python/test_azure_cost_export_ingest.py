@@ -0,0 +1,93 @@
+import azure_cost_export_ingest
+import os
+import pandas as pd
+import pyarrow.parquet as pq
+import tempfile
+import unittest
+
+
+class CostExportIngestUnitTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary_folder = tempfile.TemporaryDirectory()
+        self.source_root = os.path.join(self.temporary_folder.name, 'source')
+        self.output_root = os.path.join(self.temporary_folder.name, 'output')
+
+    def tearDown(self):
+        self.temporary_folder.cleanup()
+
+    def get_output_files(self):
+        return sorted(os.path.relpath(os.path.join(directory_path, file_name), self.output_root)
+                      for directory_path, directory_names, file_names in os.walk(self.output_root) for file_name in file_names)
+
+    def test_case1_partitions_by_subscription_and_date(self):
+        azure_cost_export_ingest.write_sample_cost_export(self.source_root, 'DevAdhocAmortized', '2023-10-01', 3, 2, 10, 'run-1')
+        ingest_stats = azure_cost_export_ingest.ingest_cost_exports(self.source_root, self.output_root, chunk_rows=7)
+
+        self.assertEqual(ingest_stats.rows_written, 60)
+        self.assertEqual(ingest_stats.partition_files_written, 6)
+        partition_file = os.path.join(self.output_root, 'SubscriptionId=00000000-0000-0000-0000-000000000001', 'Date=2023-10-02',
+                                      azure_cost_export_ingest.get_window_file_name('DevAdhocAmortized/20231001-20231003'))
+        self.assertEqual(pq.read_table(partition_file).num_rows, 10)
+
+    def test_case2_partitions_by_usage_date_time(self):
+        run_folder = os.path.join(self.source_root, 'DevAdhocActual', '20231001-20231002', 'run-1')
+        os.makedirs(run_folder)
+        pd.DataFrame({
+            'UsageDateTime': ['2023-10-01T00:00:00', '2023-10-01T13:00:00', '2023-10-02T00:00:00'],
+            'SubscriptionGuid': ['sub-a', 'sub-a', 'sub-b'],
+            'PreTaxCost': ['1.0', '2.0', '3.0']
+        }).to_csv(os.path.join(run_folder, 'part_0_0001.csv'), index=False)
+
+        ingest_stats = azure_cost_export_ingest.ingest_cost_exports(self.source_root, self.output_root)
+
+        self.assertEqual(ingest_stats.rows_written, 3)
+        partition_folders = sorted(os.path.dirname(output_file) for output_file in self.get_output_files() if output_file.endswith('.parquet'))
+        self.assertEqual(partition_folders, [os.path.join('SubscriptionId=sub-a', 'Date=2023-10-01'), os.path.join('SubscriptionId=sub-b', 'Date=2023-10-02')])
+
+    def test_case3_buffers_chunks_into_row_groups(self):
+        azure_cost_export_ingest.write_sample_cost_export(self.source_root, 'DevAdhocAmortized', '2023-10-01', 1, 1, 1000, 'run-1')
+        azure_cost_export_ingest.ingest_cost_exports(self.source_root, self.output_root, chunk_rows=10, row_group_rows=400)
+
+        parquet_file = pq.ParquetFile(os.path.join(self.output_root, [output_file for output_file in self.get_output_files() if output_file.endswith('.parquet')][0]))
+        self.assertEqual(parquet_file.metadata.num_rows, 1000)
+        self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+
+    def test_case4_failed_run_leaves_no_temporary_files(self):
+        azure_cost_export_ingest.write_sample_cost_export(self.source_root, 'DevAdhocAmortized', '2023-10-01', 2, 1, 10, 'run-1')
+        with open(os.path.join(self.source_root, 'DevAdhocAmortized', '20231001-20231002', 'run-1', 'part_0_0002.csv'), 'w') as broken_file:
+            broken_file.write('Date,SubscriptionId,CostInBillingCurrency\n10/01/2023,sub-a,not-a-number\n')
+
+        with self.assertRaises(Exception):
+            azure_cost_export_ingest.ingest_cost_exports(self.source_root, self.output_root)
+        self.assertEqual([output_file for output_file in self.get_output_files() if output_file.endswith('.tmp')], [])
+
+    def test_case5_files_of_a_run_can_order_their_columns_differently(self):
+        run_folder = os.path.join(self.source_root, 'DevAdhocAmortized', '20231001-20231001', 'run-1')
+        os.makedirs(run_folder)
+        pd.DataFrame({
+            'Date': ['10/01/2023', '10/01/2023'],
+            'SubscriptionId': ['sub-a', 'sub-a'],
+            'MeterCategory': ['Storage', 'Storage'],
+            'CostInBillingCurrency': [1.0, 2.0]
+        }).to_csv(os.path.join(run_folder, 'part_0_0001.csv'), index=False)
+        pd.DataFrame({
+            'CostInBillingCurrency': [3.0],
+            'SubscriptionId': ['sub-a'],
+            'ResourceGroup': ['showcase-dev-rg'],
+            'Date': ['10/01/2023'],
+            'MeterCategory': ['Bandwidth']
+        }).to_csv(os.path.join(run_folder, 'part_0_0002.csv'), index=False)
+
+        ingest_stats = azure_cost_export_ingest.ingest_cost_exports(self.source_root, self.output_root)
+        partition_table = pq.read_table(os.path.join(self.output_root, 'SubscriptionId=sub-a', 'Date=2023-10-01',
+                                                     azure_cost_export_ingest.get_window_file_name('DevAdhocAmortized/20231001-20231001')))
+
+        self.assertEqual(ingest_stats.rows_written, 3)
+        self.assertEqual(partition_table.column_names, ['MeterCategory', 'CostInBillingCurrency', 'ResourceGroup'])
+        self.assertEqual(partition_table.column('CostInBillingCurrency').to_pylist(), [1.0, 2.0, 3.0])
+        self.assertEqual(partition_table.column('ResourceGroup').to_pylist(), [None, None, 'showcase-dev-rg'])
+
+
+if __name__ == '__main__':
+    unittest.main()
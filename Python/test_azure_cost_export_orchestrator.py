@@ -0,0 +1,155 @@
+import asyncio
+import azure_cost_export_orchestrator
+import json
+import os
+import tempfile
+import unittest
+
+from datetime import datetime, timezone
+
+blob_list_xml = """<?xml version="1.0" encoding="utf-8"?>
+<EnumerationResults ContainerName="https://showcasedevstorage.blob.core.windows.net/billing">
+  <Blobs>{blobs}</Blobs>
+  <NextMarker>{next_marker}</NextMarker>
+</EnumerationResults>"""
+blob_xml = "<Blob><Name>{name}</Name><Properties><Last-Modified>{last_modified}</Last-Modified></Properties></Blob>"
+
+
+class FakeBlobListResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content.encode()
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeBlobListSession:
+    # Serves blob_pages by continuation marker, each page a list of (name, Last-Modified) pairs
+    def __init__(self, blob_pages, status_code=200):
+        self.blob_pages = blob_pages
+        self.status_code = status_code
+        self.requests = []
+
+    def get(self, url, params=None, headers=None):
+        self.requests.append((url, dict(params), headers))
+        page_index = int(params['marker'].split('-')[-1]) if 'marker' in params else 0
+        blobs = ''.join(blob_xml.format(name=name, last_modified=last_modified) for name, last_modified in self.blob_pages[page_index])
+        next_marker = f"marker-{page_index + 1}" if page_index + 1 < len(self.blob_pages) else ''
+        return FakeBlobListResponse(blob_list_xml.format(blobs=blobs, next_marker=next_marker), self.status_code)
+
+
+class FakeBearerTokenProvider:
+    def get_bearer_header(self, *scopes):
+        return {"Authorization": "Bearer fake-token"}
+
+
+def get_export_job():
+    export_definition = azure_cost_export_orchestrator.get_export_definition(
+        '2023-10-01T00:00:00Z', '2023-10-27T00:00:00Z', 'billing',
+        '/subscriptions/0000/resourceGroups/showcase-dev-rg/providers/Microsoft.Storage/storageAccounts/showcasedevstorage',
+        'acquired-azure-billing-exports\\amortized')
+    return azure_cost_export_orchestrator.ExportJob('/subscriptions/0000', 'DevAdhocAmortized', export_definition)
+
+
+class CostExportOrchestratorUnitTestSuite(unittest.TestCase):
+
+    def test_case1_blob_check_lists_the_export_folder(self):
+        session = FakeBlobListSession([[], [('acquired-azure-billing-exports/amortized/DevAdhocAmortized/20231001-20231027/run-1/part_0_0001.csv',
+                                             'Mon, 02 Oct 2023 10:00:00 GMT')]])
+        blob_ready_check = azure_cost_export_orchestrator.ExportBlobReadyCheck(FakeBearerTokenProvider(), session=session)
+        export_run = azure_cost_export_orchestrator.FakeExportRun('Completed', datetime(2023, 10, 2, 9, 0, tzinfo=timezone.utc))
+
+        self.assertTrue(blob_ready_check.blob_ready(get_export_job(), export_run))
+        url, parameters, headers = session.requests[0]
+        self.assertEqual(url, 'https://showcasedevstorage.blob.core.windows.net/billing')
+        self.assertEqual(parameters['prefix'], 'acquired-azure-billing-exports/amortized/DevAdhocAmortized/')
+        self.assertEqual(session.requests[1][1]['marker'], 'marker-1')
+
+    def test_case2_blob_check_ignores_files_from_earlier_runs(self):
+        session = FakeBlobListSession([[('acquired-azure-billing-exports/amortized/DevAdhocAmortized/20231001-20231027/run-0/part_0_0001.csv',
+                                         'Sun, 01 Oct 2023 10:00:00 GMT')]])
+        blob_ready_check = azure_cost_export_orchestrator.ExportBlobReadyCheck(FakeBearerTokenProvider(), session=session)
+        export_run = azure_cost_export_orchestrator.FakeExportRun('Completed', datetime(2023, 10, 2, 9, 0, tzinfo=timezone.utc))
+        self.assertFalse(blob_ready_check.blob_ready(get_export_job(), export_run))
+
+    def test_case3_blob_check_matches_the_run_file_name(self):
+        session = FakeBlobListSession([[('acquired-azure-billing-exports/amortized/DevAdhocAmortized/20231001-20231027/run-1/part_0_0001.csv',
+                                         'Mon, 02 Oct 2023 10:00:00 GMT')]])
+        blob_ready_check = azure_cost_export_orchestrator.ExportBlobReadyCheck(FakeBearerTokenProvider(), session=session)
+        submitted_time = datetime(2023, 10, 2, 9, 0, tzinfo=timezone.utc)
+        ready_run = azure_cost_export_orchestrator.FakeExportRun('Completed', submitted_time, file_name='DevAdhocAmortized/20231001-20231027/run-1/part_0_0001.csv')
+        missing_run = azure_cost_export_orchestrator.FakeExportRun('Completed', submitted_time, file_name='DevAdhocAmortized/20231001-20231027/run-2/part_0_0001.csv')
+
+        self.assertTrue(blob_ready_check.blob_ready(get_export_job(), ready_run))
+        self.assertFalse(blob_ready_check.blob_ready(get_export_job(), missing_run))
+
+    def test_case4_run_exports_works_inside_a_running_event_loop(self):
+        fake_client = azure_cost_export_orchestrator.FakeCostManagementClient(queued_seconds=0.01, in_progress_seconds=0.01, blob_delay_seconds=0.01)
+        export_jobs = [get_export_job()]
+
+        async def run_in_notebook_cell():
+            # A notebook cell calls the blocking entry point while the kernel's loop is running
+            return azure_cost_export_orchestrator.run_exports(fake_client, export_jobs, initial_poll_seconds=0.01,
+                                                              blob_ready_function=fake_client.exports.blob_exists)
+
+        export_job_results = asyncio.run(run_in_notebook_cell())
+        self.assertTrue(export_job_results[0].succeeded)
+
+    def run_backfill(self, fake_client, state_file):
+        return azure_cost_export_orchestrator.run_export_backfill(fake_client, '/subscriptions/0000', 'DevAdhocAmortized', '2023-10-01T00:00:00Z', '2023-10-14T00:00:00Z',
+                                                                  'billing', 'storage-id', 'folder', window_days=7, state_file=state_file, initial_poll_seconds=0.01)
+
+    def test_case5_backfill_deletes_completed_window_definitions(self):
+        fake_client = azure_cost_export_orchestrator.FakeCostManagementClient(queued_seconds=0.01, in_progress_seconds=0.01)
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            state_file = os.path.join(temporary_folder, 'export_backfill_state.json')
+            export_job_results = self.run_backfill(fake_client, state_file)
+            with open(state_file) as backfill_state_file:
+                completed_windows = json.load(backfill_state_file)['/subscriptions/0000|DevAdhocAmortized']
+            self.run_backfill(fake_client, state_file)
+
+        self.assertEqual([export_job_result.definition_deleted for export_job_result in export_job_results], [True, True])
+        self.assertEqual(fake_client.exports.export_definitions, {})
+        self.assertEqual(sorted(completed_windows), ['DevAdhocAmortized-20231001-20231007', 'DevAdhocAmortized-20231008-20231014'])
+        self.assertTrue(all(completed_window['definition_deleted'] for completed_window in completed_windows.values()))
+        self.assertEqual(fake_client.exports.call_counts['execute'], 2)
+
+    def test_case6_backfill_retries_a_failed_definition_delete(self):
+        fake_client = azure_cost_export_orchestrator.FakeCostManagementClient(queued_seconds=0.01, in_progress_seconds=0.01)
+        exports_delete = fake_client.exports.delete
+
+        def fail_delete(scope, export_name):
+            raise ConnectionError("Simulated delete failure")
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            state_file = os.path.join(temporary_folder, 'export_backfill_state.json')
+            fake_client.exports.delete = fail_delete
+            self.run_backfill(fake_client, state_file)
+            self.assertEqual(len(fake_client.exports.export_definitions), 2)
+            fake_client.exports.delete = exports_delete
+            self.run_backfill(fake_client, state_file)
+            backfill_state = azure_cost_export_orchestrator.ExportBackfillState(state_file)
+
+        self.assertEqual(fake_client.exports.export_definitions, {})
+        self.assertEqual(backfill_state.get_undeleted_windows('/subscriptions/0000', 'DevAdhocAmortized'), [])
+        self.assertEqual(fake_client.exports.call_counts['execute'], 2)
+
+    def test_case7_backfill_exports_every_subscription_scope(self):
+        fake_client = azure_cost_export_orchestrator.FakeCostManagementClient(queued_seconds=0.01, in_progress_seconds=0.01)
+        scopes = ['/subscriptions/0000', '/subscriptions/0001']
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            state_file = os.path.join(temporary_folder, 'export_backfill_state.json')
+            export_job_results = azure_cost_export_orchestrator.run_export_backfill(fake_client, scopes, 'DevAdhocAmortized', '2023-10-01T00:00:00Z', '2023-10-14T00:00:00Z',
+                                                                                    'billing', 'storage-id', 'folder', window_days=7, state_file=state_file, initial_poll_seconds=0.01)
+            backfill_state = azure_cost_export_orchestrator.ExportBackfillState(state_file)
+
+        self.assertEqual(sorted((export_job_result.export_job.scope, export_job_result.export_job.export_name) for export_job_result in export_job_results),
+                         [(scope, window_export_name) for scope in scopes for window_export_name in ('DevAdhocAmortized-20231001-20231007', 'DevAdhocAmortized-20231008-20231014')])
+        self.assertTrue(all(backfill_state.is_completed(scope, 'DevAdhocAmortized', 'DevAdhocAmortized-20231008-20231014') for scope in scopes))
+        self.assertEqual(fake_client.exports.call_counts['execute'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import azure_resource_resolver
+import os
+import tempfile
+import unittest
+
+
+class FakeManagementResponse:
+    def __init__(self, status_code, json_body=None):
+        self.status_code = status_code
+        self.json_body = json_body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self.json_body
+
+
+class FakeManagementSession:
+    # Answers each URL from responses, 404 for anything else
+    def __init__(self, responses):
+        self.responses = responses
+        self.urls = []
+
+    def get(self, url, headers=None):
+        self.urls.append(url)
+        return self.responses.get(url, FakeManagementResponse(404))
+
+
+class FakeBearerTokenProvider:
+    def get_bearer_header(self, *scopes):
+        return {"Authorization": "Bearer fake-token"}
+
+
+subscriptions_url = f"{azure_resource_resolver.azure_management_url}/subscriptions?api-version={azure_resource_resolver.subscriptions_api_version}"
+
+
+def get_storage_resource_id(subscription_id, resource_group_name, storage_resource_name):
+    return f"{subscription_id}/resourceGroups/{resource_group_name}/providers/Microsoft.Storage/storageAccounts/{storage_resource_name}"
+
+
+def get_storage_resource_url(subscription_id, resource_group_name, storage_resource_name):
+    return (f"{azure_resource_resolver.azure_management_url}/{subscription_id.strip('/')}/resourcegroups/{resource_group_name}"
+            f"/providers/Microsoft.Storage/storageAccounts/{storage_resource_name}?api-version={azure_resource_resolver.storage_accounts_api_version}")
+
+
+class AzureResourceResolverUnitTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.temporary_folder = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.temporary_folder.name, 'mounted', 'azure_resource_cache.json')
+
+    def tearDown(self):
+        self.temporary_folder.cleanup()
+
+    def test_case1_subscriptions_are_read_across_pages_and_cached(self):
+        session = FakeManagementSession({
+            subscriptions_url: FakeManagementResponse(200, {'value': [{'id': '/subscriptions/0001'}], 'nextLink': 'page-2'}),
+            'page-2': FakeManagementResponse(200, {'value': [{'id': '/subscriptions/0002'}]})
+        })
+        resource_resolver = azure_resource_resolver.AzureResourceResolver(FakeBearerTokenProvider(), cache_file=self.cache_file, session=session)
+        subscriptions = resource_resolver.list_subscriptions()
+        cached_resolver = azure_resource_resolver.AzureResourceResolver(FakeBearerTokenProvider(), cache_file=self.cache_file, session=session)
+
+        self.assertEqual([subscription['id'] for subscription in subscriptions], ['/subscriptions/0001', '/subscriptions/0002'])
+        self.assertEqual(cached_resolver.list_subscriptions(), subscriptions)
+        self.assertEqual(len(session.urls), 2)
+
+    def test_case2_missing_subscription_page_is_not_cached(self):
+        session = FakeManagementSession({
+            subscriptions_url: FakeManagementResponse(200, {'value': [{'id': '/subscriptions/0001'}], 'nextLink': 'page-2'})
+        })
+        resource_resolver = azure_resource_resolver.AzureResourceResolver(FakeBearerTokenProvider(), cache_file=self.cache_file, session=session)
+
+        self.assertEqual([subscription['id'] for subscription in resource_resolver.list_subscriptions()], ['/subscriptions/0001'])
+        self.assertIsNone(resource_resolver.get_cached_resource('subscriptions'))
+        self.assertFalse(os.path.exists(self.cache_file))
+
+    def test_case3_missing_subscription_listing_returns_no_subscriptions(self):
+        resource_resolver = azure_resource_resolver.AzureResourceResolver(FakeBearerTokenProvider(), cache_file=self.cache_file, session=FakeManagementSession({}))
+        self.assertEqual(resource_resolver.list_subscriptions(), [])
+
+    def test_case4_storage_ids_are_resolved_in_parallel_and_cached(self):
+        storage_lookups = [(f'/subscriptions/000{index}', 'showcase-dev-rg', 'showcasedevstorage') for index in range(1, 7)]
+        session = FakeManagementSession({get_storage_resource_url(*storage_lookup): FakeManagementResponse(200, {'id': get_storage_resource_id(*storage_lookup)})
+                                         for storage_lookup in storage_lookups[:5]})
+        resource_resolver = azure_resource_resolver.AzureResourceResolver(FakeBearerTokenProvider(), cache_file=self.cache_file, max_workers=4, session=session)
+        storage_resource_ids = resource_resolver.get_storage_resource_ids(storage_lookups)
+        cached_resolver = azure_resource_resolver.AzureResourceResolver(FakeBearerTokenProvider(), cache_file=self.cache_file, session=session)
+        cached_storage_resource_ids = cached_resolver.get_storage_resource_ids(storage_lookups[:5])
+
+        self.assertEqual(storage_resource_ids, {storage_lookup: get_storage_resource_id(*storage_lookup) for storage_lookup in storage_lookups[:5]} | {storage_lookups[5]: None})
+        self.assertEqual(cached_storage_resource_ids, {storage_lookup: storage_resource_ids[storage_lookup] for storage_lookup in storage_lookups[:5]})
+        self.assertEqual(len(session.urls), 6)
+        self.assertEqual(cached_resolver.stats.cache_hits, 5)
+        self.assertEqual(cached_resolver.stats.rest_calls, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
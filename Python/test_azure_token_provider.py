@@ -0,0 +1,41 @@
+import azure_token_provider
+import time
+import unittest
+
+from azure.core.credentials import AccessToken
+
+management_scope = "https://management.azure.com/.default"
+
+
+class TokenProviderUnitTestSuite(unittest.TestCase):
+
+    def test_case1_refreshes_margin_before_expiry(self):
+        token_provider = azure_token_provider.SharedTokenProvider(azure_token_provider.FakeTokenCredential(), refresh_margin_seconds=300, background_refresh=False)
+        self.assertEqual(token_provider.get_refresh_after(AccessToken('token', 1000 + 3600), now=1000), 1000 + 3300)
+
+    def test_case2_short_lived_token_refreshes_half_way(self):
+        token_provider = azure_token_provider.SharedTokenProvider(azure_token_provider.FakeTokenCredential(), refresh_margin_seconds=300, background_refresh=False)
+        self.assertEqual(token_provider.get_refresh_after(AccessToken('token', 1000 + 200), now=1000), 1000 + 100)
+
+    def test_case3_refresh_is_never_due_immediately(self):
+        token_provider = azure_token_provider.SharedTokenProvider(azure_token_provider.FakeTokenCredential(), refresh_margin_seconds=300, background_refresh=False)
+        self.assertEqual(token_provider.get_refresh_after(AccessToken('token', 1000 + 5), now=1000), 1000 + azure_token_provider.token_min_refresh_seconds)
+
+    def test_case4_background_refresh_does_not_spin_on_short_lifetime(self):
+        fake_credential = azure_token_provider.FakeTokenCredential(lifetime_seconds=200, latency_seconds=0)
+        with azure_token_provider.SharedTokenProvider(fake_credential, refresh_margin_seconds=300) as token_provider:
+            token_provider.get_token(management_scope)
+            time.sleep(0.5)
+        self.assertEqual(fake_credential.call_count, 1)
+
+    def test_case5_concurrent_callers_share_one_token(self):
+        fake_credential = azure_token_provider.FakeTokenCredential(lifetime_seconds=3600, latency_seconds=0)
+        with azure_token_provider.SharedTokenProvider(fake_credential) as token_provider:
+            bearer_headers = [token_provider.get_bearer_header(management_scope) for _ in range(10)]
+        self.assertEqual(fake_credential.call_count, 1)
+        self.assertEqual(token_provider.stats.cache_hits, 9)
+        self.assertEqual(len({bearer_header['Authorization'] for bearer_header in bearer_headers}), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()